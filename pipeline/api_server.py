@@ -0,0 +1,404 @@
+"""
+Lokal, skrivebeskyttet budsjett-API over pipelinens utfiler.
+Realiserer API-et i ARCHITECTURE.md (avsnitt 6) som et tynt lag over
+data/ÅRSTALL/*.json og data/tidsserie/:
+
+    GET /api/v1/budsjett/{aar}/{utgifter|inntekter}
+    GET /api/v1/budsjett/{aar}/{side}/omraade/{omr_nr}[/kategori/{kat_nr}[/kapittel/{kap_nr}[/post/{post_nr}]]]
+    GET /api/v1/budsjett/{aar}/{side}/kapittel/{kap_nr}
+    GET /api/v1/budsjett/{aar}/spu
+    GET /api/v1/budsjett/{aar}/endringer[/forrige_aar]
+    GET /api/v1/budsjett/tidsserie?omr_nr=4&side=utgifter&fra=2020&til=2025
+    GET /api/v1/budsjett          (tilgjengelige år)
+
+Alle år lastes én gang ved oppstart, og hvert år får en oppslagstabell fra
+stien (side, omr, kat, kap, post) til noden, så et oppslag er ett dict-oppslag.
+Svarkroppen (JSON, gzip og ETag) lages første gang en node etterspørres og
+gjenbrukes deretter. If-None-Match gir 304. En bakgrunnstråd sjekker
+utfilenes mtime og laster et år (eller tidsseriene) på nytt når de endres;
+det nye året byttes inn i én tilordning, så forespørsler ser enten gammel
+eller ny versjon.
+
+Bruk:
+    python api_server.py [--port 8000] [--data ../data] [--intervall 2]
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from tidsserie import OMRAADEMAPPE, SERIEINDEKS, TIDSSERIEMAPPE
+
+PREFIKS = "/api/v1/budsjett"
+SIDER = ["utgifter", "inntekter"]
+AARSFILER = ["gul_bok_full.json", "gul_bok_endringer.json", "gul_bok_endring_forrige_aar.json"]
+
+# Stisegmentene under en side, i rekkefølge (hvert følges av et nummer)
+STISEGMENTER = ["omraade", "kategori", "kapittel", "post"]
+
+# Svar under denne størrelsen komprimeres ikke
+MIN_GZIP = 1024
+CACHE_CONTROL = "public, max-age=60"
+
+
+class Svar:
+    """Ferdig serialisert svar: JSON-kropp, gzip-variant (laget ved behov) og
+    ETag. gzip-varianten har sin egen ETag (-gz), siden bytene er forskjellige."""
+
+    __slots__ = ("kropp", "etag", "etag_gzip", "_gzip")
+
+    def __init__(self, data):
+        self.kropp = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        hash_ = hashlib.sha256(self.kropp).hexdigest()[:16]
+        self.etag = f'"{hash_}"'
+        self.etag_gzip = f'"{hash_}-gz"'
+        self._gzip = None
+
+    @property
+    def gzip(self) -> bytes:
+        if self._gzip is None:
+            self._gzip = gzip.compress(self.kropp, compresslevel=6, mtime=0)
+        return self._gzip
+
+
+def _etag_treff(if_none_match: str | None, etag: str) -> bool:
+    """Om If-None-Match-hodet treffer ETagen: «*» eller en av de
+    kommaseparerte ETagene (svak sammenligning, dvs. W/ ignoreres)."""
+    if not if_none_match:
+        return False
+    kandidater = [k.strip() for k in if_none_match.split(",")]
+    return "*" in kandidater or etag in (k.removeprefix("W/") for k in kandidater)
+
+
+def _filstempel(filer: list[Path]) -> tuple:
+    """(navn, mtime, størrelse) for filene som finnes; endres når en fil skrives på nytt."""
+    stempel = []
+    for filsti in filer:
+        try:
+            info = filsti.stat()
+        except FileNotFoundError:
+            continue
+        stempel.append((filsti.name, info.st_mtime_ns, info.st_size))
+    return tuple(stempel)
+
+
+class Aarsdata:
+    """Ett budsjettårs utfiler med oppslagstabell over hierarkiet."""
+
+    def __init__(self, mappe: Path):
+        self.mappe = mappe
+        self.stempel = _filstempel([mappe / f for f in AARSFILER])
+        with open(mappe / "gul_bok_full.json", encoding="utf-8") as f:
+            full = json.load(f)
+        self.budsjettaar = full["budsjettaar"]
+        self.spu = {
+            "budsjettaar": self.budsjettaar,
+            "spu": full["spu"],
+            "oljekorrigert": full["oljekorrigert"],
+        }
+        self.endringer = self._les("gul_bok_endringer.json")
+        self.endring_forrige_aar = self._les("gul_bok_endring_forrige_aar.json")
+
+        # (side,), (side, omr), (side, omr, kat), (side, omr, kat, kap) → node;
+        # (side, omr, kat, kap, post) → postene (underpostene) med det nummeret
+        self.noder: dict[tuple, dict | list] = {}
+        # (side, kap_nr) → full sti, for oppslag direkte på kapittel
+        self.kapitler: dict[tuple[str, int], tuple] = {}
+        for side in SIDER:
+            self.noder[(side,)] = full[side]
+            for omr in full[side]["omraader"]:
+                sti_omr = (side, omr["omr_nr"])
+                self.noder[sti_omr] = omr
+                for kat in omr["kategorier"]:
+                    sti_kat = sti_omr + (kat["kat_nr"],)
+                    self.noder[sti_kat] = kat
+                    for kap in kat["kapitler"]:
+                        sti_kap = sti_kat + (kap["kap_nr"],)
+                        self.noder[sti_kap] = kap
+                        self.kapitler[(side, kap["kap_nr"])] = sti_kap
+                        for post in kap["poster"]:
+                            self.noder.setdefault(sti_kap + (post["post_nr"],), []).append(post)
+
+        self._svar: dict[tuple, Svar] = {}
+
+    def _les(self, filnavn: str) -> dict | None:
+        filsti = self.mappe / filnavn
+        if not filsti.exists():
+            return None
+        with open(filsti, encoding="utf-8") as f:
+            return json.load(f)
+
+    def svar(self, nokkel: tuple, lag) -> Svar:
+        """Bufret svar for nøkkelen; lag() gir dataene første gang."""
+        svar = self._svar.get(nokkel)
+        if svar is None:
+            svar = self._svar[nokkel] = Svar(lag())
+        return svar
+
+
+class Tidsserier:
+    """Ferdigberegnede områdeserier fra data/tidsserie/ (se tidsserie.py)."""
+
+    def __init__(self, mappe: Path):
+        filer = sorted((mappe / OMRAADEMAPPE).glob("*.json"))
+        self.stempel = _filstempel([mappe / SERIEINDEKS, *filer])
+        self.serier: dict[tuple[str, int], dict] = {}
+        for filsti in filer:
+            with open(filsti, encoding="utf-8") as f:
+                serie = json.load(f)
+            self.serier[(serie["side"], serie["omr_nr"])] = serie
+        self._svar: dict[tuple, Svar] = {}
+
+    def svar(self, side: str, omr_nr: int, fra: int | None, til: int | None) -> Svar | None:
+        """Serien for et område avgrenset til fra–til (som tidsserie.hent_serie).
+        Intervallet klemmes til årene serien har før det brukes som cachenøkkel,
+        så cachen har høyst én oppføring per (fra, til)-par innenfor serien."""
+        serie = self.serier.get((side, omr_nr))
+        if serie is None:
+            return None
+        aar = [p["aar"] for p in serie["serie"]]
+        if aar:
+            fra = aar[0] if fra is None else min(max(fra, aar[0]), aar[-1] + 1)
+            til = aar[-1] if til is None else max(min(til, aar[-1]), aar[0] - 1)
+            if fra > til:
+                fra, til = aar[0], aar[0] - 1  # tomt intervall
+        nokkel = (side, omr_nr, fra, til)
+        if nokkel not in self._svar:
+            self._svar[nokkel] = Svar({**serie, "serie": [
+                p for p in serie["serie"]
+                if (fra is None or p["aar"] >= fra) and (til is None or p["aar"] <= til)
+            ]})
+        return self._svar[nokkel]
+
+
+class Budsjettlager:
+    """Alle år i datamappen, med hot reload av år som endres på disk."""
+
+    def __init__(self, datamappe: Path):
+        self.datamappe = datamappe
+        self.aar: dict[int, Aarsdata] = {}
+        self.tidsserier: Tidsserier | None = None
+        self.oppdater()
+
+    def _aarsmapper(self) -> dict[int, Path]:
+        return {
+            int(mappe.name): mappe
+            for mappe in sorted(self.datamappe.iterdir())
+            if mappe.name.isdigit() and (mappe / "gul_bok_full.json").exists()
+        }
+
+    def oppdater(self) -> list[str]:
+        """Laster år som er nye eller endret siden sist, og fjerner år som er
+        borte. Returnerer hva som ble lastet på nytt. Årene samles i en ny
+        ordbok som byttes inn i én tilordning, så forespørselstrådene aldri
+        ser en ordbok som endres mens de leser den."""
+        endret = []
+        mapper = self._aarsmapper()
+        nye = {aar: data for aar, data in self.aar.items() if aar in mapper}
+        endret += [f"-{aar}" for aar in sorted(set(self.aar) - set(mapper))]
+        for aar, mappe in mapper.items():
+            gammel = nye.get(aar)
+            if gammel is None or gammel.stempel != _filstempel([mappe / f for f in AARSFILER]):
+                try:
+                    nye[aar] = Aarsdata(mappe)
+                except (OSError, json.JSONDecodeError, KeyError) as e:
+                    # Behold forrige versjon hvis filen er ugyldig (f.eks. midt i et bygg)
+                    print(f"  ⚠ Kunne ikke laste {aar}: {e}")
+                    continue
+                endret.append(str(aar))
+        self.aar = dict(sorted(nye.items()))
+
+        mappe = self.datamappe / TIDSSERIEMAPPE
+        if (mappe / SERIEINDEKS).exists():
+            stempel = _filstempel([mappe / SERIEINDEKS, *sorted((mappe / OMRAADEMAPPE).glob("*.json"))])
+            if self.tidsserier is None or self.tidsserier.stempel != stempel:
+                self.tidsserier = Tidsserier(mappe)
+                endret.append(TIDSSERIEMAPPE)
+        elif self.tidsserier is not None:
+            self.tidsserier = None
+            endret.append(f"-{TIDSSERIEMAPPE}")
+        return endret
+
+    def overvaak(self, intervall: float, stopp: threading.Event):
+        """Sjekker datamappen hvert intervall-sekund til stopp settes."""
+        while not stopp.wait(intervall):
+            endret = self.oppdater()
+            if endret:
+                print(f"  ↻ Lastet på nytt: {', '.join(endret)}")
+
+    def slaa_opp(self, sti: str, sporring: dict[str, list[str]]) -> Svar | tuple[int, str]:
+        """Ruter en sti under /api/v1/budsjett til et svar, eller (status, feilmelding)."""
+        deler = [d for d in sti.split("/") if d]
+        if not deler:
+            return Svar({"aar": sorted(self.aar), "tidsserie": self.tidsserier is not None})
+        if deler == ["tidsserie"]:
+            return self._tidsserie(sporring)
+        if not deler[0].isdigit():
+            return HTTPStatus.NOT_FOUND, f"Ukjent ressurs: {deler[0]}"
+        aarsdata = self.aar.get(int(deler[0]))
+        if aarsdata is None:
+            return HTTPStatus.NOT_FOUND, f"Budsjettåret {deler[0]} finnes ikke"
+        ressurs, rest = (deler[1], deler[2:]) if len(deler) > 1 else (None, [])
+
+        if ressurs == "spu" and not rest:
+            return aarsdata.svar(("spu",), lambda: aarsdata.spu)
+        if ressurs == "endringer" and not rest:
+            return aarsdata.svar(("endringer",), lambda: aarsdata.endringer)
+        if ressurs == "endringer" and rest == ["forrige_aar"]:
+            if aarsdata.endring_forrige_aar is None:
+                return HTTPStatus.NOT_FOUND, f"Ingen sammenligning med året før for {deler[0]}"
+            return aarsdata.svar(("endringer", "forrige_aar"), lambda: aarsdata.endring_forrige_aar)
+        if ressurs in SIDER:
+            return self._hierarki(aarsdata, ressurs, rest)
+        return HTTPStatus.NOT_FOUND, f"Ukjent ressurs: {ressurs}"
+
+    def _hierarki(self, aarsdata: Aarsdata, side: str, rest: list[str]) -> Svar | tuple[int, str]:
+        if len(rest) % 2 or not all(nr.isdigit() for nr in rest[1::2]):
+            return HTTPStatus.NOT_FOUND, "Ugyldig sti i hierarkiet"
+        par = list(zip(rest[::2], map(int, rest[1::2])))
+
+        # Direkte kapitteloppslag: /{side}/kapittel/{kap_nr}[/post/{post_nr}]
+        if par and par[0][0] == "kapittel":
+            sti = aarsdata.kapitler.get((side, par[0][1]))
+            if sti is None:
+                return HTTPStatus.NOT_FOUND, f"Kapittel {par[0][1]} finnes ikke"
+            par = list(zip(STISEGMENTER, sti[1:])) + par[1:]
+
+        if [segment for segment, _ in par] != STISEGMENTER[:len(par)]:
+            return HTTPStatus.NOT_FOUND, "Ugyldig sti i hierarkiet"
+        nokkel = (side, *(nr for _, nr in par))
+        node = aarsdata.noder.get(nokkel)
+        if node is None:
+            return HTTPStatus.NOT_FOUND, f"Finner ikke {'/'.join(rest) or side}"
+        if len(nokkel) == 5:
+            return aarsdata.svar(nokkel, lambda: {"kap_nr": nokkel[3], "post_nr": nokkel[4],
+                                                  "poster": node})
+        return aarsdata.svar(nokkel, lambda: node)
+
+    def _tidsserie(self, sporring: dict[str, list[str]]) -> Svar | tuple[int, str]:
+        if self.tidsserier is None:
+            return HTTPStatus.NOT_FOUND, "Ingen tidsserier (kjør pipelinen først)"
+        try:
+            omr_nr = int(sporring["omr_nr"][0])
+            fra = int(sporring["fra"][0]) if "fra" in sporring else None
+            til = int(sporring["til"][0]) if "til" in sporring else None
+        except (KeyError, ValueError):
+            return HTTPStatus.BAD_REQUEST, "tidsserie krever omr_nr (og evt. fra/til) som heltall"
+        side = sporring.get("side", ["utgifter"])[0]
+        svar = self.tidsserier.svar(side, omr_nr, fra, til)
+        if svar is None:
+            return HTTPStatus.NOT_FOUND, f"Ingen tidsserie for {side} område {omr_nr}"
+        return svar
+
+
+class Forespoerselshandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "BudsjettAPI/1"
+    # Hoder og kropp skrives hver for seg; uten TCP_NODELAY gir Nagle og
+    # forsinket ACK ~40 ms ekstra per svar på vedvarende forbindelser
+    disable_nagle_algorithm = True
+    lager: Budsjettlager
+    logg = False
+
+    def do_GET(self):
+        self._svar(med_kropp=True)
+
+    def do_HEAD(self):
+        self._svar(med_kropp=False)
+
+    def _svar(self, med_kropp: bool):
+        url = urlsplit(self.path)
+        sti = url.path.rstrip("/")
+        if sti != PREFIKS and not sti.startswith(PREFIKS + "/"):
+            return self._feil(HTTPStatus.NOT_FOUND, "Ukjent sti", med_kropp)
+        resultat = self.lager.slaa_opp(sti[len(PREFIKS):], parse_qs(url.query))
+        if isinstance(resultat, tuple):
+            return self._feil(*resultat, med_kropp)
+
+        komprimert = (len(resultat.kropp) >= MIN_GZIP
+                      and "gzip" in self.headers.get("Accept-Encoding", ""))
+        etag = resultat.etag_gzip if komprimert else resultat.etag
+        if _etag_treff(self.headers.get("If-None-Match"), etag):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self._felles_hoder(etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        kropp = resultat.gzip if komprimert else resultat.kropp
+        self.send_response(HTTPStatus.OK)
+        self._felles_hoder(etag)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        if komprimert:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(kropp)))
+        self.end_headers()
+        if med_kropp:
+            self.wfile.write(kropp)
+
+    def _felles_hoder(self, etag: str):
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", CACHE_CONTROL)
+        self.send_header("Vary", "Accept-Encoding")
+
+    def _feil(self, status: int, melding: str, med_kropp: bool = True):
+        kropp = json.dumps({"feil": melding}, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(kropp)))
+        self.end_headers()
+        if med_kropp:
+            self.wfile.write(kropp)
+
+    def log_message(self, format, *args):
+        if self.logg:
+            super().log_message(format, *args)
+
+
+def lag_server(datamappe: Path, port: int = 8000, vert: str = "127.0.0.1",
+               intervall: float | None = 2.0, logg: bool = False) -> tuple[ThreadingHTTPServer, threading.Event]:
+    """Laster alle år og lager serveren (uten å starte den). Med intervall
+    startes hot reload i en bakgrunnstråd; sett den returnerte hendelsen
+    for å stoppe overvåkingen."""
+    lager = Budsjettlager(datamappe)
+    handler = type("Handler", (Forespoerselshandler,), {"lager": lager, "logg": logg})
+    server = ThreadingHTTPServer((vert, port), handler)
+    server.daemon_threads = True
+    stopp = threading.Event()
+    if intervall:
+        threading.Thread(target=lager.overvaak, args=(intervall, stopp), daemon=True).start()
+    return server, stopp
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lokal budsjett-API over pipelinens utfiler")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--vert", default="127.0.0.1")
+    parser.add_argument("--data", type=Path, default=Path(__file__).parent.parent / "data",
+                        help="Datamappen med ÅRSTALL/ og tidsserie/ (standard: ../data)")
+    parser.add_argument("--intervall", type=float, default=2.0,
+                        help="Sekunder mellom hver sjekk etter endrede filer (0 slår av)")
+    parser.add_argument("--logg", action="store_true", help="Logg hver forespørsel")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    server, stopp = lag_server(args.data, args.port, args.vert, args.intervall, args.logg)
+    lager = server.RequestHandlerClass.lager
+    print(f"Lastet {len(lager.aar)} år ({', '.join(map(str, sorted(lager.aar)))}) "
+          f"på {time.perf_counter() - start:.2f} s"
+          + (", med tidsserier" if lager.tidsserier else ""))
+    print(f"Lytter på http://{args.vert}:{server.server_address[1]}{PREFIKS}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stopp.set()
+        server.server_close()
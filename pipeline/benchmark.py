@@ -0,0 +1,228 @@
+"""
+Ytelsesmålinger for datapipelinen.
+Måler kjøretid (beste av flere gjentakelser) og topp-minnebruk (tracemalloc)
+for hvert steg på syntetiske Gul bok-data i flere skalaer (se syntetisk.py).
+Resultatene legges til i benchmark_historikk.jsonl, nøklet på git-commit,
+slik at kjøringer kan sammenlignes mellom commits.
+
+Bruk:
+    python benchmark.py [--skala 1 10 100] [--gjentakelser 3] [--uten-minne]
+    python benchmark.py --innlesing [ÅR ...]
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+
+from les_gul_bok import FORVENTEDE_KOLONNER, les_og_normaliser, til_kompakte_typer
+from endringsdata import beregn_endringsdata
+from bygg_hierarki import bygg_komplett_hierarki, bygg_visninger
+from berikelse import (
+    beregn_spu, beregn_oljekorrigert, generer_aggregert_utgifter,
+    generer_aggregert_inntekter, sett_fondsuttak, summer_per_post,
+)
+from eksporter import (
+    aggregert_datasett, eksporter_aggregert, eksporter_full, eksporter_shards,
+    full_datasett,
+)
+from valider import valider_data
+from syntetisk import generer_gul_bok, generer_saldert, skriv_excel
+
+HISTORIKKFIL = Path(__file__).parent / "benchmark_historikk.jsonl"
+
+
+def maal(funksjon: Callable, *args, gjentakelser: int = 3, maal_minne: bool = True) -> dict:
+    """Kjører funksjon(*args) flere ganger og returnerer beste kjøretid
+    og topp-minnebruk (målt i en egen kjøring med tracemalloc)."""
+    tider = []
+    for _ in range(gjentakelser):
+        start = time.perf_counter()
+        funksjon(*args)
+        tider.append(time.perf_counter() - start)
+
+    topp = None
+    if maal_minne:
+        tracemalloc.start()
+        try:
+            funksjon(*args)
+            _, topp = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {"sekunder": min(tider), "topp_minne_mb": topp / 1e6 if topp is not None else None}
+
+
+def _les_med_pandas(filsti: Path) -> pd.DataFrame:
+    """Referanse: innlesing slik den var før strømmende lesing — arbeidsboken
+    åpnes to ganger og alle kolonner leses før de overflødige droppes."""
+    xl = pd.ExcelFile(filsti)
+    ark = "Data" if "Data" in xl.sheet_names else 0
+    df = pd.read_excel(filsti, sheet_name=ark, dtype={"stikkord": str})
+    if "beløp" in df.columns and "GB" not in df.columns:
+        df = df.rename(columns={"beløp": "GB"})
+    if "upost_nr" not in df.columns:
+        df["upost_nr"] = 0
+    df = df[FORVENTEDE_KOLONNER].copy()
+    for kol in ["fdep_navn", "omr_navn", "kat_navn", "kap_navn", "post_navn"]:
+        df[kol] = df[kol].astype(str).str.strip()
+    df["stikkord"] = df["stikkord"].fillna("").str.strip()
+    df["side"] = df["kap_nr"].apply(lambda x: "inntekt" if x >= 3000 else "utgift")
+    return df
+
+
+def benchmark_innlesing(filer: list[Path]) -> list[dict]:
+    """Sammenligner strømmende, kolonnebeskåret innlesing mot pandas-referansen."""
+    resultater = []
+    for filsti in filer:
+        ny = maal(les_og_normaliser, filsti)
+        gammel = maal(_les_med_pandas, filsti)
+        resultater.append({"fil": filsti.name, "ny": ny, "referanse": gammel})
+    return resultater
+
+
+def _berikelse(df: pd.DataFrame) -> tuple:
+    """Berikelsessteget slik kjor_pipeline kjører det."""
+    postsummer = summer_per_post(df)
+    spu = beregn_spu(df, postsummer)
+    oljekorr = beregn_oljekorrigert(df, postsummer)
+    utgifter_agg = generer_aggregert_utgifter(df, postsummer)
+    inntekter_agg = generer_aggregert_inntekter(df, postsummer)
+    sett_fondsuttak(spu, oljekorr["underskudd"])
+    return spu, oljekorr, utgifter_agg, inntekter_agg
+
+
+def benchmark_steg(skala: int, gjentakelser: int = 3, maal_minne: bool = True,
+                   excel_maks_skala: int = 10, kompakte_typer: bool = False) -> list[dict]:
+    """Måler hvert pipelinesteg på syntetiske data i gitt skala.
+    Innlesing fra Excel måles kun opp til excel_maks_skala (arbeidsboken må
+    skrives først, og det tar lang tid i stor skala).
+    kompakte_typer=True kjører stegene etter innlesing på kompakt skjema."""
+    df = generer_gul_bok(skala)
+    saldert = generer_saldert(df)
+    resultater = []
+
+    def registrer(steg: str, funksjon: Callable, *args):
+        maaling = maal(funksjon, *args, gjentakelser=gjentakelser, maal_minne=maal_minne)
+        resultater.append({"skala": skala, "rader": len(df), "steg": steg, **maaling})
+
+    with tempfile.TemporaryDirectory() as mappe:
+        mappe = Path(mappe)
+        if skala <= excel_maks_skala:
+            arbeidsbok = skriv_excel(df, mappe / "Gul bok syntetisk.xlsx")
+            registrer("les_gul_bok", les_og_normaliser, arbeidsbok)
+
+        if kompakte_typer:
+            df = til_kompakte_typer(df)
+
+        registrer("beregn_endringsdata", beregn_endringsdata, df, saldert)
+        df = beregn_endringsdata(df, saldert)
+
+        registrer("bygg_komplett_hierarki", bygg_komplett_hierarki, df)
+        hierarki = bygg_komplett_hierarki(df)
+        registrer("bygg_visninger", bygg_visninger, df)
+
+        registrer("berikelse", _berikelse, df)
+        spu, oljekorr, utgifter_agg, inntekter_agg = _berikelse(df)
+
+        def eksport():
+            eksporter_full(hierarki, spu, 2026, mappe,
+                           oljekorr["utgifter_total"], oljekorr["inntekter_total"])
+            eksporter_aggregert(utgifter_agg, inntekter_agg, spu, 2026, mappe)
+            eksporter_shards(hierarki, 2026, mappe)
+
+        registrer("eksport", eksport)
+
+        full = full_datasett(hierarki, spu, 2026,
+                             oljekorr["utgifter_total"], oljekorr["inntekter_total"])
+        agg = aggregert_datasett(utgifter_agg, inntekter_agg, spu, 2026)
+        registrer("validering", valider_data, full, agg, 2026)
+
+    return resultater
+
+
+def git_commit() -> tuple[str | None, bool]:
+    """(commit-hash for HEAD, om arbeidstreet har uncommittede endringer)."""
+    mappe = Path(__file__).parent
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=mappe, check=True,
+                                capture_output=True, text=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--", "."], cwd=mappe,
+                                check=True, capture_output=True, text=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit, bool(status.strip())
+
+
+def lagre_historikk(resultater: list[dict], filsti: Path = HISTORIKKFIL,
+                    **kontekst) -> dict:
+    """Legger én kjøring til benchmark-historikken (én JSON-linje per kjøring)."""
+    commit, endret = git_commit()
+    kjoring = {
+        "commit": commit,
+        "endret": endret,
+        "tidspunkt": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "maskin": platform.node(),
+        **kontekst,
+        "resultater": resultater,
+    }
+    with open(filsti, "a", encoding="utf-8") as f:
+        f.write(json.dumps(kjoring, ensure_ascii=False) + "\n")
+    return kjoring
+
+
+def skriv_tabell(resultater: list[dict]):
+    """Skriver målingene som en tabell per skala og steg."""
+    print(f"{'Skala':>6} {'Rader':>9} {'Steg':<24} {'sekunder':>9} {'topp (MB)':>10}")
+    for r in resultater:
+        minne = f"{r['topp_minne_mb']:>10.1f}" if r["topp_minne_mb"] is not None else f"{'–':>10}"
+        print(f"{r['skala']:>5}× {r['rader']:>9} {r['steg']:<24} {r['sekunder']:>9.3f} {minne}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ytelsesmålinger for datapipelinen")
+    parser.add_argument("--skala", nargs="+", type=int, default=[1, 10, 100],
+                        help="Skalaer for syntetiske data (standard: 1 10 100; 1000 er mulig)")
+    parser.add_argument("--gjentakelser", type=int, default=3)
+    parser.add_argument("--uten-minne", action="store_true",
+                        help="Hopp over tracemalloc-kjøringen (raskere i stor skala)")
+    parser.add_argument("--excel-maks-skala", type=int, default=10,
+                        help="Største skala der innlesing fra Excel måles (standard: 10)")
+    parser.add_argument("--kompakte-typer", action="store_true",
+                        help="Kjør stegene på kompakt skjema (kategoriske navn, små heltall)")
+    parser.add_argument("--ingen-lagring", action="store_true",
+                        help=f"Ikke legg resultatene til i {HISTORIKKFIL.name}")
+    parser.add_argument("--innlesing", nargs="*", type=int, metavar="ÅR",
+                        help="Sammenlign innlesing av ekte Gul bok-filer mot pandas-referansen")
+    args = parser.parse_args()
+
+    if args.innlesing is not None:
+        rotmappe = Path(__file__).parent.parent
+        filer = [rotmappe / f"Gul bok {aar}.xlsx" for aar in args.innlesing or [2025, 2026]]
+        print(f"{'Fil':<20} {'ny (s)':>8} {'ref (s)':>8} {'ny (MB)':>9} {'ref (MB)':>9}")
+        for r in benchmark_innlesing(filer):
+            print(f"{r['fil']:<20} {r['ny']['sekunder']:>8.3f} {r['referanse']['sekunder']:>8.3f} "
+                  f"{r['ny']['topp_minne_mb']:>9.1f} {r['referanse']['topp_minne_mb']:>9.1f}")
+        sys.exit(0)
+
+    resultater = []
+    for skala in args.skala:
+        resultater.extend(benchmark_steg(skala, args.gjentakelser, not args.uten_minne,
+                                         args.excel_maks_skala, args.kompakte_typer))
+    skriv_tabell(resultater)
+
+    if not args.ingen_lagring:
+        kjoring = lagre_historikk(resultater, gjentakelser=args.gjentakelser,
+                                  typer="kompakte" if args.kompakte_typer else "standard")
+        print(f"\nLagret i {HISTORIKKFIL.name} (commit {(kjoring['commit'] or '?')[:10]}"
+              f"{', med uncommittede endringer' if kjoring['endret'] else ''})")
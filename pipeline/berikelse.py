@@ -11,6 +11,7 @@ Oljekorrigert logikk (se OLJEKORRIGERT.md):
 - Monokromatiske fargeskalaer (marine for utgifter, teal for inntekter)
 """
 
+import numpy as np
 import pandas as pd
 
 # Monokromatisk marine-skala for utgifter
@@ -47,42 +48,139 @@ MANUELLE_TALL: dict[int, dict] = {
 }
 
 
-def beregn_spu(df: pd.DataFrame) -> dict:
-    """Isolerer SPU-poster og beregner nøkkeltall inkl. kontantstrøm-kilder."""
-    utgifter = df[df["side"] == "utgift"]
-    inntekter = df[df["side"] == "inntekt"]
+# Fargeskala per side (tildeles etter beløpsstørrelse)
+FARGESKALA = {
+    "utgift": UTGIFT_FARGESKALA,
+    "inntekt": INNTEKT_FARGESKALA,
+}
 
-    # Kap. 2800 post 50: Overføring til fondet
-    overfoering_til = df[
-        (df["kap_nr"] == 2800) & (df["post_nr"] == 50)
-    ]["GB"].sum()
+# Kategoritabell for de aggregerte barplottene (oljekorrigert, se OLJEKORRIGERT.md).
+# En kategori treffer rader der alle angitte utvalg (omr, kap, post) slår til.
+# Kategorien med "ovrige": True får alle gjenværende rader på sin side, og får
+# omr_gruppe beregnet fra radene sine (minus områdene i "omr_gruppe_unntatt").
+# Beløp og endring for «øvrige» beregnes fra de samme radene, så kategoriene
+# alltid summerer til de oljekorrigerte totalene.
+# "omr_nr" og "omr_gruppe" er visningsfelt som skrives til JSON.
+KATEGORIER: list[dict] = [
+    # Utgifter — kategorisert på programområde
+    {"id": "folketrygden", "navn": "Folketrygden", "side": "utgift",
+     "omr": FOLKETRYGD_OMRAADER, "omr_gruppe": [28, 29, 30, 33]},
+    {"id": "kommuner", "navn": "Kommuner og distrikter", "side": "utgift",
+     "omr": {13}, "omr_nr": 13},
+    {"id": "helse", "navn": "Helse og omsorg", "side": "utgift",
+     "omr": {10}, "omr_nr": 10},
+    {"id": "kunnskap", "navn": "Kunnskapsformål", "side": "utgift",
+     "omr": {7}, "omr_nr": 7},
+    {"id": "naering", "navn": "Næring og fiskeri", "side": "utgift",
+     "omr": {17}, "omr_nr": 17},
+    {"id": "forsvar", "navn": "Forsvar", "side": "utgift",
+     "omr": {4}, "omr_nr": 4},
+    {"id": "transport", "navn": "Innenlands transport", "side": "utgift",
+     "omr": {21}, "omr_nr": 21},
+    # Øvrige utgifter (resten; omr 34 er tom etter kap 2800-ekskludering, men
+    # eventuelle rader der telles med i beløpet uten å vises i omr_gruppe)
+    {"id": "ovrige_utgifter", "navn": "Øvrige utgifter", "side": "utgift",
+     "ovrige": True, "omr_gruppe_unntatt": {34}},
+
+    # Inntekter — kategorisert på kapittel/post under skatter og avgifter (omr 25)
+    {"id": "skatt_person", "navn": "Skatt på inntekt og formue", "side": "inntekt",
+     "omr": {25}, "kap": {5501}, "omr_nr": 25},
+    {"id": "mva", "navn": "Merverdiavgift", "side": "inntekt",
+     "omr": {25}, "kap": {5521}, "omr_nr": 25},
+    {"id": "arbeidsgiveravgift", "navn": "Arbeidsgiveravgift", "side": "inntekt",
+     "kap": {5700}, "post": {72}, "omr_nr": 25},
+    {"id": "trygdeavgift", "navn": "Trygdeavgift", "side": "inntekt",
+     "kap": {5700}, "post": {71}, "omr_nr": 25},
+    {"id": "ovrige_inntekter", "navn": "Øvrige inntekter", "side": "inntekt",
+     "ovrige": True, "omr_gruppe_unntatt": {25, 34}},
+]
 
-    # Kap. 2800 post 96: Finansposter til fondet
-    finansposter = df[
-        (df["kap_nr"] == 2800) & (df["post_nr"] == 96)
-    ]["GB"].sum()
 
-    # Kap. 5800 post 50: Overføring fra fondet
-    overfoering_fra = df[
-        (df["kap_nr"] == 5800) & (df["post_nr"] == 50)
-    ]["GB"].sum()
+def summer_per_post(df: pd.DataFrame) -> pd.DataFrame:
+    """Grupperer hele tabellen én gang til (side, omr_nr, kap_nr, post_nr).
+    Alle SPU-, oljekorrigerings- og kategoriberegninger gjøres på resultatet,
+    som har én rad per post i stedet for én per underpost.
 
-    netto = int(overfoering_til) + int(finansposter) - int(overfoering_fra)
+    Kolonner: GB, saldert_belop (sum der saldert finnes) og antall_saldert."""
+    har_endring = "saldert_belop" in df.columns
+    grunnlag = df[["side", "omr_nr", "kap_nr", "post_nr", "GB"]].copy()
+    if har_endring:
+        grunnlag["saldert_belop"] = df["saldert_belop"].fillna(0).astype("int64")
+        grunnlag["antall_saldert"] = df["saldert_belop"].notna().astype("int64")
 
-    # Fondsuttak beregnes i kjor_pipeline.py som balanseringspost
-    # (oljekorrigert underskudd = utgifter_agg - inntekter_agg)
-    fondsuttak = 0
+    summer = (
+        grunnlag
+        .groupby(["side", "omr_nr", "kap_nr", "post_nr"], sort=False, observed=True)
+        .sum()
+        .reset_index()
+    )
+    return summer
+
+
+def _oljekorrigert_maske(postsummer: pd.DataFrame, side: str) -> pd.Series:
+    """Rader «uten olje og gass» på en side: post < 90, ekskl. petroleumskapitler."""
+    petro = PETRO_KAP_UTGIFT if side == "utgift" else PETRO_KAP_INNTEKT
+    return (
+        (postsummer["side"] == side) &
+        (postsummer["post_nr"] < 90) &
+        (~postsummer["kap_nr"].isin(petro))
+    )
+
+
+def er_oljekorrigert(side: str, kap_nr: int, post_nr: int) -> bool:
+    """Om én post er med «uten olje og gass» (som _oljekorrigert_maske)."""
+    petro = PETRO_KAP_UTGIFT if side == "utgift" else PETRO_KAP_INNTEKT
+    return post_nr < 90 and kap_nr not in petro
 
-    # Kontantstrøm-kilder (petroleumsinntekter)
-    # Petroleumsskatter: kap 5507 + 5508 (CO₂) + 5509 (NOx)
-    petskatt = int(inntekter[inntekter["kap_nr"].isin({5507, 5508, 5509})]["GB"].sum())
 
-    # SDFI (kap 5440)
-    sdfi = int(inntekter[inntekter["kap_nr"] == 5440]["GB"].sum())
+def _sum(postsummer: pd.DataFrame, kap: set[int], post: int | None = None,
+         side: str | None = None) -> int:
+    """Summerer GB for kapitler (og evt. én post) i posttabellen."""
+    maske = postsummer["kap_nr"].isin(kap)
+    if post is not None:
+        maske &= postsummer["post_nr"] == post
+    if side is not None:
+        maske &= postsummer["side"] == side
+    return int(postsummer.loc[maske, "GB"].sum())
 
-    # Equinor-utbytte (kap 5685)
-    equinor = int(inntekter[inntekter["kap_nr"] == 5685]["GB"].sum())
 
+# Postsummene SPU-tallene bygger på: navn → (kapitler, post eller None, side eller None)
+SPU_KOMPONENTER: dict[str, tuple[set[int], int | None, str | None]] = {
+    "overfoering_til": ({2800}, 50, None),     # Kap. 2800 post 50: Overføring til fondet
+    "finansposter": ({2800}, 96, None),        # Kap. 2800 post 96: Finansposter til fondet
+    "overfoering_fra": ({5800}, 50, None),     # Kap. 5800 post 50: Overføring fra fondet
+    "petskatt": ({5507, 5508, 5509}, None, "inntekt"),  # Petroleumsskatter (inkl. CO₂/NOx)
+    "sdfi": ({5440}, None, "inntekt"),         # SDFI
+    "equinor": ({5685}, None, "inntekt"),      # Equinor-utbytte
+}
+
+
+def beregn_spu(df: pd.DataFrame, postsummer: pd.DataFrame | None = None) -> dict:
+    """Isolerer SPU-poster og beregner nøkkeltall inkl. kontantstrøm-kilder."""
+    if postsummer is None:
+        postsummer = summer_per_post(df)
+    return spu_fra_komponenter({
+        navn: _sum(postsummer, kap, post, side)
+        for navn, (kap, post, side) in SPU_KOMPONENTER.items()
+    })
+
+
+def spu_fra_komponenter(komponenter: dict[str, int]) -> dict:
+    """SPU-nøkkeltallene fra postsummene i SPU_KOMPONENTER (se beregn_spu)."""
+    overfoering_til = komponenter["overfoering_til"]
+    finansposter = komponenter["finansposter"]
+    overfoering_fra = komponenter["overfoering_fra"]
+    petskatt = komponenter["petskatt"]
+    sdfi = komponenter["sdfi"]
+    equinor = komponenter["equinor"]
+
+    netto = overfoering_til + finansposter - overfoering_fra
+
+    # Fondsuttak settes av sett_fondsuttak som balanseringspost
+    # (oljekorrigert underskudd = utgifter_agg - inntekter_agg)
+    fondsuttak = 0
+
+    # Kontantstrøm-kilder (petroleumsinntekter)
     # Netto kontantstrøm = summen av petroleumsinntekter
     kontantstrom_kilder = [
         {"id": "petskatt", "navn": "Petroleumsskatter", "belop": petskatt},
@@ -97,7 +195,7 @@ def beregn_spu(df: pd.DataFrame) -> dict:
 
     # Andre petroleumsinntekter (kap 5800/2800-relaterte poster som ikke er dekket)
     # Bruker den bokførte overføring til fond som proxy for total kontantstrøm
-    andre_petro = int(overfoering_til) + int(finansposter) - netto_kontantstrom
+    andre_petro = overfoering_til + finansposter - netto_kontantstrom
     if andre_petro > 0:
         kontantstrom_kilder.append(
             {"id": "andre_petro", "navn": "Andre petroleumsinnt.", "belop": andre_petro}
@@ -105,9 +203,9 @@ def beregn_spu(df: pd.DataFrame) -> dict:
         netto_kontantstrom += andre_petro
 
     return {
-        "overfoering_til_fond": int(overfoering_til),
-        "finansposter_til_fond": int(finansposter),
-        "overfoering_fra_fond": int(overfoering_fra),
+        "overfoering_til_fond": overfoering_til,
+        "finansposter_til_fond": finansposter,
+        "overfoering_fra_fond": overfoering_fra,
         "netto_overfoering": netto,
         "fondsuttak": fondsuttak,
         "netto_kontantstrom": netto_kontantstrom,
@@ -115,21 +213,19 @@ def beregn_spu(df: pd.DataFrame) -> dict:
     }
 
 
-def _aggreger_endring_for_filter(df_subset: pd.DataFrame) -> dict | None:
-    """Beregner aggregert endringsdata for en filtrert del av dataframen.
-    Brukes for aggregerte kategorier i barplottene."""
-    if "saldert_belop" not in df_subset.columns:
-        return None
+def sett_fondsuttak(spu: dict, underskudd: int) -> None:
+    """Fondsuttak = oljekorrigert underskudd (balanseringspost for grafen),
+    og netto overføring til SPU = netto kontantstrøm - fondsuttak."""
+    spu["fondsuttak"] = underskudd
+    spu["netto_overfoering_til_spu"] = spu["netto_kontantstrom"] - underskudd
 
-    har_saldert = df_subset[df_subset["saldert_belop"].notna()]
-    if len(har_saldert) == 0:
-        return None
 
-    gb_sum = int(df_subset["GB"].sum())
-    saldert_sum = int(har_saldert["saldert_belop"].sum())
+def endring_for_kategori(gb_sum: int, saldert_sum: int, antall_saldert: int) -> dict:
+    """Endringsfelt for en aggregert kategori (tom dict uten saldert-match)."""
+    if antall_saldert == 0:
+        return {}
     endring_abs = gb_sum - saldert_sum
     endring_pst = round(endring_abs / abs(saldert_sum) * 100, 1) if saldert_sum != 0 else None
-
     return {
         "saldert_belop": saldert_sum,
         "endring_absolut": endring_abs,
@@ -137,200 +233,111 @@ def _aggreger_endring_for_filter(df_subset: pd.DataFrame) -> dict | None:
     }
 
 
-def generer_aggregert_utgifter(df: pd.DataFrame) -> list[dict]:
+def generer_aggregert(df: pd.DataFrame, side: str,
+                      postsummer: pd.DataFrame | None = None,
+                      kategorier: list[dict] | None = None) -> list[dict]:
+    """Genererer aggregerte kategorier for én side av stacked barplot.
+
+    Hver oljekorrigerte post får en kategorietikett fra kategoritabellen,
+    og beløp og saldert-summer for alle kategorier hentes i én gruppering."""
+    if postsummer is None:
+        postsummer = summer_per_post(df)
+    kategorier = [k for k in (kategorier or KATEGORIER) if k["side"] == side]
+
+    poster = postsummer[_oljekorrigert_maske(postsummer, side)]
+
+    # Tildel kategorietikett per post; første treff vinner, resten går til «øvrige»
+    masker, etiketter = [], []
+    ovrige_id = None
+    for kat in kategorier:
+        if kat.get("ovrige"):
+            ovrige_id = kat["id"]
+            continue
+        maske = np.ones(len(poster), dtype=bool)
+        for utvalg, kol in (("omr", "omr_nr"), ("kap", "kap_nr"), ("post", "post_nr")):
+            if utvalg in kat:
+                maske &= poster[kol].isin(kat[utvalg]).to_numpy()
+        masker.append(maske)
+        etiketter.append(kat["id"])
+    etikett = np.select(masker, etiketter, default=ovrige_id or "")
+
+    har_endring = "saldert_belop" in poster.columns
+    belopskolonner = ["GB", "saldert_belop", "antall_saldert"] if har_endring else ["GB"]
+    summer = poster[belopskolonner].groupby(etikett).sum()
+
+    resultat = []
+    for kat in kategorier:
+        rad = summer.loc[kat["id"]] if kat["id"] in summer.index else None
+        belop = int(rad["GB"]) if rad is not None else 0
+
+        element = {"id": kat["id"], "navn": kat["navn"], "belop": belop}
+        if "omr_nr" in kat:
+            element["omr_nr"] = kat["omr_nr"]
+        if "omr_gruppe" in kat:
+            element["omr_gruppe"] = list(kat["omr_gruppe"])
+        elif kat.get("ovrige"):
+            # Beregn omr_gruppe for «øvrige» dynamisk
+            omr = poster.loc[etikett == kat["id"], "omr_nr"].unique().tolist()
+            unntatt = kat.get("omr_gruppe_unntatt", set())
+            element["omr_gruppe"] = sorted(int(o) for o in omr if o not in unntatt)
+
+        # Endringsdata per kategori (aggregert fra underliggende poster)
+        if har_endring and rad is not None:
+            element.update(endring_for_kategori(
+                belop, int(rad["saldert_belop"]), int(rad["antall_saldert"])
+            ))
+        resultat.append(element)
+
+    # Sorter fra størst til minst, tildel farge fra sidens monokromatiske skala
+    skala = FARGESKALA[side]
+    resultat.sort(key=lambda x: x["belop"], reverse=True)
+    for i, kat in enumerate(resultat):
+        kat["farge"] = skala[i] if i < len(skala) else skala[-1]
+
+    return resultat
+
+
+def kategori_for_post(side: str, omr_nr: int, kap_nr: int, post_nr: int,
+                      kategorier: list[dict] | None = None) -> str | None:
+    """Kategori-id for én oljekorrigert post (som etikettene i generer_aggregert):
+    første treff vinner, ellers sidens «øvrige»-kategori."""
+    ovrige_id = None
+    for kat in kategorier or KATEGORIER:
+        if kat["side"] != side:
+            continue
+        if kat.get("ovrige"):
+            ovrige_id = kat["id"]
+            continue
+        if all(nr in kat[utvalg] for utvalg, nr in
+               (("omr", omr_nr), ("kap", kap_nr), ("post", post_nr)) if utvalg in kat):
+            return kat["id"]
+    return ovrige_id
+
+
+def generer_aggregert_utgifter(df: pd.DataFrame, postsummer: pd.DataFrame | None = None,
+                               kategorier: list[dict] | None = None) -> list[dict]:
     """Genererer aggregert utgiftskategorier for stacked barplot.
     Filtrerer «uten olje og gass»: post < 90, ekskl. kap 2800/2440.
     Se OLJEKORRIGERT.md for fullstendig begrunnelse."""
-    utgifter = df[
-        (df["side"] == "utgift") &
-        (df["post_nr"] < 90) &
-        (~df["kap_nr"].isin(PETRO_KAP_UTGIFT))
-    ]
-
-    # Folketrygden (omr 28, 29, 30, 33)
-    folketrygd_belop = int(
-        utgifter[utgifter["omr_nr"].isin(FOLKETRYGD_OMRAADER)]["GB"].sum()
-    )
-
-    # Kommuner og distrikter (omr 13)
-    kommuner_belop = int(
-        utgifter[utgifter["omr_nr"] == 13]["GB"].sum()
-    )
-
-    # Helse og omsorg (omr 10)
-    helse_belop = int(
-        utgifter[utgifter["omr_nr"] == 10]["GB"].sum()
-    )
-
-    # Kunnskapsformål (omr 7)
-    kunnskap_belop = int(
-        utgifter[utgifter["omr_nr"] == 7]["GB"].sum()
-    )
-
-    # Næring og fiskeri (omr 17)
-    naering_belop = int(
-        utgifter[utgifter["omr_nr"] == 17]["GB"].sum()
-    )
-
-    # Forsvar (omr 4)
-    forsvar_belop = int(
-        utgifter[utgifter["omr_nr"] == 4]["GB"].sum()
-    )
-
-    # Transport (omr 21)
-    transport_belop = int(
-        utgifter[utgifter["omr_nr"] == 21]["GB"].sum()
-    )
-
-    # Øvrige utgifter (resten — omr 34 er tom etter kap 2800-ekskludering)
-    kjente_omraader = FOLKETRYGD_OMRAADER | {34, 13, 10, 7, 17, 4, 21}
-    ovrige_belop = int(
-        utgifter[~utgifter["omr_nr"].isin(kjente_omraader)]["GB"].sum()
-    )
-
-    # Beregn omr_gruppe for "Øvrige utgifter" dynamisk
-    ovrige_omr = sorted(
-        utgifter[~utgifter["omr_nr"].isin(kjente_omraader)]["omr_nr"].unique().tolist()
-    )
-
-    # Endringsdata per kategori (aggregert fra underliggende poster)
-    har_endring = "saldert_belop" in utgifter.columns
-
-    def _endring(omr_filter):
-        """Beregner endring for et omr-filter."""
-        if not har_endring:
-            return {}
-        subset = utgifter[utgifter["omr_nr"].isin(omr_filter)] if isinstance(omr_filter, set) else utgifter[utgifter["omr_nr"] == omr_filter]
-        e = _aggreger_endring_for_filter(subset)
-        return e if e else {}
-
-    kategorier = [
-        {"id": "folketrygden", "navn": "Folketrygden", "belop": folketrygd_belop, "omr_gruppe": [28, 29, 30, 33], **_endring(FOLKETRYGD_OMRAADER)},
-        {"id": "kommuner", "navn": "Kommuner og distrikter", "belop": kommuner_belop, "omr_nr": 13, **_endring(13)},
-        {"id": "helse", "navn": "Helse og omsorg", "belop": helse_belop, "omr_nr": 10, **_endring(10)},
-        {"id": "kunnskap", "navn": "Kunnskapsformål", "belop": kunnskap_belop, "omr_nr": 7, **_endring(7)},
-        {"id": "naering", "navn": "Næring og fiskeri", "belop": naering_belop, "omr_nr": 17, **_endring(17)},
-        {"id": "forsvar", "navn": "Forsvar", "belop": forsvar_belop, "omr_nr": 4, **_endring(4)},
-        {"id": "transport", "navn": "Innenlands transport", "belop": transport_belop, "omr_nr": 21, **_endring(21)},
-        {"id": "ovrige_utgifter", "navn": "Øvrige utgifter", "belop": ovrige_belop, "omr_gruppe": ovrige_omr, **_endring(set(ovrige_omr))},
-    ]
-
-    # Sorter fra størst til minst, tildel farge fra monokromatisk skala
-    kategorier.sort(key=lambda x: x["belop"], reverse=True)
-    for i, kat in enumerate(kategorier):
-        kat["farge"] = UTGIFT_FARGESKALA[i] if i < len(UTGIFT_FARGESKALA) else UTGIFT_FARGESKALA[-1]
+    return generer_aggregert(df, "utgift", postsummer, kategorier)
 
-    return kategorier
 
-
-def generer_aggregert_inntekter(df: pd.DataFrame) -> list[dict]:
+def generer_aggregert_inntekter(df: pd.DataFrame, postsummer: pd.DataFrame | None = None,
+                                kategorier: list[dict] | None = None) -> list[dict]:
     """Genererer aggregert inntektskategorier for stacked barplot.
     Filtrerer «uten olje og gass»: post < 90, ekskl. petroleumskapitler.
     Se OLJEKORRIGERT.md for fullstendig begrunnelse."""
-    inntekter = df[
-        (df["side"] == "inntekt") &
-        (df["post_nr"] < 90) &
-        (~df["kap_nr"].isin(PETRO_KAP_INNTEKT))
-    ]
+    return generer_aggregert(df, "inntekt", postsummer, kategorier)
 
-    # Skatter og avgifter (omr 25)
-    skatt_omr = inntekter[inntekter["omr_nr"] == 25]
 
-    # Merverdiavgift (kap 5521)
-    mva_belop = int(skatt_omr[skatt_omr["kap_nr"] == 5521]["GB"].sum())
-
-    # Trygdeavgift (kap 5700 post 71)
-    trygd_belop = int(
-        inntekter[
-            (inntekter["kap_nr"] == 5700) & (inntekter["post_nr"] == 71)
-        ]["GB"].sum()
-    )
-
-    # Arbeidsgiveravgift (kap 5700 post 72)
-    arb_avg_belop = int(
-        inntekter[
-            (inntekter["kap_nr"] == 5700) & (inntekter["post_nr"] == 72)
-        ]["GB"].sum()
-    )
-
-    # Skatt på inntekt og formue (kap 5501)
-    skatt_person_belop = int(
-        skatt_omr[skatt_omr["kap_nr"] == 5501]["GB"].sum()
-    )
-
-    # Øvrige inntekter: totalt minus de kjente kategoriene
-    # (petroleumskapitler og post >= 90 er allerede filtrert bort)
-    totalt = int(inntekter["GB"].sum())
-    kjent_sum = mva_belop + arb_avg_belop + trygd_belop + skatt_person_belop
-    ovrige_belop = totalt - kjent_sum
-
-    # Beregn omr_gruppe for "Øvrige inntekter" dynamisk (ekskl. omr 25 og 34)
-    ovrige_inn_omr = sorted(
-        inntekter[
-            (inntekter["omr_nr"] != 25) &
-            (inntekter["omr_nr"] != 34)
-        ]["omr_nr"].unique().tolist()
-    )
-
-    # Endringsdata per inntektskategori
-    har_endring = "saldert_belop" in inntekter.columns
-
-    def _endring_kap(kap_filter):
-        """Beregner endring for kapittelnummerfilter."""
-        if not har_endring:
-            return {}
-        subset = inntekter[inntekter["kap_nr"].isin(kap_filter)] if isinstance(kap_filter, (set, list)) else inntekter[inntekter["kap_nr"] == kap_filter]
-        e = _aggreger_endring_for_filter(subset)
-        return e if e else {}
-
-    def _endring_post(kap, post):
-        """Beregner endring for en spesifikk kap+post."""
-        if not har_endring:
-            return {}
-        subset = inntekter[(inntekter["kap_nr"] == kap) & (inntekter["post_nr"] == post)]
-        e = _aggreger_endring_for_filter(subset)
-        return e if e else {}
-
-    def _endring_ovrige():
-        """Beregner endring for øvrige inntekter (alt minus kjente)."""
-        if not har_endring:
-            return {}
-        kjente_kap = {5521, 5501, 5700}
-        subset = inntekter[~inntekter["kap_nr"].isin(kjente_kap)]
-        e = _aggreger_endring_for_filter(subset)
-        return e if e else {}
-
-    kategorier = [
-        {"id": "skatt_person", "navn": "Skatt på inntekt og formue", "belop": skatt_person_belop, "omr_nr": 25, **_endring_kap(5501)},
-        {"id": "mva", "navn": "Merverdiavgift", "belop": mva_belop, "omr_nr": 25, **_endring_kap(5521)},
-        {"id": "arbeidsgiveravgift", "navn": "Arbeidsgiveravgift", "belop": arb_avg_belop, "omr_nr": 25, **_endring_post(5700, 72)},
-        {"id": "trygdeavgift", "navn": "Trygdeavgift", "belop": trygd_belop, "omr_nr": 25, **_endring_post(5700, 71)},
-        {"id": "ovrige_inntekter", "navn": "Øvrige inntekter", "belop": ovrige_belop, "omr_gruppe": ovrige_inn_omr, **_endring_ovrige()},
-    ]
-
-    # Sorter fra størst til minst, tildel farge fra monokromatisk teal-skala
-    kategorier.sort(key=lambda x: x["belop"], reverse=True)
-    for i, kat in enumerate(kategorier):
-        kat["farge"] = INNTEKT_FARGESKALA[i] if i < len(INNTEKT_FARGESKALA) else INNTEKT_FARGESKALA[-1]
-
-    return kategorier
-
-
-def beregn_oljekorrigert(df: pd.DataFrame) -> dict:
+def beregn_oljekorrigert(df: pd.DataFrame, postsummer: pd.DataFrame | None = None) -> dict:
     """Beregner oljekorrigerte totaler (uten olje og gass).
     Se OLJEKORRIGERT.md for fullstendig begrunnelse."""
-    utg = df[
-        (df["side"] == "utgift") &
-        (df["post_nr"] < 90) &
-        (~df["kap_nr"].isin(PETRO_KAP_UTGIFT))
-    ]
-    inn = df[
-        (df["side"] == "inntekt") &
-        (df["post_nr"] < 90) &
-        (~df["kap_nr"].isin(PETRO_KAP_INNTEKT))
-    ]
-    utgifter_total = int(utg["GB"].sum())
-    inntekter_total = int(inn["GB"].sum())
+    if postsummer is None:
+        postsummer = summer_per_post(df)
+
+    utgifter_total = int(postsummer.loc[_oljekorrigert_maske(postsummer, "utgift"), "GB"].sum())
+    inntekter_total = int(postsummer.loc[_oljekorrigert_maske(postsummer, "inntekt"), "GB"].sum())
     underskudd = utgifter_total - inntekter_total
 
     return {
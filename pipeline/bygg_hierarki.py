@@ -4,6 +4,7 @@ Bygger trestruktur fra bunn (poster) og opp (kapitler → kategorier → område
 Inkluderer postgruppe-klassifisering og stikkord-parsing.
 """
 
+import numpy as np
 import pandas as pd
 
 
@@ -35,118 +36,225 @@ def _har_endringsdata(df: pd.DataFrame) -> bool:
     return "saldert_belop" in df.columns and "er_ny_post" in df.columns
 
 
-def _bygg_endring_post(rad: pd.Series) -> dict | None:
-    """Bygger endring_fra_saldert-objekt for en post."""
-    if pd.isna(rad.get("saldert_belop")):
-        return None
-    return {
-        "belop": int(rad["GB"]),
-        "saldert_forrige": int(rad["saldert_belop"]),
-        "endring_absolut": int(rad["endring_absolut"]) if not pd.isna(rad.get("endring_absolut")) else None,
-        "endring_prosent": float(rad["endring_prosent"]) if not pd.isna(rad.get("endring_prosent")) else None,
-    }
+# Nivåene i programområde-hierarkiet, ovenfra og ned:
+# (nummerkolonne, navnekolonne, nøkkel for barnelisten i JSON)
+NIVAAER = [
+    ("omr_nr", "omr_navn", "kategorier"),
+    ("kat_nr", "kat_navn", "kapitler"),
+    ("kap_nr", "kap_navn", "poster"),
+]
 
 
-def _aggreger_endring(elementer: list[dict], nøkkel_belop: str = "total") -> dict | None:
-    """Aggregerer endringsdata fra underliggende elementer.
+def endring_for_node(belop: int, saldert: int, har_saldert: bool) -> dict | None:
+    """Bygger endring_fra_saldert for en aggregert node.
     Beregner prosent fra aggregerte beløp, aldri som gjennomsnitt."""
-    saldert_verdier = []
-    for elem in elementer:
-        endring = elem.get("endring_fra_saldert")
-        if endring is not None:
-            saldert_verdier.append(endring["saldert_forrige"])
-
-    if not saldert_verdier:
+    if not har_saldert:
         return None
 
-    belop_sum = sum(e[nøkkel_belop] for e in elementer)
-    saldert_sum = sum(saldert_verdier)
-    endring_abs = belop_sum - saldert_sum
+    endring_abs = belop - saldert
 
     endring_pst = None
-    if saldert_sum != 0:
-        endring_pst = round(endring_abs / abs(saldert_sum) * 100, 1)
+    if saldert != 0:
+        endring_pst = round(endring_abs / abs(saldert) * 100, 1)
 
     return {
-        "belop": belop_sum,
-        "saldert_forrige": saldert_sum,
+        "belop": belop,
+        "saldert_forrige": saldert,
         "endring_absolut": endring_abs,
         "endring_prosent": endring_pst,
     }
 
 
-def bygg_hierarki_for_side(df: pd.DataFrame) -> dict:
-    """Bygger hierarkisk trestruktur for en side (utgift eller inntekt).
-    Inkluderer endringsdata fra saldert budsjett hvis tilgjengelig."""
-    har_endring = _har_endringsdata(df)
-    omraader = []
-
-    for (omr_nr, omr_navn), omr_df in df.groupby(["omr_nr", "omr_navn"]):
-        kategorier = []
-
-        for (kat_nr, kat_navn), kat_df in omr_df.groupby(["kat_nr", "kat_navn"]):
-            kapitler = []
-
-            for (kap_nr, kap_navn), kap_df in kat_df.groupby(["kap_nr", "kap_navn"]):
-                poster = []
-
-                for _, rad in kap_df.iterrows():
-                    post = {
-                        "post_nr": int(rad["post_nr"]),
-                        "upost_nr": int(rad["upost_nr"]),
-                        "navn": rad["post_navn"],
-                        "belop": int(rad["GB"]),
-                        "postgruppe": klassifiser_postgruppe(int(rad["post_nr"])),
-                        "stikkord": parse_stikkord(rad["stikkord"]),
-                        "endring_fra_saldert": _bygg_endring_post(rad) if har_endring else None,
-                    }
-                    poster.append(post)
-
-                kap = {
-                    "kap_nr": int(kap_nr),
-                    "navn": kap_navn,
-                    "total": sum(p["belop"] for p in poster),
-                    "poster": poster,
-                    "endring_fra_saldert": _aggreger_endring(poster, "belop") if har_endring else None,
-                }
-                kapitler.append(kap)
-
-            kat = {
-                "kat_nr": int(kat_nr),
-                "navn": kat_navn,
-                "total": sum(k["total"] for k in kapitler),
-                "kapitler": kapitler,
-                "endring_fra_saldert": _aggreger_endring(kapitler) if har_endring else None,
+def _bygg_poster(df: pd.DataFrame, har_endring: bool) -> list[dict]:
+    """Bygger post-objekter for alle rader (i dataframens rekkefølge)
+    fra forhåndsuttrukne kolonner, uten radvis pandas-tilgang."""
+    post_nr = df["post_nr"].tolist()
+    upost_nr = df["upost_nr"].tolist()
+    navn = df["post_navn"].tolist()
+    belop = df["GB"].tolist()
+
+    # Stikkord gjentas ofte — parse hver unike streng én gang
+    stikkord_cache: dict[str, list[str]] = {}
+    stikkord = []
+    for s in df["stikkord"].tolist():
+        if s not in stikkord_cache:
+            stikkord_cache[s] = parse_stikkord(s)
+        stikkord.append(list(stikkord_cache[s]))
+
+    postgruppe_cache = {p: klassifiser_postgruppe(p) for p in set(post_nr)}
+
+    endringer = [None] * len(post_nr)
+    if har_endring:
+        har_saldert = df["saldert_belop"].notna().tolist()
+        saldert = df["saldert_belop"].tolist()
+        endring_abs = df["endring_absolut"].tolist()
+        endring_pst = df["endring_prosent"].tolist()
+        for i in range(len(post_nr)):
+            if not har_saldert[i]:
+                continue
+            endringer[i] = {
+                "belop": int(belop[i]),
+                "saldert_forrige": int(saldert[i]),
+                "endring_absolut": int(endring_abs[i]) if not pd.isna(endring_abs[i]) else None,
+                "endring_prosent": float(endring_pst[i]) if not pd.isna(endring_pst[i]) else None,
             }
-            kategorier.append(kat)
-
-        omr = {
-            "omr_nr": int(omr_nr),
-            "navn": omr_navn,
-            "total": sum(k["total"] for k in kategorier),
-            "kategorier": kategorier,
-            "endring_fra_saldert": _aggreger_endring(kategorier) if har_endring else None,
-        }
-        omraader.append(omr)
 
-    side_endring = _aggreger_endring(omraader) if har_endring else None
+    return [
+        {
+            "post_nr": int(post_nr[i]),
+            "upost_nr": int(upost_nr[i]),
+            "navn": navn[i],
+            "belop": int(belop[i]),
+            "postgruppe": postgruppe_cache[post_nr[i]],
+            "stikkord": stikkord[i],
+            "endring_fra_saldert": endringer[i],
+        }
+        for i in range(len(post_nr))
+    ]
+
+
+# Departementsvisningen: departement → kapittel → post
+NIVAAER_DEPARTEMENT = [
+    ("fdep_nr", "fdep_navn", "kapitler"),
+    ("kap_nr", "kap_navn", "poster"),
+]
+
+# Visningene som bygges fra samme grunnlag: navn → (nivåer, toppnøkkel)
+VISNINGER = {
+    "programomraader": (NIVAAER, "omraader"),
+    "departementer": (NIVAAER_DEPARTEMENT, "departementer"),
+}
+
+
+class _Grunnlag:
+    """Det som er felles for alle visninger av én side: post-objektene,
+    beløpsarrays og sorteringskoder per kolonne (beregnes ved første bruk).
+    Post-objektene er de samme objektene i alle visninger."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.har_endring = _har_endringsdata(df)
+        self.poster = _bygg_poster(df, self.har_endring)
+        self.gb = df["GB"].to_numpy(dtype=np.int64)
+        if self.har_endring:
+            self.har_saldert = df["saldert_belop"].notna().to_numpy()
+            self.saldert = np.where(
+                self.har_saldert, df["saldert_belop"].to_numpy(dtype=float), 0
+            ).astype(np.int64)
+        else:
+            self.har_saldert = np.zeros(len(df), dtype=bool)
+            self.saldert = np.zeros(len(df), dtype=np.int64)
+        self._koder: dict[str, np.ndarray] = {}
+        self._verdier: dict[str, np.ndarray] = {}
+
+    def koder(self, kol: str) -> np.ndarray:
+        if kol not in self._koder:
+            self._koder[kol] = pd.factorize(self.df[kol], sort=True)[0]
+        return self._koder[kol]
+
+    def verdier(self, kol: str) -> np.ndarray:
+        if kol not in self._verdier:
+            self._verdier[kol] = self.df[kol].to_numpy()
+        return self._verdier[kol]
+
+
+def _bygg_visning(grunnlag: _Grunnlag, nivaaer: list[tuple], toppnøkkel: str) -> dict:
+    """Bygger én visning av en side fra grunnlaget (se bygg_hierarki_for_side)."""
+    har_endring = grunnlag.har_endring
+
+    if len(grunnlag.df) == 0:
+        return {"total": 0, toppnøkkel: [], "endring_fra_saldert": None}
+
+    # Sorteringskoder per nøkkelkolonne (nr før navn, øverste nivå først)
+    koder = []
+    for nr_kol, navn_kol, _ in nivaaer:
+        koder.append(grunnlag.koder(nr_kol))
+        koder.append(grunnlag.koder(navn_kol))
+    rekkefolge = np.lexsort(koder[::-1])
+
+    gb = grunnlag.gb[rekkefolge]
+    har_saldert = grunnlag.har_saldert[rekkefolge]
+    saldert = grunnlag.saldert[rekkefolge]
+
+    # Gruppegrenser: et nytt nivå starter der en av nøklene til og med nivået endres
+    ny_gruppe = np.zeros(len(gb), dtype=bool)
+    ny_gruppe[0] = True
+    starter = []
+    for i in range(len(nivaaer)):
+        for k in (koder[2 * i], koder[2 * i + 1]):
+            ks = k[rekkefolge]
+            ny_gruppe[1:] |= ks[1:] != ks[:-1]
+        starter.append(np.flatnonzero(ny_gruppe))
+
+    barn = [grunnlag.poster[i] for i in rekkefolge]
+    barn_starter = np.arange(len(gb))
+
+    # Bygg nodene nedenfra og opp; hvert nivå peker inn i nivået under
+    for (nr_kol, navn_kol, barnenøkkel), st in zip(reversed(nivaaer), reversed(starter)):
+        totaler = np.add.reduceat(gb, st).tolist()
+        saldert_sum = np.add.reduceat(saldert, st).tolist()
+        har_sum = np.add.reduceat(har_saldert.astype(np.int64), st).tolist()
+        nr = grunnlag.verdier(nr_kol)[rekkefolge[st]].tolist()
+        navn = grunnlag.verdier(navn_kol)[rekkefolge[st]].tolist()
+
+        fra = np.searchsorted(barn_starter, st).tolist()
+        til = fra[1:] + [len(barn)]
+
+        noder = []
+        for g in range(len(st)):
+            noder.append({
+                nr_kol: int(nr[g]),
+                "navn": navn[g],
+                "total": int(totaler[g]),
+                barnenøkkel: barn[fra[g]:til[g]],
+                "endring_fra_saldert": endring_for_node(
+                    int(totaler[g]), int(saldert_sum[g]), har_sum[g] > 0
+                ) if har_endring else None,
+            })
+        barn = noder
+        barn_starter = st
+
+    total = int(gb.sum())
+    side_endring = endring_for_node(
+        total, int(saldert.sum()), bool(har_saldert.any())
+    ) if har_endring else None
 
     return {
-        "total": sum(o["total"] for o in omraader),
-        "omraader": omraader,
+        "total": total,
+        toppnøkkel: barn,
         "endring_fra_saldert": side_endring,
     }
 
 
+def bygg_hierarki_for_side(df: pd.DataFrame, nivaaer: list[tuple] = NIVAAER,
+                           toppnøkkel: str = "omraader") -> dict:
+    """Bygger hierarkisk trestruktur for en side (utgift eller inntekt).
+    Inkluderer endringsdata fra saldert budsjett hvis tilgjengelig.
+
+    Radene sorteres stabilt én gang på alle nivånøklene, og totaler for
+    hvert nivå beregnes med én np.add.reduceat over gruppegrensene.
+    Rekkefølgen tilsvarer nøstede df.groupby(...) over (nr, navn) per nivå,
+    med radrekkefølgen bevart innenfor hvert kapittel."""
+    return _bygg_visning(_Grunnlag(df), nivaaer, toppnøkkel)
+
+
+def bygg_visninger(df: pd.DataFrame, visninger: dict = VISNINGER) -> dict[str, dict]:
+    """Bygger flere visninger av hierarkiet (f.eks. programområder og
+    departementer) med utgifts- og inntektsside for hver. Post-objekter,
+    beløpsarrays og sorteringskoder beregnes én gang per side og deles
+    mellom visningene; hver ekstra visning koster bare sortering og
+    nodebygging for sine egne nivåer."""
+    resultat = {navn: {} for navn in visninger}
+    for side, verdi in [("utgifter", "utgift"), ("inntekter", "inntekt")]:
+        grunnlag = _Grunnlag(df[df["side"] == verdi])
+        for navn, (nivaaer, toppnøkkel) in visninger.items():
+            resultat[navn][side] = _bygg_visning(grunnlag, nivaaer, toppnøkkel)
+    return resultat
+
+
 def bygg_komplett_hierarki(df: pd.DataFrame) -> dict:
     """Bygger komplett hierarki med utgifts- og inntektssider."""
-    utgifter = bygg_hierarki_for_side(df[df["side"] == "utgift"])
-    inntekter = bygg_hierarki_for_side(df[df["side"] == "inntekt"])
-
-    return {
-        "utgifter": utgifter,
-        "inntekter": inntekter,
-    }
+    return bygg_visninger(df, {"programomraader": VISNINGER["programomraader"]})["programomraader"]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,117 @@
+"""
+Byggmanifest for inkrementell bygging.
+Hver utmappe (data/ÅRSTALL/) får en byggmanifest.json med fingeravtrykket til
+alle inndata som påvirker resultatet: kildearbeidsbok, saldert-fil, manuelle
+tall, forventede totaler og pipelinens kildekode. Et år med uendret
+fingeravtrykk (og alle utfiler på plass) trenger ikke bygges på nytt.
+"""
+
+import ast
+import functools
+import json
+from pathlib import Path
+
+from eksporter import skriv_atomisk
+from mellomlager import filhash
+
+MANIFESTNAVN = "byggmanifest.json"
+
+
+KJOREMODUL = "kjor_pipeline.py"
+
+# Setningsfelt som kan inneholde importer (også inne i funksjoner, klasser, try osv.)
+_BLOKKFELT = ("body", "orelse", "finalbody", "handlers", "cases")
+
+
+def _importerte_moduler(setninger: list[ast.stmt]):
+    """Toppnivånavnene til modulene som importeres i setningene. Går bare
+    gjennom setninger, ikke uttrykk, så strenger og docstringer ignoreres."""
+    for setning in setninger:
+        if isinstance(setning, ast.Import):
+            yield from (alias.name.split(".")[0] for alias in setning.names)
+        elif isinstance(setning, ast.ImportFrom):
+            if setning.level == 0 and setning.module:
+                yield setning.module.split(".")[0]
+        else:
+            for felt in _BLOKKFELT:
+                yield from _importerte_moduler(getattr(setning, felt, ()))
+
+
+@functools.cache
+def _kodefiler(modul: str) -> tuple[Path, ...]:
+    mappe = Path(__file__).parent
+    funnet: set[Path] = set()
+    ko = [mappe / modul]
+    while ko:
+        filsti = ko.pop()
+        if filsti in funnet:
+            continue
+        funnet.add(filsti)
+        tre = ast.parse(filsti.read_text(encoding="utf-8"), filename=str(filsti))
+        for navn in _importerte_moduler(tre.body):
+            kandidat = mappe / f"{navn}.py"
+            if kandidat.exists():
+                ko.append(kandidat)
+    return tuple(sorted(funnet))
+
+
+def pipeline_kodefiler(modul: str = KJOREMODUL) -> list[Path]:
+    """Kildefilene kjor_pipeline (eller `modul`) faktisk bruker, i fast
+    rekkefølge: modulene i pipeline-mappen som nås via import fra modulen.
+    Hjelpeskript som API-server, lasttest, benchmark og scenario påvirker ikke
+    utfilene og tvinger derfor ikke frem nye bygg. Importene finnes med ast
+    og huskes per prosess; innholdet hashes på nytt ved hvert kall."""
+    return list(_kodefiler(modul))
+
+
+def beregn_fingeravtrykk(kildefil: Path, saldert_fil: Path | None = None,
+                         manuelle_tall: dict | None = None,
+                         forventede_totaler: dict | None = None,
+                         valg: dict | None = None,
+                         forrige_fil: Path | None = None) -> dict:
+    """Beregner fingeravtrykket for ett års bygg. `valg` er byggvalg som
+    påvirker utfilene (f.eks. minifisert JSON). `forrige_fil` er Gul bok for
+    året før, som årsendringen sammenlignes mot."""
+    return {
+        "kildefil": {"navn": kildefil.name, "sha256": filhash(kildefil)},
+        "saldert": (
+            {"navn": saldert_fil.name, "sha256": filhash(saldert_fil)}
+            if saldert_fil is not None else None
+        ),
+        "forrige_gul_bok": (
+            {"navn": forrige_fil.name, "sha256": filhash(forrige_fil)}
+            if forrige_fil is not None else None
+        ),
+        "manuelle_tall": manuelle_tall or None,
+        "forventede_totaler": forventede_totaler or None,
+        "kode_sha256": filhash(*pipeline_kodefiler()),
+        "valg": valg or None,
+    }
+
+
+def les_manifest(utmappe: Path) -> dict | None:
+    """Leser byggmanifestet i utmappen, eller None hvis det mangler/er ugyldig."""
+    filsti = utmappe / MANIFESTNAVN
+    if not filsti.exists():
+        return None
+    try:
+        with open(filsti, encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return None
+
+
+def er_uendret(utmappe: Path, fingeravtrykk: dict, utfiler: list[str]) -> bool:
+    """True hvis forrige bygg hadde samme fingeravtrykk og alle utfiler finnes."""
+    manifest = les_manifest(utmappe)
+    if manifest is None or manifest.get("fingeravtrykk") != fingeravtrykk:
+        return False
+    return all((utmappe / navn).exists() for navn in utfiler)
+
+
+def skriv_manifest(utmappe: Path, fingeravtrykk: dict) -> Path:
+    """Skriver byggmanifestet etter et vellykket bygg."""
+    filsti = utmappe / MANIFESTNAVN
+    innhold = json.dumps({"fingeravtrykk": fingeravtrykk}, ensure_ascii=False, indent=2)
+    skriv_atomisk(filsti, innhold.encode("utf-8"))
+    return filsti
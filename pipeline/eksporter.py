@@ -1,17 +1,83 @@
 """
 Steg 5: JSON-eksport.
-Eksporterer fire JSON-filer til data/ÅRSTALL/.
+Eksporterer datasettene til data/ÅRSTALL/: de fire hovedfilene
+(gul_bok_full, gul_bok_aggregert, gul_bok_endringer og metadata), områdeshards
+med rotindeks (omraader/, gul_bok_indeks), departementsvisningen, søkeindeksen,
+innholdshashene, endringer fra året før når det finnes, og på forespørsel en
+kompakt ordbokskodet variant av det fulle hierarkiet. Kan skrive minifisert
+JSON og forhåndskomprimerte .gz/.br-søsken som den statiske verten kan levere
+direkte.
 """
 
+import gzip
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import date
 
+from kompakt import kod_kompakt
+from sammenligning import aarsendring_datasett
+from sokeindeks import bygg_sokeindeks
 
-def eksporter_full(hierarki: dict, spu: dict, budsjettaar: int, utmappe: Path,
-                   oljekorrigert_utgifter: int = 0, oljekorrigert_inntekter: int = 0,
-                   manuelle_tall: dict | None = None) -> Path:
-    """Eksporterer komplett hierarki til gul_bok_full.json."""
+try:
+    import brotli
+except ImportError:  # Valgfri avhengighet; uten brotli skrives kun .gz
+    brotli = None
+
+
+def skriv_atomisk(filsti: Path, innhold: bytes) -> None:
+    """Skriver til en midlertidig fil i samme mappe og bytter den inn med
+    os.replace, slik at lesere (og samtidige bygg) aldri ser en halvskrevet fil.
+    Den midlertidige filen opprettes med vanlige rettigheter (umask), ikke 0600
+    som tempfile.mkstemp ville gitt."""
+    midlertidig = filsti.with_name(f".{filsti.name}.{os.getpid()}.{os.urandom(4).hex()}.tmp")
+    try:
+        with open(midlertidig, "xb") as f:
+            f.write(innhold)
+        os.replace(midlertidig, filsti)
+    except BaseException:
+        midlertidig.unlink(missing_ok=True)
+        raise
+
+
+def er_midlertidig(filnavn: str) -> bool:
+    """Om filnavnet er en midlertidig fil fra skriv_atomisk (.navn.pid.hex.tmp),
+    som et samtidig bygg kan være i ferd med å bytte inn."""
+    return filnavn.startswith(".") or filnavn.endswith(".tmp")
+
+
+def skriv_hvis_endret(filsti: Path, innhold: bytes) -> bool:
+    """Skriver innholdet atomisk, men bare hvis filen ikke allerede har
+    nøyaktig dette innholdet; en uendret fil beholder mtime. Returnerer True
+    hvis filen ble skrevet."""
+    try:
+        if filsti.stat().st_size == len(innhold) and filsti.read_bytes() == innhold:
+            return False
+    except FileNotFoundError:
+        pass
+    skriv_atomisk(filsti, innhold)
+    return True
+
+
+def skriv_json(data: dict, filsti: Path, minifisert: bool = False) -> Path:
+    """Skriver data som JSON, enten lesbart (indent=2) eller minifisert.
+    Serialiseringen er deterministisk, og filen skrives bare når innholdet
+    er endret (se skriv_hvis_endret)."""
+    if minifisert:
+        tekst = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    else:
+        tekst = json.dumps(data, ensure_ascii=False, indent=2)
+    skriv_hvis_endret(filsti, tekst.encode("utf-8"))
+    return filsti
+
+
+def full_datasett(hierarki: dict, spu: dict, budsjettaar: int,
+                  oljekorrigert_utgifter: int = 0, oljekorrigert_inntekter: int = 0,
+                  manuelle_tall: dict | None = None, publisert: str | None = None) -> dict:
+    """Bygger innholdet i gul_bok_full.json (uten å skrive det).
+    publisert er ISO-datoen fra kildefilen (se les_gul_bok.publiseringsdato);
+    uten den brukes dagens dato."""
     oljekorrigert = {
         "utgifter_total": oljekorrigert_utgifter,
         "inntekter_total": oljekorrigert_inntekter,
@@ -24,9 +90,9 @@ def eksporter_full(hierarki: dict, spu: dict, budsjettaar: int, utmappe: Path,
         if "uttaksprosent" in manuelle_tall:
             oljekorrigert["uttaksprosent"] = manuelle_tall["uttaksprosent"]
 
-    data = {
+    return {
         "budsjettaar": budsjettaar,
-        "publisert": date.today().isoformat(),
+        "publisert": publisert or date.today().isoformat(),
         "valuta": "NOK",
         "utgifter": hierarki["utgifter"],
         "inntekter": hierarki["inntekter"],
@@ -38,24 +104,83 @@ def eksporter_full(hierarki: dict, spu: dict, budsjettaar: int, utmappe: Path,
         },
     }
 
-    filsti = utmappe / "gul_bok_full.json"
-    with open(filsti, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
 
-    return filsti
+def eksporter_full(hierarki: dict, spu: dict, budsjettaar: int, utmappe: Path,
+                   oljekorrigert_utgifter: int = 0, oljekorrigert_inntekter: int = 0,
+                   manuelle_tall: dict | None = None, minifisert: bool = False,
+                   publisert: str | None = None) -> Path:
+    """Eksporterer komplett hierarki til gul_bok_full.json."""
+    data = full_datasett(hierarki, spu, budsjettaar,
+                         oljekorrigert_utgifter, oljekorrigert_inntekter, manuelle_tall,
+                         publisert=publisert)
+    return skriv_json(data, utmappe / "gul_bok_full.json", minifisert)
 
 
-def eksporter_aggregert(
+KOMPAKTFIL = "gul_bok_kompakt.json"
+
+
+def eksporter_kompakt(full_fil: Path, utmappe: Path) -> tuple[Path, dict]:
+    """Eksporterer gul_bok_full.json i kompakt, ordbokskodet format til
+    gul_bok_kompakt.json (alltid minifisert). Kodes fra den skrevne filen slik
+    at de to variantene garantert har samme innhold. Returnerer filen og
+    den kodede varianten."""
+    with open(full_fil, encoding="utf-8") as f:
+        full = json.load(f)
+    kompakt = kod_kompakt(full)
+    return skriv_json(kompakt, utmappe / KOMPAKTFIL, minifisert=True), kompakt
+
+
+DEPARTEMENTFIL = "gul_bok_departement.json"
+
+
+def departement_datasett(departementer: dict, budsjettaar: int) -> dict:
+    """Bygger innholdet i gul_bok_departement.json: departement → kapittel → post."""
+    return {
+        "budsjettaar": budsjettaar,
+        "valuta": "NOK",
+        "utgifter": departementer["utgifter"],
+        "inntekter": departementer["inntekter"],
+    }
+
+
+def eksporter_departement(departementer: dict, budsjettaar: int, utmappe: Path,
+                          minifisert: bool = False) -> Path:
+    """Eksporterer departementsvisningen av hierarkiet til gul_bok_departement.json."""
+    return skriv_json(departement_datasett(departementer, budsjettaar),
+                       utmappe / DEPARTEMENTFIL, minifisert)
+
+
+SOKEINDEKSFIL = "gul_bok_sokeindeks.json"
+
+
+def eksporter_sokeindeks(hierarki: dict, budsjettaar: int, utmappe: Path) -> tuple[Path, dict]:
+    """Eksporterer søkeindeksen over kapitler og poster til
+    gul_bok_sokeindeks.json (alltid minifisert). Returnerer filen og indeksen."""
+    indeks = bygg_sokeindeks(hierarki, budsjettaar)
+    return skriv_json(indeks, utmappe / SOKEINDEKSFIL, minifisert=True), indeks
+
+
+AARSENDRINGFIL = "gul_bok_endring_forrige_aar.json"
+
+
+def eksporter_aarsendring(sammenligning: dict, budsjettaar: int, forrige_aar: int,
+                          utmappe: Path, minifisert: bool = False) -> Path:
+    """Eksporterer endringene fra Gul bok året før (se sammenligning.py) til
+    gul_bok_endring_forrige_aar.json."""
+    return skriv_json(aarsendring_datasett(sammenligning, budsjettaar, forrige_aar),
+                       utmappe / AARSENDRINGFIL, minifisert)
+
+
+def aggregert_datasett(
     utgifter_agg: list[dict],
     inntekter_agg: list[dict],
     spu: dict,
     budsjettaar: int,
-    utmappe: Path,
-) -> Path:
-    """Eksporterer aggregert datasett til gul_bok_aggregert.json.
+) -> dict:
+    """Bygger innholdet i gul_bok_aggregert.json (uten å skrive det).
     total_utgifter og total_inntekter er oljekorrigerte (balanserte) totaler."""
     sum_utg = sum(k["belop"] for k in utgifter_agg)
-    data = {
+    return {
         "budsjettaar": budsjettaar,
         "total_utgifter": sum_utg,
         "total_inntekter": sum_utg,  # Balansert: ordinære inntekter + fondsuttak = utgifter
@@ -64,16 +189,24 @@ def eksporter_aggregert(
         "spu": spu,
     }
 
-    filsti = utmappe / "gul_bok_aggregert.json"
-    with open(filsti, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
 
-    return filsti
+def eksporter_aggregert(
+    utgifter_agg: list[dict],
+    inntekter_agg: list[dict],
+    spu: dict,
+    budsjettaar: int,
+    utmappe: Path,
+    minifisert: bool = False,
+) -> Path:
+    """Eksporterer aggregert datasett til gul_bok_aggregert.json."""
+    data = aggregert_datasett(utgifter_agg, inntekter_agg, spu, budsjettaar)
+    return skriv_json(data, utmappe / "gul_bok_aggregert.json", minifisert)
 
 
 def eksporter_endringer(budsjettaar: int, utmappe: Path,
                         saldert_aar: int | None = None,
-                        endring_statistikk: dict | None = None) -> Path:
+                        endring_statistikk: dict | None = None,
+                        minifisert: bool = False) -> Path:
     """Eksporterer endringsmetadata. Faktiske endringer ligger nå i full og aggregert JSON."""
     data = {
         "budsjettaar": budsjettaar,
@@ -84,18 +217,13 @@ def eksporter_endringer(budsjettaar: int, utmappe: Path,
         "statistikk": endring_statistikk,
     }
 
-    filsti = utmappe / "gul_bok_endringer.json"
-    with open(filsti, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-    return filsti
+    return skriv_json(data, utmappe / "gul_bok_endringer.json", minifisert)
 
 
-def eksporter_metadata(budsjettaar: int, spu: dict, total_utgifter: int, total_inntekter: int,
-                       oljekorrigert_utgifter: int = 0, oljekorrigert_inntekter: int = 0,
-                       manuelle_tall: dict | None = None,
-                       utmappe: Path = Path(".")) -> Path:
-    """Eksporterer metadata.json."""
+def metadata_datasett(budsjettaar: int, spu: dict, total_utgifter: int, total_inntekter: int,
+                      oljekorrigert_utgifter: int = 0, oljekorrigert_inntekter: int = 0,
+                      manuelle_tall: dict | None = None, publisert: str | None = None) -> dict:
+    """Bygger innholdet i metadata.json (uten å skrive det; publisert som i full_datasett)."""
     oljekorrigert_totaler = {
         "utgifter": oljekorrigert_utgifter,
         "inntekter": oljekorrigert_inntekter,
@@ -107,9 +235,9 @@ def eksporter_metadata(budsjettaar: int, spu: dict, total_utgifter: int, total_i
         if "uttaksprosent" in manuelle_tall:
             oljekorrigert_totaler["uttaksprosent"] = manuelle_tall["uttaksprosent"]
 
-    data = {
+    return {
         "budsjettaar": budsjettaar,
-        "publisert": date.today().isoformat(),
+        "publisert": publisert or date.today().isoformat(),
         "kilde": f"Gul bok {budsjettaar}",
         "saldert_budsjett_forrige": str(budsjettaar - 1),
         "totaler": {
@@ -124,8 +252,137 @@ def eksporter_metadata(budsjettaar: int, spu: dict, total_utgifter: int, total_i
         },
     }
 
-    filsti = utmappe / "metadata.json"
-    with open(filsti, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
 
-    return filsti
+def eksporter_metadata(budsjettaar: int, spu: dict, total_utgifter: int, total_inntekter: int,
+                       oljekorrigert_utgifter: int = 0, oljekorrigert_inntekter: int = 0,
+                       manuelle_tall: dict | None = None,
+                       utmappe: Path = Path("."), minifisert: bool = False,
+                       publisert: str | None = None) -> Path:
+    """Eksporterer metadata.json (se metadata_datasett)."""
+    data = metadata_datasett(budsjettaar, spu, total_utgifter, total_inntekter,
+                             oljekorrigert_utgifter, oljekorrigert_inntekter, manuelle_tall,
+                             publisert=publisert)
+    return skriv_json(data, utmappe / "metadata.json", minifisert)
+
+
+HASHFIL = "gul_bok_hasher.json"
+
+
+def eksporter_hashtre(hashtre: dict, utmappe: Path) -> Path:
+    """Eksporterer innholdshashene for hierarkiet (se hashtre.py) til
+    gul_bok_hasher.json (alltid minifisert)."""
+    return skriv_json(hashtre, utmappe / HASHFIL, minifisert=True)
+
+
+# Sharding av fullt hierarki: én fil per (side, programområde) + en liten rotindeks
+INDEKSFIL = "gul_bok_indeks.json"
+SHARDMAPPE = "omraader"
+
+
+def eksporter_shards(hierarki: dict, budsjettaar: int, utmappe: Path,
+                     minifisert: bool = False,
+                     uendrede: set[tuple[str, int]] = frozenset()) -> Path:
+    """Eksporterer hierarkiet som én shard per (side, omr_nr) i omraader/,
+    pluss gul_bok_indeks.json med totaler og endring_fra_saldert ned til
+    områdenivå. Første visning trenger kun indeksen; drill-down laster
+    kun shard-filen for området som åpnes. Shards for områdene i `uendrede`
+    (se hashtre.uendrede_omraader) skrives ikke på nytt hvis filen finnes."""
+    shardmappe = utmappe / SHARDMAPPE
+    shardmappe.mkdir(parents=True, exist_ok=True)
+
+    indeks = {"budsjettaar": budsjettaar}
+    skrevne = set()
+    for side_navn in ["utgifter", "inntekter"]:
+        side = hierarki[side_navn]
+        omraader = []
+        for omr in side["omraader"]:
+            filnavn = f"{side_navn}_{omr['omr_nr']}.json"
+            if (side_navn, omr["omr_nr"]) not in uendrede or not (shardmappe / filnavn).exists():
+                skriv_json(
+                    {"budsjettaar": budsjettaar, "side": side_navn, "omraade": omr},
+                    shardmappe / filnavn, minifisert,
+                )
+            skrevne.add(filnavn)
+            omraader.append({
+                "omr_nr": omr["omr_nr"],
+                "navn": omr["navn"],
+                "total": omr["total"],
+                "endring_fra_saldert": omr["endring_fra_saldert"],
+                "shard": f"{SHARDMAPPE}/{filnavn}",
+            })
+        indeks[side_navn] = {
+            "total": side["total"],
+            "endring_fra_saldert": side["endring_fra_saldert"],
+            "omraader": omraader,
+        }
+
+    # Fjern shards for områder som ikke lenger finnes (inkl. komprimerte søsken),
+    # men ikke midlertidige filer som et samtidig bygg skal bytte inn
+    for fil in shardmappe.iterdir():
+        if er_midlertidig(fil.name):
+            continue
+        if fil.name.split(".json")[0] + ".json" not in skrevne:
+            fil.unlink()
+
+    return skriv_json(indeks, utmappe / INDEKSFIL, minifisert)
+
+
+def sett_sammen_shards(datamappe: Path) -> dict:
+    """Setter sammen utgifter/inntekter fra rotindeks og shards, i samme form
+    som i gul_bok_full.json."""
+    with open(datamappe / INDEKSFIL, encoding="utf-8") as f:
+        indeks = json.load(f)
+
+    resultat = {}
+    for side_navn in ["utgifter", "inntekter"]:
+        side = indeks[side_navn]
+        omraader = []
+        for oppslag in side["omraader"]:
+            with open(datamappe / oppslag["shard"], encoding="utf-8") as f:
+                omraader.append(json.load(f)["omraade"])
+        resultat[side_navn] = {
+            "total": side["total"],
+            "omraader": omraader,
+            "endring_fra_saldert": side["endring_fra_saldert"],
+        }
+    return resultat
+
+
+def _komprimer_fil(filsti: Path) -> dict:
+    """Skriver .gz- og .br-søsken med maksimal komprimering.
+    Søsken som er nyere enn kildefilen hoppes over."""
+    innhold = None
+    rapport = {"fil": f"{filsti.parent.name}/{filsti.name}", "json": filsti.stat().st_size}
+
+    varianter = [("gz", lambda b: gzip.compress(b, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        varianter.append(("br", lambda b: brotli.compress(b, quality=11)))
+
+    for endelse, komprimer in varianter:
+        søsken = filsti.with_name(f"{filsti.name}.{endelse}")
+        if not (søsken.exists() and søsken.stat().st_mtime > filsti.stat().st_mtime):
+            if innhold is None:
+                innhold = filsti.read_bytes()
+            # Skrives alltid (atomisk): mtime skal vise at søskenet er oppdatert
+            skriv_atomisk(søsken, komprimer(innhold))
+        rapport[endelse] = søsken.stat().st_size
+
+    return rapport
+
+
+def komprimer_artefakter(filer: list[Path], maks_arbeidere: int | None = None) -> list[dict]:
+    """Forhåndskomprimerer JSON-filer (gzip nivå 9, brotli kvalitet 11) parallelt.
+    zlib og brotli slipper GIL under komprimering, så tråder gir reell parallellitet.
+    Returnerer en størrelsesrapport per fil (bytes for json, gz og evt. br)."""
+    with ThreadPoolExecutor(max_workers=maks_arbeidere) as pool:
+        return list(pool.map(_komprimer_fil, filer))
+
+
+def skriv_storrelsesrapport(rapport: list[dict]) -> None:
+    """Skriver størrelsesrapporten som en kompakt tabell."""
+    print(f"  {'Fil':<32} {'JSON':>10} {'gzip':>10} {'brotli':>10}")
+    for r in rapport:
+        br = f"{r['br'] / 1024:.1f} KB" if "br" in r else "—"
+        print(f"  {r['fil']:<32} {r['json'] / 1024:>7.1f} KB {r['gz'] / 1024:>7.1f} KB {br:>10}")
+    if brotli is None:
+        print("  (brotli er ikke installert — kun .gz ble skrevet)")
@@ -5,20 +5,33 @@ Brukes til å vise endringer fra vedtatt budsjett i alle visninger.
 Se ENDRINGSVISNING.md for full spesifikasjon.
 """
 
+import numpy as np
 import pandas as pd
 from pathlib import Path
 
+from mellomlager import hent_eller_les, kodeversjon
 
-def les_saldert(saldert_path: str | Path) -> pd.DataFrame:
+# Versjon av normaliseringskoden for saldert (inngår i cache-nøkkelen)
+NORMALISERING_VERSJON = kodeversjon(__file__)
+
+
+def les_saldert(saldert_path: str | Path, bruk_cache: bool = True) -> pd.DataFrame:
     """
     Leser saldert budsjett og returnerer en tabell på post-nivå.
     Saldert har poster med og uten underposter — vi beholder kun
     hovedposter (upost_nr == NaN) for å matche mot Gul bok.
+
+    Normalisert resultat caches som Parquet (se mellomlager.py).
     """
     saldert_path = Path(saldert_path)
     if not saldert_path.exists():
         raise FileNotFoundError(f"Finner ikke saldert budsjett: {saldert_path}")
 
+    return hent_eller_les(saldert_path, NORMALISERING_VERSJON, _les_saldert_excel, bruk_cache)
+
+
+def _les_saldert_excel(saldert_path: Path) -> pd.DataFrame:
+    """Leser og normaliserer saldert budsjett direkte fra Excel-filen."""
     df = pd.read_excel(saldert_path, dtype={"Stikkord": str})
     df = df.rename(columns={
         "Kap. nr":       "kap_nr",
@@ -38,6 +51,44 @@ def les_saldert(saldert_path: str | Path) -> pd.DataFrame:
     return df
 
 
+# Bitfelt for pakkede nøkler: kap_nr (opptil 9999) | post_nr (< 1024) | upost_nr (< 1024)
+_POST_BITS = 10
+_UPOST_BITS = 10
+
+
+def pakk_nokkel(kap_nr, post_nr, upost_nr=0) -> np.ndarray:
+    """Pakker (kap_nr, post_nr[, upost_nr]) til én int64-nøkkel.
+    Nøklene sorterer i samme rekkefølge som tuplene."""
+    kap = np.asarray(kap_nr, dtype=np.int64)
+    post = np.asarray(post_nr, dtype=np.int64)
+    upost = np.asarray(upost_nr, dtype=np.int64)
+    if (post >= 1 << _POST_BITS).any() or (upost >= 1 << _UPOST_BITS).any():
+        raise ValueError("post_nr/upost_nr er for store for pakket nøkkel")
+    return (kap << (_POST_BITS + _UPOST_BITS)) | (post << _UPOST_BITS) | upost
+
+
+def pakk_ut_nokkel(nokkel) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Inversen av pakk_nokkel: (kap_nr, post_nr, upost_nr)."""
+    nokkel = np.asarray(nokkel, dtype=np.int64)
+    maske = (1 << _POST_BITS) - 1
+    return (nokkel >> (_POST_BITS + _UPOST_BITS),
+            (nokkel >> _UPOST_BITS) & maske,
+            nokkel & ((1 << _UPOST_BITS) - 1))
+
+
+def avrund_en_desimal(verdier: np.ndarray) -> np.ndarray:
+    """Avrunder til én desimal med nøyaktig samme resultat som round(x, 1).
+    np.round går via x * 10 og kan havne på feil side av et halvtall, så
+    verdier som ligger nær ,x5 avrundes med Pythons round() enkeltvis."""
+    verdier = np.asarray(verdier, dtype=np.float64)
+    skalert = verdier * 10
+    resultat = np.rint(skalert) / 10
+    naer_halvtall = np.abs(skalert - np.floor(skalert) - 0.5) < 1e-6
+    for i in np.flatnonzero(naer_halvtall & np.isfinite(verdier)):
+        resultat[i] = round(float(verdier[i]), 1)
+    return resultat
+
+
 def beregn_endringsdata(gul_bok_df: pd.DataFrame,
                          saldert: pd.DataFrame) -> pd.DataFrame:
     """
@@ -45,51 +96,57 @@ def beregn_endringsdata(gul_bok_df: pd.DataFrame,
 
     Gul bok aggregeres først til post-nivå (summerer underposter) for kobling.
     Endringsdata skrives tilbake til original-dataframen med underposter.
+    Koblingen gjøres på en pakket (kap_nr, post_nr)-nøkkel med sortering og
+    binærsøk, og alle beregninger er vektoriserte.
 
     Returnerer Gul bok-dataframen beriket med:
     - saldert_belop: beløp fra saldert budsjett (på post-nivå, NaN for nye poster)
     - endring_absolut: gb_belop - saldert_belop
-    - endring_prosent: prosentvis endring (None ved divisjon med 0 / ny post)
+    - endring_prosent: prosentvis endring (NaN ved divisjon med 0 / ny post)
     - er_ny_post: True hvis posten ikke finnes i saldert
     """
     # Aggreger Gul bok til post-nivå (summer underposter)
-    gb_post = (
-        gul_bok_df
-        .groupby(["kap_nr", "post_nr"])["GB"]
-        .sum()
-        .reset_index()
-        .rename(columns={"GB": "gb_post_belop"})
-    )
-
-    # Koble mot saldert — left join beholder alle Gul bok-poster
-    merged = gb_post.merge(
-        saldert,
-        on=["kap_nr", "post_nr"],
-        how="left",
-    )
-
-    # Beregn endringer på post-nivå
-    merged["endring_absolut"] = merged["gb_post_belop"] - merged["saldert_belop"]
-
-    merged["endring_prosent"] = merged.apply(
-        lambda r: (
-            None if pd.isna(r["saldert_belop"]) or r["saldert_belop"] == 0
-            else round(r["endring_absolut"] / abs(r["saldert_belop"]) * 100, 1)
-        ),
-        axis=1,
-    )
-
-    merged["er_ny_post"] = merged["saldert_belop"].isna()
-
-    # Koble tilbake til original-dataframe (med underposter)
-    endring_kolonner = merged[
-        ["kap_nr", "post_nr", "saldert_belop", "endring_absolut", "endring_prosent", "er_ny_post"]
-    ]
+    nokkel = pakk_nokkel(gul_bok_df["kap_nr"], gul_bok_df["post_nr"])
+    poster, radindeks = np.unique(nokkel, return_inverse=True)
+    gb_post = np.zeros(len(poster), dtype=np.int64)
+    np.add.at(gb_post, radindeks, gul_bok_df["GB"].to_numpy(dtype=np.int64))
+
+    # Slå opp saldert-beløp per post (venstrekobling: alle Gul bok-poster beholdes)
+    saldert_nokkel = pakk_nokkel(saldert["kap_nr"], saldert["post_nr"])
+    sortering = np.argsort(saldert_nokkel, kind="stable")
+    saldert_sortert = saldert_nokkel[sortering]
+    if len(saldert_sortert) > 1 and (saldert_sortert[1:] == saldert_sortert[:-1]).any():
+        raise ValueError("Saldert budsjett har flere rader for samme kap_nr/post_nr")
+
+    pos = np.minimum(np.searchsorted(saldert_sortert, poster), max(len(saldert_sortert) - 1, 0))
+    if len(saldert_sortert):
+        funnet = saldert_sortert[pos] == poster
+    else:
+        funnet = np.zeros(len(poster), dtype=bool)
+    saldert_belop = saldert["saldert_belop"].to_numpy(dtype=np.int64)[sortering]
 
-    resultat = gul_bok_df.merge(
-        endring_kolonner,
-        on=["kap_nr", "post_nr"],
-        how="left",
+    if funnet.all():
+        # Alle poster har match: behold heltallstyper (som ved pandas-merge)
+        saldert_post = saldert_belop[pos]
+        endring_abs = gb_post - saldert_post
+    else:
+        saldert_post = np.full(len(poster), np.nan)
+        saldert_post[funnet] = saldert_belop[pos[funnet]]
+        endring_abs = gb_post - saldert_post
+
+    # Prosentvis endring; NaN for nye poster og saldert = 0
+    nevner = np.abs(saldert_post.astype(np.float64))
+    gyldig = funnet & (nevner != 0)
+    endring_pst = np.full(len(poster), np.nan)
+    endring_pst[gyldig] = avrund_en_desimal(endring_abs[gyldig] / nevner[gyldig] * 100)
+
+    # Skriv tilbake til original-dataframe (med underposter)
+    resultat = gul_bok_df.reset_index(drop=True)
+    resultat = resultat.assign(
+        saldert_belop=saldert_post[radindeks],
+        endring_absolut=endring_abs[radindeks],
+        endring_prosent=endring_pst[radindeks],
+        er_ny_post=~funnet[radindeks],
     )
 
     return resultat
@@ -0,0 +1,135 @@
+"""
+Innholdshasher (Merkle-tre) for hierarkiet.
+Hver post, hvert kapittel, hver kategori, hvert område og hver side får en
+stabil hash av innholdet: en post hashes fra sine felt, og en node over fra
+sine egne felt (uten barnelisten) og barnas nøkler og hasher i rekkefølge.
+Hashen til en node endres dermed hvis og bare hvis noe i undertreet endres.
+
+Hashene eksporteres i et sidefil (gul_bok_hasher.json) ved siden av de andre
+filene, slik at selve datasettene er uendret. To bygg kan sammenlignes med
+diff_hashtre() i tid proporsjonal med antall endrede noder (like undertrær
+hoppes over), og områdeshards med uendret hash skrives ikke på nytt, slik at
+filene (og mtime, komprimerte søsken og CDN-cache) beholdes.
+
+Bruk:
+    python hashtre.py data/2025/gul_bok_hasher.json ny/gul_bok_hasher.json
+"""
+
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+FORMAT = "gul_bok_hasher/1"
+HASHLENGDE = 16
+SIDER = ["utgifter", "inntekter"]
+
+# Nivåene under hver side: (listenøkkel, felt som utgjør nøkkelen til barnet)
+NIVAAER = [
+    ("omraader", ("omr_nr",)),
+    ("kategorier", ("kat_nr",)),
+    ("kapitler", ("kap_nr",)),
+    ("poster", ("post_nr", "upost_nr")),
+]
+
+
+def _kanonisk(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode()
+
+
+def _nokkel(node: dict, felt: tuple[str, ...]) -> str:
+    return ".".join(str(node[f]) for f in felt)
+
+
+def _hash_node(node: dict, niva: int) -> dict:
+    """{"hash": ..., "barn": {nøkkel: ...}} for en node på gitt nivå
+    (0 = side); poster er løvnoder med bare hash."""
+    if niva == len(NIVAAER):
+        return {"hash": hashlib.sha256(_kanonisk(node)).hexdigest()[:HASHLENGDE]}
+
+    liste, felt = NIVAAER[niva]
+    h = hashlib.sha256(_kanonisk({k: v for k, v in node.items() if k != liste}))
+    barn = {}
+    for barnenode in node[liste]:
+        nokkel = _nokkel(barnenode, felt)
+        barn[nokkel] = _hash_node(barnenode, niva + 1)
+        h.update(f"\n{nokkel}={barn[nokkel]['hash']}".encode())
+    return {"hash": h.hexdigest()[:HASHLENGDE], "barn": barn}
+
+
+def bygg_hashtre(hierarki: dict, budsjettaar: int, minifisert: bool = False) -> dict:
+    """Hashtreet for begge sider av hierarkiet. minifisert angir formatet
+    filene ved siden av er skrevet i (en uendret hash betyr bare uendret fil
+    når formatet er det samme)."""
+    tre = {"format": FORMAT, "budsjettaar": budsjettaar, "minifisert": minifisert}
+    for side in SIDER:
+        tre[side] = _hash_node(hierarki[side], 0)
+    tre["hash"] = hashlib.sha256(
+        "".join(tre[side]["hash"] for side in SIDER).encode()
+    ).hexdigest()[:HASHLENGDE]
+    return tre
+
+
+def les_hashtre(filsti: Path) -> dict | None:
+    """Leser et hashtre fra disk, eller None hvis filen mangler/er ugyldig."""
+    if not filsti.exists():
+        return None
+    try:
+        with open(filsti, encoding="utf-8") as f:
+            tre = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return tre if tre.get("format") == FORMAT else None
+
+
+def diff_hashtre(gammel: dict, ny: dict) -> list[tuple[list[str], str]]:
+    """Nodene som er forskjellige i to hashtrær: [(sti, status)] der sti er
+    [side, område, kategori, kapittel, post] (nøkler, så langt noden går) og
+    status er "endret", "ny" eller "fjernet". Like undertrær hoppes over, og
+    under nye og fjernede noder listes bare noden selv."""
+    endringer = []
+
+    def sammenlign(g: dict, n: dict, sti: list[str]):
+        if g["hash"] == n["hash"]:
+            return
+        endringer.append((sti, "endret"))
+        g_barn, n_barn = g.get("barn", {}), n.get("barn", {})
+        for nokkel, node in n_barn.items():
+            if nokkel in g_barn:
+                sammenlign(g_barn[nokkel], node, sti + [nokkel])
+            else:
+                endringer.append((sti + [nokkel], "ny"))
+        endringer.extend((sti + [nokkel], "fjernet") for nokkel in g_barn if nokkel not in n_barn)
+
+    for side in SIDER:
+        sammenlign(gammel[side], ny[side], [side])
+    return endringer
+
+
+def uendrede_omraader(gammel: dict | None, ny: dict) -> set[tuple[str, int]]:
+    """(side, omr_nr) for områdene med samme hash i begge trærne, dvs.
+    områdeshards som ikke trenger å skrives på nytt. Tomt hvis det gamle
+    treet mangler eller gjelder et annet år eller skriveformat."""
+    if (gammel is None or gammel["budsjettaar"] != ny["budsjettaar"]
+            or gammel["minifisert"] != ny["minifisert"]):
+        return set()
+    return {
+        (side, int(nokkel))
+        for side in SIDER
+        for nokkel, node in ny[side]["barn"].items()
+        if gammel[side]["barn"].get(nokkel, {}).get("hash") == node["hash"]
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__.strip().splitlines()[-1].strip())
+        sys.exit(2)
+    gammel, ny = (les_hashtre(Path(f)) for f in sys.argv[1:])
+    if gammel is None or ny is None:
+        print("Kunne ikke lese begge hashtrærne")
+        sys.exit(2)
+    endringer = diff_hashtre(gammel, ny)
+    for sti, status in endringer:
+        print(f"  {status:<8} {'/'.join(sti)}")
+    print(f"{len(endringer)} endrede noder" if endringer else "Ingen endringer")
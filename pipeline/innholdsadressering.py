@@ -0,0 +1,113 @@
+"""
+Innholdsadresserte filnavn for public/data/.
+Hver publisert JSON-fil skrives i tillegg under et navn med innholdshash
+(gul_bok_full.json → gul_bok_full.3fa9c1d2e4b7.json, og tilsvarende for
+.gz/.br-søsken), og manifest.json i hver mappe peker fra de logiske navnene
+til de hashede filene. En hashet fil endres aldri, så verten kan levere den
+med «Cache-Control: immutable» og lang levetid; bare manifest.json (og de
+faste navnene) trenger kort TTL.
+
+Filer som ikke lenger er i manifestet føres opp som utgått med dato, og
+slettes først når de har vært utgått lenger enn oppbevaringstiden, slik at
+klienter som har et eldre manifest i cache fortsatt finner filene.
+"""
+
+import json
+import re
+from datetime import date
+from pathlib import Path
+
+from eksporter import skriv_hvis_endret, skriv_json
+from mellomlager import filhash
+
+MANIFESTFIL = "manifest.json"
+FORMAT = "gul_bok_manifest/1"
+HASHLENGDE = 12
+BEHOLD_DAGER = 30
+SØSKEN = ("gz", "br")
+
+# navn.<hash>.json med evt. .gz/.br
+_HASHET = re.compile(rf"\.[0-9a-f]{{{HASHLENGDE}}}\.json(\.(gz|br))?$")
+
+
+def er_hashet(filnavn: str) -> bool:
+    """Om filnavnet er et innholdsadressert navn (navn.<hash>.json[.gz|.br])."""
+    return _HASHET.search(filnavn) is not None
+
+
+def hashet_navn(relativ: Path, innholdshash: str) -> Path:
+    """omraader/utgifter_4.json → omraader/utgifter_4.<hash>.json"""
+    return relativ.with_name(f"{relativ.stem}.{innholdshash[:HASHLENGDE]}{relativ.suffix}")
+
+
+def les_manifest(public_mappe: Path) -> dict | None:
+    """Leser manifest.json i en publisert mappe, eller None hvis det mangler/er ugyldig."""
+    filsti = public_mappe / MANIFESTFIL
+    if not filsti.exists():
+        return None
+    try:
+        with open(filsti, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return manifest if manifest.get("format") == FORMAT else None
+
+
+def publiser_innholdsadressert(filer: list[Path], utmappe: Path, public_mappe: Path,
+                               behold_dager: int = BEHOLD_DAGER,
+                               idag: date | None = None) -> dict:
+    """Kopierer filene (fra utmappe) til hashede navn i public_mappe, med
+    oppdaterte .gz/.br-søsken, skriver manifest.json og rydder utgåtte
+    hashede filer eldre enn behold_dager. Returnerer manifestet."""
+    idag = idag or date.today()
+    forrige = les_manifest(public_mappe) or {}
+
+    oppslag = {}
+    for kilde in filer:
+        relativ = kilde.relative_to(utmappe)
+        hashet = hashet_navn(relativ, filhash(kilde))
+        mål = public_mappe / hashet
+        mål.parent.mkdir(parents=True, exist_ok=True)
+        if not mål.exists():
+            skriv_hvis_endret(mål, kilde.read_bytes())
+        søsken = {}
+        for endelse in SØSKEN:
+            kilde_søsken = kilde.with_name(f"{kilde.name}.{endelse}")
+            mål_søsken = mål.with_name(f"{mål.name}.{endelse}")
+            if kilde_søsken.exists() and kilde_søsken.stat().st_mtime > kilde.stat().st_mtime:
+                skriv_hvis_endret(mål_søsken, kilde_søsken.read_bytes())
+            if mål_søsken.exists():
+                søsken[endelse] = mål_søsken.stat().st_size
+        oppslag[relativ.as_posix()] = {
+            "fil": hashet.as_posix(),
+            "bytes": kilde.stat().st_size,
+            **{f"bytes_{endelse}": størrelse for endelse, størrelse in søsken.items()},
+        }
+
+    # Filer som falt ut av manifestet beholdes i oppbevaringstiden
+    aktive = {o["fil"] for o in oppslag.values()}
+    utgaatte = {fil: dato for fil, dato in forrige.get("utgaatte", {}).items() if fil not in aktive}
+    for gammel in forrige.get("filer", {}).values():
+        if gammel["fil"] not in aktive:
+            utgaatte.setdefault(gammel["fil"], idag.isoformat())
+    utgaatte = {
+        fil: dato for fil, dato in utgaatte.items()
+        if (idag - date.fromisoformat(dato)).days <= behold_dager
+    }
+
+    # Slett hashede filer (og søsken) som verken er aktive eller i oppbevaringstiden
+    beholdes = aktive | set(utgaatte)
+    for fil in [*public_mappe.glob("*.json*"), *public_mappe.glob("*/*.json*")]:
+        if not er_hashet(fil.name):
+            continue
+        json_fil = fil.relative_to(public_mappe).as_posix().split(".json")[0] + ".json"
+        if json_fil not in beholdes:
+            fil.unlink()
+
+    manifest = {
+        "format": FORMAT,
+        "filer": dict(sorted(oppslag.items())),
+        "utgaatte": dict(sorted(utgaatte.items())),
+    }
+    skriv_json(manifest, public_mappe / MANIFESTFIL)
+    return manifest
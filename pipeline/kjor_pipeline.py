@@ -3,22 +3,45 @@ Hovedskript for datapipelinen.
 Kjører alle steg i sekvens: innlesing → hierarki → berikelse → eksport → validering.
 """
 
+import io
 import sys
 import shutil
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext, redirect_stdout
 from pathlib import Path
 
 # Legg til pipeline-mappen i PYTHONPATH
 sys.path.insert(0, str(Path(__file__).parent))
 
-from les_gul_bok import les_gul_bok, valider_grunndata
-from bygg_hierarki import bygg_komplett_hierarki
+from les_gul_bok import les_gul_bok, publiseringsdato, valider_grunndata
+from bygg_hierarki import bygg_visninger
 from berikelse import (
     beregn_spu, generer_aggregert_utgifter, generer_aggregert_inntekter,
-    beregn_oljekorrigert, hent_manuelle_tall,
+    beregn_oljekorrigert, hent_manuelle_tall, sett_fondsuttak, summer_per_post,
 )
 from endringsdata import les_saldert, beregn_endringsdata, valider_endringsdata, statistikk_endringsdata
-from eksporter import eksporter_full, eksporter_aggregert, eksporter_endringer, eksporter_metadata
-from valider import valider_json_filer
+from eksporter import (
+    full_datasett, aggregert_datasett, departement_datasett,
+    eksporter_full, eksporter_aggregert, eksporter_endringer, eksporter_metadata,
+    eksporter_shards, eksporter_kompakt, eksporter_sokeindeks, eksporter_departement,
+    eksporter_aarsendring, eksporter_hashtre,
+    komprimer_artefakter, skriv_storrelsesrapport, skriv_hvis_endret, er_midlertidig,
+    AARSENDRINGFIL, DEPARTEMENTFIL, HASHFIL, INDEKSFIL, KOMPAKTFIL, SHARDMAPPE, SOKEINDEKSFIL,
+)
+from valider import (
+    valider_data, valider_departementer, valider_aarsendring, valider_hashtre, valider_kompakt,
+    valider_shards, FORVENTEDE_FILER, FORVENTEDE_TOTALER,
+)
+from sokeindeks import valider_sokeindeks
+from mellomlager import tom_mellomlager
+from profilering import Profil, PROFILFIL, CPROFILE_MAPPE, skriv_profil, skriv_profiltabell
+from byggmanifest import MANIFESTNAVN, beregn_fingeravtrykk, er_uendret, skriv_manifest
+from tidsserie import TIDSSERIEMAPPE, oppdater_tidsserier
+from innholdsadressering import BEHOLD_DAGER, MANIFESTFIL, er_hashet, publiser_innholdsadressert
+from hashtre import bygg_hashtre, diff_hashtre, les_hashtre, uendrede_omraader
+from sammenligning import STATUSER, aarsendring_datasett, sammenlign_rammer
 
 # Mapping: budsjettår → saldert budsjett-fil (forrige års salderte budsjett)
 SALDERT_FILER: dict[int, str] = {
@@ -26,20 +49,47 @@ SALDERT_FILER: dict[int, str] = {
 }
 
 
-def kjor_pipeline(kildefil: Path, budsjettaar: int, utmappe: Path) -> bool:
-    """Kjører hele datapipelinen. Returnerer True ved suksess."""
+def kjor_pipeline(kildefil: Path, budsjettaar: int, utmappe: Path,
+                  bruk_cache: bool = True, synkroniser: bool = True,
+                  tving: bool = False, minifisert: bool = False,
+                  kompakt: bool = False, kompakte_typer: bool = False,
+                  profil: Profil | None = None) -> bool:
+    """Kjører hele datapipelinen. Returnerer True ved suksess.
+    bruk_cache=False leser Excel-filene på nytt uten å gå via mellomlageret.
+    synkroniser=False lar kalleren synkronisere til public/data/ selv.
+    År med uendret fingeravtrykk i byggmanifest.json hoppes over, med mindre tving=True.
+    minifisert=True skriver JSON uten innrykk og mellomrom.
+    kompakt=True skriver i tillegg gul_bok_kompakt.json (ordbokskodet hierarki).
+    kompakte_typer=True bruker kompakt skjema for tabellen (samme utfiler).
+    profil samler tid og minnebruk per steg (se profilering.py)."""
+    profil = profil or Profil(budsjettaar)
 
     print(f"=== Datapipeline for statsbudsjettet {budsjettaar} ===\n")
 
+    with profil.steg("fingeravtrykk"):
+        fingeravtrykk = _fingeravtrykk(kildefil, budsjettaar,
+                                       {"minifisert": minifisert, "kompakt": kompakt})
+        forrige_fil = _forrige_gul_bok(kildefil, budsjettaar)
+        utfiler = (FORVENTEDE_FILER + [INDEKSFIL, HASHFIL, DEPARTEMENTFIL, SOKEINDEKSFIL]
+                   + ([AARSENDRINGFIL] if forrige_fil else [])
+                   + ([KOMPAKTFIL] if kompakt else []))
+        uendret = er_uendret(utmappe, fingeravtrykk, utfiler)
+    if not tving and uendret:
+        print("  Inndata og kode er uendret siden forrige bygg, hopper over.")
+        if synkroniser:
+            synkroniser_public(utmappe)
+        return True
+
     # Steg 1: Innlesing og validering
-    print("Steg 1: Innlesing og validering...")
-    df = les_gul_bok(kildefil)
-    resultater = valider_grunndata(df)
-    print(f"  {resultater['antall_rader']} rader lest.")
-    print(f"  Utgifter: {resultater['antall_utgiftsposter']} poster, "
-          f"{resultater['total_utgifter_kr'] / 1e9:.1f} mrd. kr")
-    print(f"  Inntekter: {resultater['antall_inntektsposter']} poster, "
-          f"{resultater['total_inntekter_kr'] / 1e9:.1f} mrd. kr")
+    with profil.steg("innlesing"):
+        print("Steg 1: Innlesing og validering...")
+        df = les_gul_bok(kildefil, bruk_cache=bruk_cache, kompakte_typer=kompakte_typer)
+        resultater = valider_grunndata(df)
+        print(f"  {resultater['antall_rader']} rader lest.")
+        print(f"  Utgifter: {resultater['antall_utgiftsposter']} poster, "
+              f"{resultater['total_utgifter_kr'] / 1e9:.1f} mrd. kr")
+        print(f"  Inntekter: {resultater['antall_inntektsposter']} poster, "
+              f"{resultater['total_inntekter_kr'] / 1e9:.1f} mrd. kr")
 
     # Steg 1b: Koble mot saldert budsjett (hvis tilgjengelig)
     saldert_aar = None
@@ -48,98 +98,187 @@ def kjor_pipeline(kildefil: Path, budsjettaar: int, utmappe: Path) -> bool:
     if saldert_filnavn:
         saldert_fil = kildefil.parent / saldert_filnavn
         if saldert_fil.exists():
-            print(f"\nSteg 1b: Endringsdata fra {saldert_filnavn}...")
-            saldert = les_saldert(saldert_fil)
-            saldert_aar = budsjettaar - 1
-            print(f"  Saldert budsjett: {len(saldert)} poster")
-
-            df = beregn_endringsdata(df, saldert)
-            endring_stat = statistikk_endringsdata(df)
-
-            advarsler = valider_endringsdata(df)
-            if advarsler:
-                for a in advarsler:
-                    print(f"  ⚠ {a}")
-            else:
-                print(f"  ✓ {endring_stat['antall_med_match']} av {endring_stat['antall_poster_gb']} poster matchet "
-                      f"({endring_stat['matchrate_prosent']:.1f} %)")
-                print(f"  Total endring: {endring_stat['endring_total_mrd']:.1f} mrd. kr")
+            with profil.steg("endringsdata"):
+                print(f"\nSteg 1b: Endringsdata fra {saldert_filnavn}...")
+                saldert = les_saldert(saldert_fil, bruk_cache=bruk_cache)
+                saldert_aar = budsjettaar - 1
+                print(f"  Saldert budsjett: {len(saldert)} poster")
+
+                df = beregn_endringsdata(df, saldert)
+                endring_stat = statistikk_endringsdata(df)
+
+                advarsler = valider_endringsdata(df)
+                if advarsler:
+                    for a in advarsler:
+                        print(f"  ⚠ {a}")
+                else:
+                    print(f"  ✓ {endring_stat['antall_med_match']} av {endring_stat['antall_poster_gb']} poster matchet "
+                          f"({endring_stat['matchrate_prosent']:.1f} %)")
+                    print(f"  Total endring: {endring_stat['endring_total_mrd']:.1f} mrd. kr")
         else:
             print(f"\n  (Saldert budsjett-fil {saldert_fil} finnes ikke, hopper over endringsdata)")
 
+    # Steg 1c: Sammenlign med Gul bok året før (hvis tilgjengelig)
+    aarsendring = None
+    if forrige_fil:
+        with profil.steg("sammenligning"):
+            print(f"\nSteg 1c: Endringer fra {forrige_fil.name}...")
+            forrige = les_gul_bok(forrige_fil, bruk_cache=bruk_cache)
+            aarsendring = sammenlign_rammer(df, forrige)
+            antall = aarsendring["poster"]["status"].value_counts()
+            print("  " + ", ".join(f"{status} {antall.get(status, 0)}" for status in STATUSER))
+
     # Steg 2-3: Hierarkisk aggregering
-    print("\nSteg 2-3: Hierarkisk aggregering...")
-    hierarki = bygg_komplett_hierarki(df)
-    print(f"  Utgiftsområder: {len(hierarki['utgifter']['omraader'])}")
-    print(f"  Inntektsområder: {len(hierarki['inntekter']['omraader'])}")
+    with profil.steg("hierarki"):
+        print("\nSteg 2-3: Hierarkisk aggregering...")
+        # Programområde- og departementsvisningen bygges fra samme grunnlag
+        visninger = bygg_visninger(df)
+        hierarki = visninger["programomraader"]
+        departementer = visninger["departementer"]
+        print(f"  Utgiftsområder: {len(hierarki['utgifter']['omraader'])}")
+        print(f"  Inntektsområder: {len(hierarki['inntekter']['omraader'])}")
+        print(f"  Departementer: {len(departementer['utgifter']['departementer'])} (utgifter), "
+              f"{len(departementer['inntekter']['departementer'])} (inntekter)")
 
     # Steg 4: SPU-beregninger og berikelse
-    print("\nSteg 4: SPU-beregninger og oljekorrigert budsjett...")
-    spu = beregn_spu(df)
-    print(f"  Overføring til fond: {spu['overfoering_til_fond'] / 1e9:.1f} mrd. kr")
-    print(f"  Overføring fra fond: {spu['overfoering_fra_fond'] / 1e9:.1f} mrd. kr")
-    print(f"  Netto: {spu['netto_overfoering'] / 1e9:.1f} mrd. kr")
-
-    # Oljekorrigerte totaler (post < 90, ekskl. petroleumskapitler)
-    oljekorr = beregn_oljekorrigert(df)
-    sum_utg = oljekorr["utgifter_total"]
-    sum_inn = oljekorr["inntekter_total"]
-
-    # Aggregerte kategorier for stacked barplot
-    utgifter_agg = generer_aggregert_utgifter(df)
-    inntekter_agg = generer_aggregert_inntekter(df)
-
-    # Fondsuttak = oljekorrigert underskudd (balanseringspost for grafen)
-    spu["fondsuttak"] = oljekorr["underskudd"]
-    spu["netto_overfoering_til_spu"] = spu["netto_kontantstrom"] - spu["fondsuttak"]
-
-    print(f"  Utgifter uten olje og gass: {sum_utg / 1e9:.1f} mrd. kr")
-    print(f"  Inntekter uten olje og gass: {sum_inn / 1e9:.1f} mrd. kr")
-    print(f"  Oljekorrigert underskudd (fondsuttak): {spu['fondsuttak'] / 1e9:.1f} mrd. kr")
-    print(f"  Netto overføring til SPU: {spu['netto_overfoering_til_spu'] / 1e9:.1f} mrd. kr")
-
-    # Manuelt innlagte tall (strukturelt underskudd m.m.)
-    manuelle = hent_manuelle_tall(budsjettaar)
-    if manuelle:
-        print(f"  Strukturelt underskudd: {manuelle.get('strukturelt_underskudd', 0) / 1e9:.1f} mrd. kr (manuelt)")
-        if "uttaksprosent" in manuelle:
-            print(f"  Uttaksprosent: {manuelle['uttaksprosent']:.1f} % (manuelt)")
-
-    print(f"  Aggregerte utgiftskategorier: {len(utgifter_agg)}")
-    print(f"  Aggregerte inntektskategorier: {len(inntekter_agg)}")
+    with profil.steg("berikelse"):
+        print("\nSteg 4: SPU-beregninger og oljekorrigert budsjett...")
+        postsummer = summer_per_post(df)
+        spu = beregn_spu(df, postsummer)
+        print(f"  Overføring til fond: {spu['overfoering_til_fond'] / 1e9:.1f} mrd. kr")
+        print(f"  Overføring fra fond: {spu['overfoering_fra_fond'] / 1e9:.1f} mrd. kr")
+        print(f"  Netto: {spu['netto_overfoering'] / 1e9:.1f} mrd. kr")
+
+        # Oljekorrigerte totaler (post < 90, ekskl. petroleumskapitler)
+        oljekorr = beregn_oljekorrigert(df, postsummer)
+        sum_utg = oljekorr["utgifter_total"]
+        sum_inn = oljekorr["inntekter_total"]
+
+        # Aggregerte kategorier for stacked barplot
+        utgifter_agg = generer_aggregert_utgifter(df, postsummer)
+        inntekter_agg = generer_aggregert_inntekter(df, postsummer)
+
+        # Fondsuttak = oljekorrigert underskudd (balanseringspost for grafen)
+        sett_fondsuttak(spu, oljekorr["underskudd"])
+
+        print(f"  Utgifter uten olje og gass: {sum_utg / 1e9:.1f} mrd. kr")
+        print(f"  Inntekter uten olje og gass: {sum_inn / 1e9:.1f} mrd. kr")
+        print(f"  Oljekorrigert underskudd (fondsuttak): {spu['fondsuttak'] / 1e9:.1f} mrd. kr")
+        print(f"  Netto overføring til SPU: {spu['netto_overfoering_til_spu'] / 1e9:.1f} mrd. kr")
+
+        # Manuelt innlagte tall (strukturelt underskudd m.m.)
+        manuelle = hent_manuelle_tall(budsjettaar)
+        if manuelle:
+            print(f"  Strukturelt underskudd: {manuelle.get('strukturelt_underskudd', 0) / 1e9:.1f} mrd. kr (manuelt)")
+            if "uttaksprosent" in manuelle:
+                print(f"  Uttaksprosent: {manuelle['uttaksprosent']:.1f} % (manuelt)")
+
+        print(f"  Aggregerte utgiftskategorier: {len(utgifter_agg)}")
+        print(f"  Aggregerte inntektskategorier: {len(inntekter_agg)}")
 
     # Steg 5: Eksport
-    print("\nSteg 5: Eksport til JSON...")
-    utmappe.mkdir(parents=True, exist_ok=True)
-
-    f1 = eksporter_full(hierarki, spu, budsjettaar, utmappe,
-                        oljekorrigert_utgifter=sum_utg,
-                        oljekorrigert_inntekter=sum_inn,
-                        manuelle_tall=manuelle)
-    print(f"  → {f1} ({f1.stat().st_size / 1024:.1f} KB)")
-
-    f2 = eksporter_aggregert(utgifter_agg, inntekter_agg, spu, budsjettaar, utmappe)
-    print(f"  → {f2} ({f2.stat().st_size / 1024:.1f} KB)")
-
-    f3 = eksporter_endringer(budsjettaar, utmappe,
-                             saldert_aar=saldert_aar,
-                             endring_statistikk=endring_stat)
-    print(f"  → {f3} ({f3.stat().st_size / 1024:.1f} KB)")
-
-    f4 = eksporter_metadata(
-        budsjettaar, spu,
-        hierarki["utgifter"]["total"],
-        hierarki["inntekter"]["total"],
-        oljekorrigert_utgifter=sum_utg,
-        oljekorrigert_inntekter=sum_inn,
-        manuelle_tall=manuelle,
-        utmappe=utmappe,
-    )
-    print(f"  → {f4} ({f4.stat().st_size / 1024:.1f} KB)")
+    with profil.steg("eksport"):
+        print("\nSteg 5: Eksport til JSON...")
+        utmappe.mkdir(parents=True, exist_ok=True)
+        # Publiseringsdatoen tas fra kildefilen, ikke fra klokken: et nytt bygg av
+        # samme inndata gir byte-identiske filer som ikke skrives på nytt
+        publisert = publiseringsdato(kildefil)
+
+        f1 = eksporter_full(hierarki, spu, budsjettaar, utmappe,
+                            oljekorrigert_utgifter=sum_utg,
+                            oljekorrigert_inntekter=sum_inn,
+                            manuelle_tall=manuelle,
+                            minifisert=minifisert,
+                            publisert=publisert)
+        print(f"  → {f1} ({f1.stat().st_size / 1024:.1f} KB)")
+
+        f2 = eksporter_aggregert(utgifter_agg, inntekter_agg, spu, budsjettaar, utmappe,
+                                 minifisert=minifisert)
+        print(f"  → {f2} ({f2.stat().st_size / 1024:.1f} KB)")
+
+        f3 = eksporter_endringer(budsjettaar, utmappe,
+                                 saldert_aar=saldert_aar,
+                                 endring_statistikk=endring_stat,
+                                 minifisert=minifisert)
+        print(f"  → {f3} ({f3.stat().st_size / 1024:.1f} KB)")
+
+        f4 = eksporter_metadata(
+            budsjettaar, spu,
+            hierarki["utgifter"]["total"],
+            hierarki["inntekter"]["total"],
+            oljekorrigert_utgifter=sum_utg,
+            oljekorrigert_inntekter=sum_inn,
+            manuelle_tall=manuelle,
+            utmappe=utmappe,
+            minifisert=minifisert,
+            publisert=publisert,
+        )
+        print(f"  → {f4} ({f4.stat().st_size / 1024:.1f} KB)")
+
+        # Innholdshasher: områder med samme hash som i forrige bygg skrives ikke på nytt
+        hashtre = bygg_hashtre(hierarki, budsjettaar, minifisert=minifisert)
+        forrige_hashtre = les_hashtre(utmappe / HASHFIL)
+        uendrede = uendrede_omraader(forrige_hashtre, hashtre)
+        f5 = eksporter_shards(hierarki, budsjettaar, utmappe, minifisert=minifisert,
+                              uendrede=uendrede)
+        antall_shards = len(list((utmappe / SHARDMAPPE).glob("*.json")))
+        print(f"  → {f5} ({f5.stat().st_size / 1024:.1f} KB) + {antall_shards} områdeshards"
+              f" ({antall_shards - len(uendrede)} skrevet)")
+
+        f_hash = eksporter_hashtre(hashtre, utmappe)
+        if forrige_hashtre is not None:
+            endrede = diff_hashtre(forrige_hashtre, hashtre)
+            print(f"  → {f_hash} ({len(endrede)} endrede noder siden forrige bygg)")
+        else:
+            print(f"  → {f_hash}")
+
+        f_dep = eksporter_departement(departementer, budsjettaar, utmappe, minifisert=minifisert)
+        print(f"  → {f_dep} ({f_dep.stat().st_size / 1024:.1f} KB)")
+
+        f6, sokeindeks = eksporter_sokeindeks(hierarki, budsjettaar, utmappe)
+        print(f"  → {f6} ({f6.stat().st_size / 1024:.1f} KB, "
+              f"{len(sokeindeks['termer'])} termer, "
+              f"{len(sokeindeks['dokumenter']['navn'])} kapitler og poster)")
+
+        if aarsendring is not None:
+            f_aar = eksporter_aarsendring(aarsendring, budsjettaar, budsjettaar - 1,
+                                          utmappe, minifisert=minifisert)
+            print(f"  → {f_aar} ({f_aar.stat().st_size / 1024:.1f} KB)")
+        else:
+            for gammel in utmappe.glob(f"{AARSENDRINGFIL}*"):
+                gammel.unlink()
+
+        if kompakt:
+            f7, kompakt_data = eksporter_kompakt(f1, utmappe)
+            print(f"  → {f7} ({f7.stat().st_size / 1024:.1f} KB, "
+                  f"{f1.stat().st_size / f7.stat().st_size:.1f}× mindre enn {f1.name})")
+        else:
+            # Ikke la en kompakt fil fra et tidligere bygg bli liggende utdatert
+            for gammel in utmappe.glob(f"{KOMPAKTFIL}*"):
+                gammel.unlink()
 
     # Steg 6: Validering
-    print("\nSteg 6: Validering...")
-    feil = valider_json_filer(utmappe, budsjettaar)
+    with profil.steg("validering"):
+        print("\nSteg 6: Validering...")
+        # Validerer objektene i minnet i stedet for å lese de skrevne filene på nytt;
+        # disk-modus (valider_json_filer) brukes for committede data. Shardene
+        # leses fra disk, siden shards for uendrede områder ikke ble skrevet nå
+        full = full_datasett(hierarki, spu, budsjettaar,
+                             oljekorrigert_utgifter=sum_utg,
+                             oljekorrigert_inntekter=sum_inn,
+                             manuelle_tall=manuelle,
+                             publisert=publisert)
+        agg = aggregert_datasett(utgifter_agg, inntekter_agg, spu, budsjettaar)
+        feil = valider_data(full, agg, budsjettaar, agg_filstorrelse=f2.stat().st_size)
+        feil += valider_departementer(departement_datasett(departementer, budsjettaar), full)
+        feil += valider_sokeindeks(sokeindeks, full)
+        feil += valider_shards(utmappe, full)
+        feil += valider_hashtre(hashtre, full, budsjettaar)
+        if kompakt:
+            feil += valider_kompakt(kompakt_data, full)
+        if aarsendring is not None:
+            feil += valider_aarsendring(
+                aarsendring_datasett(aarsendring, budsjettaar, budsjettaar - 1), full)
 
     if feil:
         print("  VALIDERINGSFEIL:")
@@ -149,22 +288,172 @@ def kjor_pipeline(kildefil: Path, budsjettaar: int, utmappe: Path) -> bool:
     else:
         print("  ✓ Alle valideringer bestått.")
 
-    # Synkroniser til public/data/ for klientside-tilgang (drill-down)
-    public_mappe = utmappe.parent.parent / "public" / "data" / utmappe.name
-    public_mappe.mkdir(parents=True, exist_ok=True)
-    for json_fil in utmappe.glob("*.json"):
-        shutil.copy2(json_fil, public_mappe / json_fil.name)
-    print(f"  → Synkronisert til {public_mappe}")
+    skriv_manifest(utmappe, fingeravtrykk)
+
+    if synkroniser:
+        with profil.steg("synkronisering"):
+            synkroniser_public(utmappe)
 
     return True
 
 
+def _fingeravtrykk(kildefil: Path, budsjettaar: int, valg: dict | None = None) -> dict:
+    """Fingeravtrykk av alt som påvirker byggresultatet for et budsjettår."""
+    saldert_fil = None
+    saldert_filnavn = SALDERT_FILER.get(budsjettaar)
+    if saldert_filnavn and (kildefil.parent / saldert_filnavn).exists():
+        saldert_fil = kildefil.parent / saldert_filnavn
+
+    return beregn_fingeravtrykk(
+        kildefil,
+        saldert_fil=saldert_fil,
+        manuelle_tall=hent_manuelle_tall(budsjettaar),
+        forventede_totaler=FORVENTEDE_TOTALER.get(budsjettaar),
+        valg=valg,
+        forrige_fil=_forrige_gul_bok(kildefil, budsjettaar),
+    )
+
+
+def _forrige_gul_bok(kildefil: Path, budsjettaar: int) -> Path | None:
+    """Gul bok for året før, hvis arbeidsboken ligger ved siden av kildefilen."""
+    forrige_fil = kildefil.parent / f"Gul bok {budsjettaar - 1}.xlsx"
+    return forrige_fil if forrige_fil.exists() else None
+
+
+def eksporterte_filer(utmappe: Path) -> list[Path]:
+    """JSON-artefaktene i en utmappe som skal publiseres (uten byggmanifestet),
+    inkludert filene i undermapper (områdeshards, tidsserier)."""
+    filer = sorted(f for f in utmappe.glob("*.json") if f.name != MANIFESTNAVN)
+    return filer + sorted(utmappe.glob("*/*.json"))
+
+
+def _publiser_fil(kilde: Path, mål: Path) -> bool:
+    """Kopierer en fil til public/ atomisk, bare når innholdet er endret.
+    mtime kopieres slik at komprimerte søsken fortsatt kan sammenlignes."""
+    innhold = kilde.read_bytes()
+    skrevet = skriv_hvis_endret(mål, innhold)
+    if skrevet:
+        shutil.copystat(kilde, mål)
+    return skrevet
+
+
+def synkroniser_public(utmappe: Path, innholdsadressert: bool = False,
+                       behold_dager: int = BEHOLD_DAGER) -> Path:
+    """Synkroniserer eksporterte filer (og evt. .gz/.br-søsken) til public/data/
+    for klientside-tilgang (drill-down). Uendrede filer røres ikke, og endrede
+    byttes inn atomisk, så verten aldri leverer en halvskrevet fil.
+    innholdsadressert=True publiserer i tillegg hver fil under et hashet navn
+    med manifest.json (se innholdsadressering.py)."""
+    public_mappe = utmappe.parent.parent / "public" / "data" / utmappe.name
+    publiserte = set()
+    for json_fil in eksporterte_filer(utmappe):
+        relativ = json_fil.relative_to(utmappe)
+        mål = public_mappe / relativ
+        mål.parent.mkdir(parents=True, exist_ok=True)
+        _publiser_fil(json_fil, mål)
+        publiserte.add(relativ)
+
+        # Kun komprimerte søsken som er oppdatert mot JSON-filen publiseres;
+        # utdaterte søsken fjernes slik at verten aldri serverer gamle data
+        for endelse in ("gz", "br"):
+            søsken = json_fil.with_name(f"{json_fil.name}.{endelse}")
+            mål_søsken = mål.with_name(søsken.name)
+            if søsken.exists() and søsken.stat().st_mtime > json_fil.stat().st_mtime:
+                _publiser_fil(søsken, mål_søsken)
+            elif mål_søsken.exists():
+                mål_søsken.unlink()
+
+    # Fjern artefakter i public/ som ikke lenger eksporteres (f.eks. shards for
+    # områder som er borte, eller en kompakt fil fra et tidligere bygg).
+    # Hashede filer og manifestet ryddes kun av publiser_innholdsadressert,
+    # også når dette bygget ikke er innholdsadressert, slik at klienter med
+    # et manifest i hurtigbufferen ikke får 404 innenfor oppbevaringstiden.
+    for fil in [*public_mappe.glob("*.json*"), *public_mappe.glob("*/*.json*")]:
+        if fil.name == MANIFESTFIL or er_hashet(fil.name) or er_midlertidig(fil.name):
+            continue
+        relativ = fil.relative_to(public_mappe)
+        if relativ.with_name(relativ.name.split(".json")[0] + ".json") not in publiserte:
+            fil.unlink()
+
+    if innholdsadressert:
+        manifest = publiser_innholdsadressert(eksporterte_filer(utmappe), utmappe, public_mappe,
+                                              behold_dager=behold_dager)
+        print(f"  → {public_mappe / MANIFESTFIL} ({len(manifest['filer'])} hashede filer, "
+              f"{len(manifest['utgaatte'])} utgåtte i oppbevaringstiden)")
+    print(f"  → Synkronisert til {public_mappe}")
+    return public_mappe
+
+
+def kjor_aar(aar: int, rotmappe: Path, fang_utskrift: bool = False,
+             profilvalg: dict | None = None,
+             **valg) -> tuple[int, bool, str, list[dict]]:
+    """Kjører pipelinen for ett år uten synkronisering til public/data/.
+    Returnerer (år, suksess, logg, profilmålinger). Med fang_utskrift=True
+    samles all utskrift i loggen i stedet for å skrives direkte (for
+    prosesspool). profilvalg sendes til Profil (maal, cprofile_steg).
+    Øvrige nøkkelordargumenter sendes videre til kjor_pipeline."""
+    kildefil = rotmappe / f"Gul bok {aar}.xlsx"
+    utmappe = rotmappe / "data" / str(aar)
+    profil = Profil(aar, cprofile_mappe=rotmappe / CPROFILE_MAPPE, **(profilvalg or {}))
+
+    buffer = io.StringIO()
+    utskrift = redirect_stdout(buffer) if fang_utskrift else nullcontext()
+    with utskrift:
+        try:
+            suksess = kjor_pipeline(kildefil, aar, utmappe, synkroniser=False,
+                                    profil=profil, **valg)
+        except Exception:
+            print(f"FEIL under prosessering av {aar}:")
+            print(traceback.format_exc())
+            suksess = False
+
+    return aar, suksess, buffer.getvalue(), profil.poster
+
+
 if __name__ == "__main__":
     rotmappe = Path(__file__).parent.parent
 
+    parser = argparse.ArgumentParser(description="Datapipeline for statsbudsjettet")
+    parser.add_argument("aar", nargs="*", type=int,
+                        help="Budsjettår som skal prosesseres (standard: alle Gul bok-filer)")
+    parser.add_argument("--ingen-cache", action="store_true",
+                        help="Les Excel-filene direkte uten mellomlager")
+    parser.add_argument("--tom-cache", action="store_true",
+                        help="Slett mellomlageret før kjøring")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="Antall år som prosesseres parallelt (standard: 1)")
+    parser.add_argument("--force", dest="tving", action="store_true",
+                        help="Bygg alle år på nytt selv om inndata og kode er uendret")
+    parser.add_argument("--minifiser", action="store_true",
+                        help="Skriv JSON uten innrykk og mellomrom")
+    parser.add_argument("--komprimer", action="store_true",
+                        help="Skriv forhåndskomprimerte .gz/.br-søsken til alle JSON-filer")
+    parser.add_argument("--kompakt", action="store_true",
+                        help="Skriv i tillegg gul_bok_kompakt.json (ordbokskodet, kolonnevis)")
+    parser.add_argument("--kompakte-typer", action="store_true",
+                        help="Bruk kategoriske navn og små heltallstyper i tabellen (mindre minne)")
+    parser.add_argument("--innholdsadressert", action="store_true",
+                        help="Publiser i tillegg hver fil under et hashet navn med manifest.json "
+                             "(for «immutable» caching)")
+    parser.add_argument("--behold-dager", type=int, default=BEHOLD_DAGER,
+                        help=f"Dager utgåtte hashede filer beholdes (standard: {BEHOLD_DAGER})")
+    parser.add_argument("--profil", action="store_true",
+                        help=f"Mål tid og minne per steg og år, og skriv {PROFILFIL}")
+    parser.add_argument("--profil-uten-minne", action="store_true",
+                        help="Som --profil, men uten tracemalloc (som gjør Python-tunge steg "
+                             "flere ganger tregere)")
+    parser.add_argument("--cprofile", metavar="STEG",
+                        help=f"Kjør ett steg (f.eks. hierarki) under cProfile; "
+                             f"statistikk skrives til {CPROFILE_MAPPE}/")
+    args = parser.parse_args()
+
+    if args.tom_cache:
+        antall = tom_mellomlager(rotmappe)
+        print(f"Slettet {antall} cache-filer.\n")
+
     # Støtt årstall som CLI-argument, eller kjør for alle tilgjengelige år
-    if len(sys.argv) > 1:
-        aar_liste = [int(a) for a in sys.argv[1:]]
+    if args.aar:
+        aar_liste = args.aar
     else:
         # Finn alle Gul bok-filer automatisk
         aar_liste = sorted(
@@ -176,18 +465,83 @@ if __name__ == "__main__":
         print("Ingen Gul bok-filer funnet!")
         sys.exit(1)
 
-    alle_ok = True
+    tilgjengelige = []
     for aar in aar_liste:
         kildefil = rotmappe / f"Gul bok {aar}.xlsx"
-        utmappe = rotmappe / "data" / str(aar)
-
         if not kildefil.exists():
             print(f"Finner ikke {kildefil}, hopper over.")
             continue
-
-        suksess = kjor_pipeline(kildefil, aar, utmappe)
-        if not suksess:
-            alle_ok = False
-        print()
+        tilgjengelige.append(aar)
+
+    valg = {
+        "bruk_cache": not args.ingen_cache,
+        "tving": args.tving,
+        "minifisert": args.minifiser,
+        "kompakt": args.kompakt,
+        "kompakte_typer": args.kompakte_typer,
+    }
+    profilvalg = {
+        "maal": args.profil or args.profil_uten_minne,
+        "maal_minne": not args.profil_uten_minne,
+        "cprofile_steg": args.cprofile,
+    }
+    resultater: dict[int, bool] = {}
+    profilposter: list[dict] = []
+
+    if args.jobs > 1 and len(tilgjengelige) > 1:
+        # Årene er uavhengige; loggene skrives samlet i årsrekkefølge
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            fremtidige = [
+                pool.submit(kjor_aar, aar, rotmappe, True, profilvalg, **valg)
+                for aar in tilgjengelige
+            ]
+            for fremtid in fremtidige:
+                aar, suksess, logg, poster = fremtid.result()
+                print(logg)
+                resultater[aar] = suksess
+                profilposter.extend(poster)
+    else:
+        for aar in tilgjengelige:
+            _, suksess, _, poster = kjor_aar(aar, rotmappe, profilvalg=profilvalg, **valg)
+            resultater[aar] = suksess
+            profilposter.extend(poster)
+            print()
+
+    print("=== Oppsummering ===")
+    for aar, suksess in resultater.items():
+        print(f"  {aar}: {'✓ OK' if suksess else '✗ FEILET'}")
+
+    alle_ok = all(resultater.values())
+
+    # Tidsserier på tvers av alle prosesserte år (også år som ikke ble bygget nå)
+    if alle_ok:
+        print("\nTidsserier...")
+        oppdater_tidsserier(rotmappe / "data", minifisert=args.minifiser, tving=args.tving)
+
+    if profilvalg["maal"] and profilposter:
+        print("\nProfil per steg (sum over år):")
+        skriv_profiltabell(profilposter)
+        profilfil = skriv_profil(profilposter, rotmappe / PROFILFIL,
+                                 valg={**valg, "jobs": args.jobs,
+                                       "minne_sporet": profilvalg["maal_minne"]})
+        print(f"  → {profilfil}")
+
+    # Forhåndskomprimer alle år samlet, parallelt over filer og år
+    if alle_ok and args.komprimer:
+        print("\nKomprimering (gzip/brotli)...")
+        mapper = [str(aar) for aar in resultater] + [TIDSSERIEMAPPE]
+        filer = [f for navn in mapper for f in eksporterte_filer(rotmappe / "data" / navn)]
+        skriv_storrelsesrapport(komprimer_artefakter(filer))
+
+    # Synkroniser til public/data/ først når alle år er validert
+    if alle_ok:
+        publisering = {"innholdsadressert": args.innholdsadressert,
+                       "behold_dager": args.behold_dager}
+        for aar in resultater:
+            synkroniser_public(rotmappe / "data" / str(aar), **publisering)
+        if (rotmappe / "data" / TIDSSERIEMAPPE).exists():
+            synkroniser_public(rotmappe / "data" / TIDSSERIEMAPPE, **publisering)
+    else:
+        print("\nIngen filer synkronisert til public/data/ fordi minst ett år feilet.")
 
     sys.exit(0 if alle_ok else 1)
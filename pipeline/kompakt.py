@@ -0,0 +1,187 @@
+"""
+Kompakt, ordbokskodet variant av gul_bok_full.json.
+Strenger (navn, postgruppe, stikkord) interneres i én strengtabell per fil, og
+hvert hierarkinivå lagres som kolonnearrays i dybde-først-rekkefølge i stedet
+for lister av objekter. Avledede felt i endring_fra_saldert (belop og
+endring_absolut) lagres ikke, men gjenskapes av dekoderen.
+
+dekod_kompakt() er referansedekoderen: den gjenskaper nøyaktig samme struktur
+som eksporter_full skriver.
+"""
+
+FORMAT = "gul_bok_kompakt/1"
+
+# (listenøkkel, nummerfelt) per nodenivå over postene, samme rekkefølge som
+# NIVAAER i bygg_hierarki
+NODENIVAAER = [("omraader", "omr_nr"), ("kategorier", "kat_nr"), ("kapitler", "kap_nr")]
+TOPPFELT = ["budsjettaar", "publisert", "valuta"]
+HALEFELT = ["spu", "oljekorrigert", "metadata"]
+
+
+class _Strengtabell:
+    """Internerer strenger i rekkefølgen de først forekommer."""
+
+    def __init__(self):
+        self.strenger: list[str] = []
+        self._indeks: dict[str, int] = {}
+
+    def __call__(self, s: str) -> int:
+        i = self._indeks.get(s)
+        if i is None:
+            i = self._indeks[s] = len(self.strenger)
+            self.strenger.append(s)
+        return i
+
+
+def _kod_endring(node: dict, belop: int, kolonner: dict):
+    """Legger saldert_forrige og endring_prosent til kolonnene (null når
+    noden mangler saldert). Øvrige felt må kunne avledes av belop."""
+    endring = node["endring_fra_saldert"]
+    if endring is None:
+        kolonner["saldert_forrige"].append(None)
+        kolonner["endring_prosent"].append(None)
+        return
+    saldert = endring["saldert_forrige"]
+    if endring["belop"] != belop or endring["endring_absolut"] != belop - saldert:
+        raise ValueError(f"endring_fra_saldert kan ikke avledes for node: {node}")
+    kolonner["saldert_forrige"].append(saldert)
+    kolonner["endring_prosent"].append(endring["endring_prosent"])
+
+
+def _dekod_endring(belop: int, saldert: int | None, prosent: float | None) -> dict | None:
+    if saldert is None:
+        return None
+    return {
+        "belop": belop,
+        "saldert_forrige": saldert,
+        "endring_absolut": belop - saldert,
+        "endring_prosent": prosent,
+    }
+
+
+def _kod_side(side: dict, streng: _Strengtabell) -> dict:
+    """Flater ut én side (utgifter/inntekter) til kolonnearrays per nivå."""
+    nivaaer = {
+        liste: {nr: [], "navn": [], "total": [], "antall": [],
+                "saldert_forrige": [], "endring_prosent": []}
+        for liste, nr in NODENIVAAER
+    }
+    poster = {
+        "post_nr": [], "upost_nr": [], "navn": [], "belop": [], "postgruppe": [],
+        "stikkord": [], "saldert_forrige": [], "endring_prosent": [],
+    }
+
+    def besok(noder: list[dict], dybde: int):
+        if dybde == len(NODENIVAAER):
+            for post in noder:
+                poster["post_nr"].append(post["post_nr"])
+                poster["upost_nr"].append(post["upost_nr"])
+                poster["navn"].append(streng(post["navn"]))
+                poster["belop"].append(post["belop"])
+                poster["postgruppe"].append(streng(post["postgruppe"]))
+                poster["stikkord"].append([streng(s) for s in post["stikkord"]])
+                _kod_endring(post, post["belop"], poster)
+            return
+
+        liste, nr = NODENIVAAER[dybde]
+        barnenokkel = NODENIVAAER[dybde + 1][0] if dybde + 1 < len(NODENIVAAER) else "poster"
+        kolonner = nivaaer[liste]
+        for node in noder:
+            kolonner[nr].append(node[nr])
+            kolonner["navn"].append(streng(node["navn"]))
+            kolonner["total"].append(node["total"])
+            kolonner["antall"].append(len(node[barnenokkel]))
+            _kod_endring(node, node["total"], kolonner)
+            besok(node[barnenokkel], dybde + 1)
+
+    besok(side["omraader"], 0)
+    topp = {"saldert_forrige": [], "endring_prosent": []}
+    _kod_endring(side, side["total"], topp)
+    return {
+        "total": side["total"],
+        "antall": len(side["omraader"]),
+        "saldert_forrige": topp["saldert_forrige"][0],
+        "endring_prosent": topp["endring_prosent"][0],
+        **nivaaer,
+        "poster": poster,
+    }
+
+
+def _dekod_side(kodet: dict, strenger: list[str]) -> dict:
+    """Gjenskaper én side fra kolonnearrays (inversen av _kod_side)."""
+    posisjon = {liste: 0 for liste, _ in NODENIVAAER}
+    posisjon["poster"] = 0
+    poster = kodet["poster"]
+
+    def bygg(dybde: int, antall: int) -> list[dict]:
+        if dybde == len(NODENIVAAER):
+            start = posisjon["poster"]
+            posisjon["poster"] = start + antall
+            return [
+                {
+                    "post_nr": poster["post_nr"][i],
+                    "upost_nr": poster["upost_nr"][i],
+                    "navn": strenger[poster["navn"][i]],
+                    "belop": poster["belop"][i],
+                    "postgruppe": strenger[poster["postgruppe"][i]],
+                    "stikkord": [strenger[s] for s in poster["stikkord"][i]],
+                    "endring_fra_saldert": _dekod_endring(
+                        poster["belop"][i], poster["saldert_forrige"][i],
+                        poster["endring_prosent"][i],
+                    ),
+                }
+                for i in range(start, start + antall)
+            ]
+
+        liste, nr = NODENIVAAER[dybde]
+        barnenokkel = NODENIVAAER[dybde + 1][0] if dybde + 1 < len(NODENIVAAER) else "poster"
+        kolonner = kodet[liste]
+        noder = []
+        for _ in range(antall):
+            i = posisjon[liste]
+            posisjon[liste] += 1
+            total = kolonner["total"][i]
+            noder.append({
+                nr: kolonner[nr][i],
+                "navn": strenger[kolonner["navn"][i]],
+                "total": total,
+                barnenokkel: bygg(dybde + 1, kolonner["antall"][i]),
+                "endring_fra_saldert": _dekod_endring(
+                    total, kolonner["saldert_forrige"][i], kolonner["endring_prosent"][i],
+                ),
+            })
+        return noder
+
+    return {
+        "total": kodet["total"],
+        "omraader": bygg(0, kodet["antall"]),
+        "endring_fra_saldert": _dekod_endring(
+            kodet["total"], kodet["saldert_forrige"], kodet["endring_prosent"],
+        ),
+    }
+
+
+def kod_kompakt(full: dict) -> dict:
+    """Koder innholdet i gul_bok_full.json til kompakt format."""
+    streng = _Strengtabell()
+    sider = {side: _kod_side(full[side], streng) for side in ["utgifter", "inntekter"]}
+    return {
+        "format": FORMAT,
+        **{felt: full[felt] for felt in TOPPFELT},
+        "strenger": streng.strenger,
+        **sider,
+        **{felt: full[felt] for felt in HALEFELT},
+    }
+
+
+def dekod_kompakt(kompakt: dict) -> dict:
+    """Referansedekoder: gjenskaper strukturen fra gul_bok_full.json."""
+    if kompakt.get("format") != FORMAT:
+        raise ValueError(f"Ukjent kompakt format: {kompakt.get('format')!r}")
+    strenger = kompakt["strenger"]
+    return {
+        **{felt: kompakt[felt] for felt in TOPPFELT},
+        "utgifter": _dekod_side(kompakt["utgifter"], strenger),
+        "inntekter": _dekod_side(kompakt["inntekter"], strenger),
+        **{felt: kompakt[felt] for felt in HALEFELT},
+    }
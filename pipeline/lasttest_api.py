@@ -0,0 +1,137 @@
+"""
+Lasttest for api_server.py.
+Starter serveren i samme prosess (eller bruker --url mot en kjørende server)
+og sender forespørsler fra flere klienttråder over vedvarende HTTP/1.1-
+forbindelser. Stiene trekkes fra en blanding av hierarkioppslag på alle
+nivåer, SPU, endringer og tidsserier for alle år. Rapporterer p50, p90 og
+p99 for svartiden og forespørsler per sekund, totalt og per endepunkttype.
+Med serveren i samme prosess deler klient og server GIL-en, så tallene er
+konservative; --url mot en egen serverprosess gir et mer realistisk bilde.
+
+Bruk:
+    python lasttest_api.py [--antall 20000] [--klienter 8] [--gzip] [--etag]
+    python lasttest_api.py --url http://127.0.0.1:8000
+"""
+
+import argparse
+import http.client
+import random
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from api_server import PREFIKS, Budsjettlager, lag_server
+
+
+def lag_stier(lager: Budsjettlager, seed: int = 0) -> list[tuple[str, str]]:
+    """(type, sti) for alle ressurser i lageret, vektet mot dype oppslag slik
+    en drill-down-klient bruker API-et."""
+    stier = []
+    for aar, aarsdata in sorted(lager.aar.items()):
+        rot = f"{PREFIKS}/{aar}"
+        stier += [("spu", f"{rot}/spu"), ("endringer", f"{rot}/endringer")]
+        for nokkel in aarsdata.noder:
+            side, *nr = nokkel
+            deler = [f"{segment}/{n}" for segment, n in zip(["omraade", "kategori", "kapittel", "post"], nr)]
+            type_ = ["side", "omraade", "kategori", "kapittel", "post"][len(nr)]
+            stier.append((type_, "/".join([rot, side, *deler])))
+    if lager.tidsserier is not None:
+        for side, omr_nr in lager.tidsserier.serier:
+            stier.append(("tidsserie", f"{PREFIKS}/tidsserie?omr_nr={omr_nr}&side={side}"))
+    random.Random(seed).shuffle(stier)
+    return stier
+
+
+def klient(vert: str, port: int, stier: list[tuple[str, str]], hoder: dict,
+           etag: bool, resultater: list):
+    """Sender alle stiene over én vedvarende forbindelse og legger
+    (type, sekunder, status, bytes) til i resultater."""
+    forbindelse = http.client.HTTPConnection(vert, port)
+    etagger: dict[str, str] = {}
+    lokale = []
+    for type_, sti in stier:
+        ekstra = {"If-None-Match": etagger[sti]} if etag and sti in etagger else {}
+        start = time.perf_counter()
+        forbindelse.request("GET", sti, headers={**hoder, **ekstra})
+        svar = forbindelse.getresponse()
+        kropp = svar.read()
+        lokale.append((type_, time.perf_counter() - start, svar.status, len(kropp)))
+        if etag and svar.status == 200:
+            etagger[sti] = svar.getheader("ETag")
+    forbindelse.close()
+    resultater.extend(lokale)
+
+
+def kjor_lasttest(vert: str, port: int, stier: list[tuple[str, str]], antall: int,
+                  klienter: int, gzip: bool = False, etag: bool = False) -> dict:
+    """Fordeler `antall` forespørsler på klienttrådene og returnerer resultatene."""
+    hoder = {"Accept-Encoding": "gzip"} if gzip else {}
+    per_klient = antall // klienter
+    resultater: list = []
+    traader = [
+        threading.Thread(target=klient, args=(
+            vert, port, [stier[(k * 7919 + i) % len(stier)] for i in range(per_klient)],
+            hoder, etag, resultater,
+        ))
+        for k in range(klienter)
+    ]
+    start = time.perf_counter()
+    for t in traader:
+        t.start()
+    for t in traader:
+        t.join()
+    return {"sekunder": time.perf_counter() - start, "resultater": resultater}
+
+
+def skriv_rapport(maaling: dict):
+    resultater = maaling["resultater"]
+    typer = sorted({r[0] for r in resultater})
+    print(f"  {'Type':<10} {'antall':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'KB/svar':>8}")
+    for type_ in [None, *typer]:
+        utvalg = [r for r in resultater if type_ is None or r[0] == type_]
+        tider = np.array([r[1] for r in utvalg]) * 1000
+        p50, p90, p99 = np.percentile(tider, [50, 90, 99])
+        kb = np.mean([r[3] for r in utvalg]) / 1024
+        print(f"  {type_ or 'alle':<10} {len(utvalg):>8} {p50:>8.2f} {p90:>8.2f} {p99:>8.2f} {kb:>8.1f}")
+    statuser = {}
+    for r in resultater:
+        statuser[r[2]] = statuser.get(r[2], 0) + 1
+    print(f"\n  {len(resultater)} forespørsler på {maaling['sekunder']:.2f} s: "
+          f"{len(resultater) / maaling['sekunder']:,.0f} forespørsler/s "
+          f"(status: {', '.join(f'{s}×{n}' for s, n in sorted(statuser.items()))})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lasttest for budsjett-API-et")
+    parser.add_argument("--url", help="Test en kjørende server (standard: start en i prosessen)")
+    parser.add_argument("--data", type=Path, default=Path(__file__).parent.parent / "data")
+    parser.add_argument("--antall", type=int, default=20000, help="Antall forespørsler")
+    parser.add_argument("--klienter", type=int, default=8)
+    parser.add_argument("--gzip", action="store_true", help="Be om gzip (Accept-Encoding)")
+    parser.add_argument("--etag", action="store_true",
+                        help="Send If-None-Match for stier klienten har sett (gir 304)")
+    args = parser.parse_args()
+
+    if args.url:
+        url = urlsplit(args.url)
+        vert, port = url.hostname, url.port or 80
+        lager = Budsjettlager(args.data)
+    else:
+        server, _ = lag_server(args.data, port=0, intervall=None)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        vert, port = server.server_address[:2]
+        lager = server.RequestHandlerClass.lager
+    stier = lag_stier(lager)
+
+    print(f"{len(stier)} stier over {len(lager.aar)} år; {args.antall} forespørsler fra "
+          f"{args.klienter} klienter mot {vert}:{port}"
+          f"{' (gzip)' if args.gzip else ''}{' (If-None-Match)' if args.etag else ''}\n")
+    # Oppvarming: fyller svarbufferen slik at målingen viser stabil tilstand
+    kjor_lasttest(vert, port, stier, len(stier), 1, args.gzip)
+    skriv_rapport(kjor_lasttest(vert, port, stier, args.antall, args.klienter, args.gzip, args.etag))
+
+    if not args.url:
+        server.shutdown()
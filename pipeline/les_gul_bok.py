@@ -3,9 +3,17 @@ Steg 1: Innlesing og validering av Gul bok (Excel).
 Leser kildefilen, validerer kolonner og typer, normaliserer verdier.
 """
 
-import pandas as pd
+import re
+import zipfile
+from datetime import datetime, timezone
 from pathlib import Path
 
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from mellomlager import hent_eller_les, kodeversjon
+
 FORVENTEDE_KOLONNER = [
     "fdep_nr", "fdep_navn", "omr_nr", "kat_nr", "omr_navn", "kat_navn",
     "kap_nr", "post_nr", "upost_nr", "kap_navn", "post_navn", "stikkord", "GB",
@@ -13,70 +21,155 @@ FORVENTEDE_KOLONNER = [
 
 NØKKELFELT = ["fdep_nr", "omr_nr", "kat_nr", "kap_nr", "post_nr", "upost_nr"]
 
+# Tekstkolonner som gjentas på mange rader (kategoriske i kompakt skjema)
+KATEGORISKE_KOLONNER = ["fdep_navn", "omr_navn", "kat_navn", "kap_navn", "post_navn", "stikkord"]
+SIDER = ["utgift", "inntekt"]
+
+# Versjon av normaliseringskoden (inngår i cache-nøkkelen)
+NORMALISERING_VERSJON = kodeversjon(__file__)
 
-def les_gul_bok(filsti: str | Path) -> pd.DataFrame:
+
+# Tidsstempler i dokumentegenskapene (docProps/core.xml), i prioritert rekkefølge
+_DOKUMENTDATOER = [
+    re.compile(rb"<dcterms:modified[^>]*>([^<]+)<"),
+    re.compile(rb"<dcterms:created[^>]*>([^<]+)<"),
+]
+
+
+def publiseringsdato(filsti: str | Path) -> str:
+    """Publiseringsdatoen for en arbeidsbok som ISO-dato (UTC): sist endret
+    ifølge dokumentegenskapene, ellers opprettet, ellers filens mtime.
+    Samme fil gir dermed samme dato uansett når pipelinen kjøres."""
+    filsti = Path(filsti)
+    try:
+        with zipfile.ZipFile(filsti) as arkiv:
+            egenskaper = arkiv.read("docProps/core.xml")
+    except (OSError, KeyError, zipfile.BadZipFile):
+        egenskaper = b""
+    for moenster in _DOKUMENTDATOER:
+        treff = moenster.search(egenskaper)
+        if treff:
+            try:
+                tidspunkt = datetime.fromisoformat(treff.group(1).decode().strip().replace("Z", "+00:00"))
+            except ValueError:
+                continue
+            if tidspunkt.tzinfo is not None:
+                tidspunkt = tidspunkt.astimezone(timezone.utc)
+            return tidspunkt.date().isoformat()
+    return datetime.fromtimestamp(filsti.stat().st_mtime, timezone.utc).date().isoformat()
+
+
+def les_gul_bok(filsti: str | Path, bruk_cache: bool = True,
+                kompakte_typer: bool = False) -> pd.DataFrame:
     """Leser Gul bok Excel-fil og returnerer renset DataFrame.
     Støtter to formater:
     - Eldre (2019-2025): Direkte kolonner med GB og upost_nr
     - Nyere (2026+): Ark «Data», med beløp-kolonne, uten upost_nr
+
+    Normalisert resultat caches som Parquet (se mellomlager.py);
+    bruk_cache=False leser alltid Excel-filen på nytt.
+    kompakte_typer=True returnerer tabellen i kompakt skjema (se til_kompakte_typer).
     """
     filsti = Path(filsti)
     if not filsti.exists():
         raise FileNotFoundError(f"Finner ikke filen: {filsti}")
 
-    # Sjekk om filen har et «Data»-ark (nyere format)
-    xl = pd.ExcelFile(filsti)
-    ark = "Data" if "Data" in xl.sheet_names else 0
+    df = hent_eller_les(filsti, NORMALISERING_VERSJON, les_og_normaliser, bruk_cache)
+    return til_kompakte_typer(df) if kompakte_typer else df
 
-    df = pd.read_excel(filsti, sheet_name=ark, dtype={"stikkord": str})
 
-    # Håndter nyere format: ekstra kolonner og annet beløpsnavn
-    if "beløp" in df.columns and "GB" not in df.columns:
-        df = df.rename(columns={"beløp": "GB"})
+def til_kompakte_typer(df: pd.DataFrame) -> pd.DataFrame:
+    """Kompakt skjema for den normaliserte tabellen: navn og stikkord som
+    kategoriske kolonner, side som kategorisk med to verdier, og nøkkelfeltene
+    nedkonvertert til minste heltallstype som rommer verdiene (GB forblir int64).
+    Alle steg videre i pipelinen gir identisk resultat med dette skjemaet."""
+    endringer = {kol: df[kol].astype("category") for kol in KATEGORISKE_KOLONNER}
+    endringer["side"] = pd.Categorical(df["side"], categories=SIDER)
+    for kol in NØKKELFELT:
+        endringer[kol] = pd.to_numeric(df[kol], downcast="integer")
+    return df.assign(**endringer)
 
-    # Fjern ekstra kolonner som ikke brukes i pipelinen
-    ekstra_kolonner = {"gdep_nr", "avs_nr", "gdep_navn", "avs_navn"}
-    df = df.drop(columns=[k for k in ekstra_kolonner if k in df.columns])
 
-    # Legg til upost_nr = 0 dersom den mangler
-    if "upost_nr" not in df.columns:
-        df["upost_nr"] = 0
+def les_og_normaliser(filsti: Path) -> pd.DataFrame:
+    """Leser og normaliserer Gul bok direkte fra Excel-filen."""
+    kolonner = _les_kolonner(filsti)
 
-    # Valider at vi nå har alle forventede kolonner
-    manglende = set(FORVENTEDE_KOLONNER) - set(df.columns)
-    if manglende:
-        raise ValueError(
-            f"Mangler kolonner etter normalisering: {manglende}\n"
-            f"Har: {list(df.columns)}"
-        )
+    # Legg til upost_nr = 0 dersom den mangler (nyere format)
+    antall = len(kolonner["GB"])
+    if "upost_nr" not in kolonner:
+        kolonner["upost_nr"] = np.zeros(antall, dtype=np.int64)
 
-    # Behold kun forventede kolonner i riktig rekkefølge
-    df = df[FORVENTEDE_KOLONNER]
+    df = pd.DataFrame({kol: kolonner[kol] for kol in FORVENTEDE_KOLONNER})
 
     # Normaliser tekstverdier (trim mellomrom)
     for kol in ["fdep_navn", "omr_navn", "kat_navn", "kap_navn", "post_navn"]:
         df[kol] = df[kol].astype(str).str.strip()
 
     # Fyll NaN i stikkord med tom streng
-    df["stikkord"] = df["stikkord"].fillna("").str.strip()
+    df["stikkord"] = df["stikkord"].fillna("").astype(str).str.strip()
 
-    # Sikre heltallstyper for nøkkelfelt
-    for kol in NØKKELFELT:
-        df[kol] = df[kol].astype(int)
+    # Legg til side-kolonne (utgift/inntekt basert på kap_nr)
+    df["side"] = np.where(df["kap_nr"].to_numpy() >= 3000, "inntekt", "utgift")
 
-    # Beløp som heltall (kroner)
-    df["GB"] = df["GB"].astype(int)
+    return df
 
-    # Legg til side-kolonne (utgift/inntekt basert på kap_nr)
-    df["side"] = df["kap_nr"].apply(lambda x: "inntekt" if x >= 3000 else "utgift")
 
-    # Valider: ingen null-verdier i nøkkelfelt
-    for kol in NØKKELFELT:
-        nullverdier = df[kol].isna().sum()
-        if nullverdier > 0:
-            raise ValueError(f"Fant {nullverdier} null-verdier i kolonne '{kol}'")
+def _les_kolonner(filsti: Path) -> dict[str, np.ndarray]:
+    """Åpner arbeidsboken én gang i read-only-modus og henter kun kolonnene
+    i FORVENTEDE_KOLONNER. Heltallskolonner (nøkkelfelt og beløp) gjøres om
+    til int64 direkte; tekstkolonner returneres som objekt-arrays med NaN
+    for tomme celler.
 
-    return df
+    Støtter to formater:
+    - Eldre (2019-2025): første ark, kolonnene GB og upost_nr
+    - Nyere (2026+): ark «Data», kolonnen «beløp» og uten upost_nr
+    """
+    wb = openpyxl.load_workbook(filsti, read_only=True, data_only=True)
+    try:
+        ark = wb["Data"] if "Data" in wb.sheetnames else wb.worksheets[0]
+        rader = ark.iter_rows(values_only=True)
+        overskrift = list(next(rader, ()))
+
+        # Håndter nyere format: annet beløpsnavn
+        if "beløp" in overskrift and "GB" not in overskrift:
+            overskrift[overskrift.index("beløp")] = "GB"
+
+        valgte = [k for k in FORVENTEDE_KOLONNER if k in overskrift]
+        manglende = set(FORVENTEDE_KOLONNER) - set(valgte) - {"upost_nr"}
+        if manglende:
+            raise ValueError(
+                f"Mangler kolonner etter normalisering: {manglende}\n"
+                f"Har: {[k for k in overskrift if k is not None]}"
+            )
+
+        # Les kun kolonneområdet som dekker de valgte kolonnene, rett inn i kolonnelister
+        indekser = [overskrift.index(k) for k in valgte]
+        forste, siste = min(indekser), max(indekser)
+        relative = [i - forste for i in indekser]
+        kolonneverdier: list[list] = [[] for _ in valgte]
+        for rad in ark.iter_rows(min_row=2, min_col=forste + 1, max_col=siste + 1,
+                                 values_only=True):
+            # Dropp helt tomme rader (typisk etter siste datarad)
+            if all(v is None or v == "" for v in rad):
+                continue
+            for liste, i in zip(kolonneverdier, relative):
+                liste.append(rad[i])
+    finally:
+        wb.close()
+
+    resultat: dict[str, np.ndarray] = {}
+    for kol, data in zip(valgte, kolonneverdier):
+        if kol in NØKKELFELT or kol == "GB":
+            nullverdier = sum(1 for v in data if v is None or v == "")
+            if nullverdier:
+                raise ValueError(f"Fant {nullverdier} null-verdier i kolonne '{kol}'")
+            resultat[kol] = np.fromiter(data, dtype=np.float64, count=len(data)).astype(np.int64)
+        else:
+            resultat[kol] = np.array(
+                [np.nan if v is None or v == "" else str(v) for v in data], dtype=object
+            )
+
+    return resultat
 
 
 def valider_grunndata(df: pd.DataFrame) -> dict:
@@ -0,0 +1,93 @@
+"""
+Mellomlager for normaliserte kildetabeller (Gul bok og saldert budsjett).
+Parsing av Excel med openpyxl tar mesteparten av kjøretiden. Normaliserte
+tabeller lagres derfor som Parquet i .pipeline_cache/ ved siden av kildefilene,
+nøklet på SHA-256 av arbeidsbokens bytes og versjonen av normaliseringskoden.
+
+Krever pyarrow. Uten pyarrow leses kildefilene direkte hver gang.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+
+MAPPENAVN = ".pipeline_cache"
+
+
+def filhash(*filer: str | Path) -> str:
+    """SHA-256 (hex) av innholdet i én eller flere filer, i gitt rekkefølge."""
+    h = hashlib.sha256()
+    for filsti in filer:
+        with open(filsti, "rb") as f:
+            for blokk in iter(lambda: f.read(1 << 20), b""):
+                h.update(blokk)
+    return h.hexdigest()
+
+
+def kodeversjon(*kildefiler: str | Path) -> str:
+    """Versjon av normaliseringskoden: hash av modulfilene som utfører den.
+    Enhver endring i koden gir dermed nye cache-nøkler."""
+    return filhash(*kildefiler)[:16]
+
+
+def har_parquet() -> bool:
+    """Sjekker om Parquet-støtte (pyarrow) er tilgjengelig."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def cache_sti(kildefil: Path, versjon: str) -> Path:
+    """Stien til cache-filen for en kildefil og kodeversjon."""
+    h = hashlib.sha256()
+    h.update(filhash(kildefil).encode())
+    h.update(versjon.encode())
+    return kildefil.parent / MAPPENAVN / f"{kildefil.stem}.{h.hexdigest()[:16]}.parquet"
+
+
+def hent_eller_les(kildefil: str | Path, versjon: str,
+                   leser: Callable[[Path], pd.DataFrame],
+                   bruk_cache: bool = True) -> pd.DataFrame:
+    """Returnerer normalisert tabell fra cache, eller leser kildefilen med
+    `leser` og lagrer resultatet. bruk_cache=False går utenom cachen helt."""
+    kildefil = Path(kildefil)
+    if not bruk_cache or not har_parquet():
+        return leser(kildefil)
+
+    sti = cache_sti(kildefil, versjon)
+    if sti.exists():
+        try:
+            return pd.read_parquet(sti)
+        except Exception as e:
+            print(f"  ⚠ Ugyldig cache-fil {sti.name}, leser kildefilen på nytt ({e})")
+
+    df = leser(kildefil)
+
+    # Skriv til midlertidig fil og bytt inn atomisk; fjern utdaterte versjoner
+    sti.parent.mkdir(parents=True, exist_ok=True)
+    tmp = sti.with_name(f"{sti.name}.{os.getpid()}.tmp")
+    df.to_parquet(tmp)
+    os.replace(tmp, sti)
+    for gammel in sti.parent.glob(f"{kildefil.stem}.*.parquet"):
+        if gammel != sti:
+            gammel.unlink(missing_ok=True)
+
+    return df
+
+
+def tom_mellomlager(mappe: str | Path) -> int:
+    """Sletter alle cache-filer i mappe/.pipeline_cache. Returnerer antall slettet."""
+    cachemappe = Path(mappe) / MAPPENAVN
+    if not cachemappe.exists():
+        return 0
+    antall = 0
+    for fil in cachemappe.iterdir():
+        if fil.is_file():
+            fil.unlink()
+            antall += 1
+    return antall
@@ -0,0 +1,112 @@
+"""
+Instrumentering av pipelinens steg.
+Måler veggtid, CPU-tid og topp-minnebruk (tracemalloc) per steg og år, og kan
+pakke inn ett navngitt steg i cProfile. Resultatene skrives maskinlesbart til
+pipeline_profile.json og oppsummeres i en kompakt tabell.
+
+Alt er avslått som standard; et inaktivt Profil-objekt koster ingenting.
+"""
+
+import cProfile
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+PROFILFIL = "pipeline_profile.json"
+CPROFILE_MAPPE = ".pipeline_cprofile"
+
+
+class Profil:
+    """Samler målinger for ett års kjøring.
+
+    maal=True registrerer veggtid, CPU-tid og topp-minne per steg.
+    tracemalloc gjør Python-tunge steg (JSON-serialisering, hierarkibygging)
+    flere ganger tregere; maal_minne=False måler kun tid, uten denne kostnaden.
+    cprofile_steg="navn" kjører steget med det navnet under cProfile og
+    dumper statistikken til cprofile_mappe/<steg>.<år>.prof."""
+
+    def __init__(self, aar: int, maal: bool = False, maal_minne: bool = True,
+                 cprofile_steg: str | None = None, cprofile_mappe: Path | None = None):
+        self.aar = aar
+        self.maal = maal
+        self.maal_minne = maal and maal_minne
+        self.cprofile_steg = cprofile_steg
+        self.cprofile_mappe = Path(cprofile_mappe or ".")
+        self.poster: list[dict] = []
+
+    @contextmanager
+    def steg(self, navn: str):
+        """Måler blokken som ett steg (no-op når profilen er inaktiv)."""
+        profiler = cProfile.Profile() if navn == self.cprofile_steg else None
+        if not self.maal and profiler is None:
+            yield
+            return
+
+        startet_sporing = False
+        if self.maal_minne:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                startet_sporing = True
+            grunnlinje, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        if self.maal:
+            vegg = time.perf_counter()
+            cpu = time.process_time()
+
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self.cprofile_mappe.mkdir(parents=True, exist_ok=True)
+                stats_fil = self.cprofile_mappe / f"{navn}.{self.aar}.prof"
+                profiler.dump_stats(stats_fil)
+                print(f"  cProfile for «{navn}» skrevet til {stats_fil}")
+
+            if self.maal:
+                vegg = time.perf_counter() - vegg
+                cpu = time.process_time() - cpu
+                topp_mb = None
+                if self.maal_minne:
+                    _, topp = tracemalloc.get_traced_memory()
+                    topp_mb = round((topp - grunnlinje) / 1e6, 2)
+                    if startet_sporing:
+                        tracemalloc.stop()
+                self.poster.append({
+                    "aar": self.aar,
+                    "steg": navn,
+                    "vegg_sekunder": round(vegg, 4),
+                    "cpu_sekunder": round(cpu, 4),
+                    "topp_minne_mb": topp_mb,
+                })
+
+
+def skriv_profil(poster: list[dict], filsti: Path, valg: dict | None = None) -> Path:
+    """Skriver alle målinger (alle år) til pipeline_profile.json."""
+    data = {
+        "generert": datetime.now().isoformat(timespec="seconds"),
+        "valg": valg or {},
+        "steg": poster,
+    }
+    with open(filsti, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return filsti
+
+
+def skriv_profiltabell(poster: list[dict]):
+    """Skriver en kompakt tabell per steg: sum over år og tregeste år."""
+    steg_rekkefolge = list(dict.fromkeys(p["steg"] for p in poster))
+    print(f"  {'Steg':<14} {'vegg (s)':>9} {'CPU (s)':>9} {'topp (MB)':>10}  tregeste år")
+    for navn in steg_rekkefolge:
+        rader = [p for p in poster if p["steg"] == navn]
+        tregeste = max(rader, key=lambda p: p["vegg_sekunder"])
+        minne = [p["topp_minne_mb"] for p in rader if p["topp_minne_mb"] is not None]
+        topp = f"{max(minne):>10.1f}" if minne else f"{'–':>10}"
+        print(f"  {navn:<14} {sum(p['vegg_sekunder'] for p in rader):>9.3f} "
+              f"{sum(p['cpu_sekunder'] for p in rader):>9.3f} {topp}  "
+              f"{tregeste['aar']} ({tregeste['vegg_sekunder']:.3f} s)")
@@ -0,0 +1,188 @@
+"""
+Regresjonssjekk for ytelse.
+Sammenligner siste kjøring i benchmark_historikk.jsonl (se benchmark.py) mot en
+rullerende grunnlinje: median og MAD (median absolutt avvik) av de siste
+committede kjøringene på samme maskin. Et steg regnes som regresjon når det er
+tregere enn grunnlinjen med mer enn både den relative terskelen og
+støytoleransen (et multiplum av MAD), og mer enn et lite absolutt minimum.
+Med færre enn MIN_GRUNNLAG kjøringer i grunnlinjen rapporteres steget som
+"for lite grunnlag" i stedet for å stoppe bygget.
+
+Som standard er det stegene i bygg_hierarki, berikelse og eksporter som
+stopper bygget; de andre vises i diffen. Et tilbakefall til radvise løkker
+gir typisk 10–100× tregere steg og fanges av terskelen med god margin.
+
+Bruk:
+    python regresjonssjekk.py [--kjor] [--vindu 5] [--terskel 0.25]
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from benchmark import HISTORIKKFIL
+
+# Steg som stopper bygget ved regresjon (benchmark-navn → modul)
+PORTSTEG = {
+    "bygg_komplett_hierarki": "bygg_hierarki",
+    "berikelse": "berikelse",
+    "eksport": "eksporter",
+}
+
+# Skalering av MAD til standardavvik for normalfordelt støy
+MAD_SKALA = 1.4826
+
+# Færre kjøringer enn dette gir ingen støytoleranse (MAD er 0 for én kjøring),
+# så et steg kan ikke regnes som regresjon før grunnlinjen er så stor
+MIN_GRUNNLAG = 3
+
+
+def les_historikk(filsti: Path = HISTORIKKFIL) -> list[dict]:
+    """Leser alle kjøringer fra historikkfilen (eldste først)."""
+    if not filsti.exists():
+        return []
+    with open(filsti, encoding="utf-8") as f:
+        return [json.loads(linje) for linje in f if linje.strip()]
+
+
+def grunnlinje(kjoringer: list[dict], felt: str = "sekunder") -> dict[tuple, dict]:
+    """Median og MAD per (skala, steg) over kjøringene."""
+    verdier: dict[tuple, list[float]] = {}
+    for kjoring in kjoringer:
+        for r in kjoring["resultater"]:
+            if r.get(felt) is not None:
+                verdier.setdefault((r["skala"], r["steg"]), []).append(r[felt])
+
+    resultat = {}
+    for nokkel, liste in verdier.items():
+        arr = np.asarray(liste, dtype=float)
+        median = float(np.median(arr))
+        resultat[nokkel] = {
+            "median": median,
+            "mad": float(np.median(np.abs(arr - median))),
+            "antall": len(arr),
+        }
+    return resultat
+
+
+def velg_grunnlinje(historikk: list[dict], kandidat: dict, vindu: int = 5) -> list[dict]:
+    """De siste `vindu` kjøringene før kandidaten som er sammenlignbare:
+    samme maskin, Python-versjon og skjema (typer), uten uncommittede endringer."""
+    tidligere = historikk[:historikk.index(kandidat)] if kandidat in historikk else historikk
+    sammenlignbare = [
+        k for k in tidligere
+        if not k.get("endret")
+        and k.get("maskin") == kandidat.get("maskin")
+        and k.get("python") == kandidat.get("python")
+        and k.get("typer", "standard") == kandidat.get("typer", "standard")
+    ]
+    return sammenlignbare[-vindu:]
+
+
+def sammenlign(kandidat: dict, grunnlinjer: list[dict], felt: str = "sekunder",
+               terskel: float = 0.25, stoyfaktor: float = 3.0,
+               min_absolutt: float = 0.005, min_grunnlag: int = MIN_GRUNNLAG) -> list[dict]:
+    """Sammenligner kandidatens målinger mot grunnlinjen for ett felt.
+    Status per (skala, steg): "regresjon", "forbedring", "ok", "ny" (ingen
+    grunnlinje) eller "for lite grunnlag" (færre enn min_grunnlag kjøringer).
+    Grensen er median + max(terskel·median, stoyfaktor·1,4826·MAD, min_absolutt)."""
+    basis = grunnlinje(grunnlinjer, felt)
+    rader = []
+    for r in kandidat["resultater"]:
+        verdi = r.get(felt)
+        if verdi is None:
+            continue
+        nokkel = (r["skala"], r["steg"])
+        rad = {"skala": r["skala"], "steg": r["steg"], "felt": felt, "ny": verdi,
+               "median": None, "grense": None, "endring_prosent": None, "status": "ny"}
+        if nokkel in basis:
+            b = basis[nokkel]
+            margin = max(terskel * b["median"], stoyfaktor * MAD_SKALA * b["mad"], min_absolutt)
+            rad["median"] = b["median"]
+            rad["grense"] = b["median"] + margin
+            if b["median"] > 0:
+                rad["endring_prosent"] = (verdi - b["median"]) / b["median"] * 100
+            if b["antall"] < min_grunnlag:
+                rad["status"] = "for lite grunnlag"
+            elif verdi > rad["grense"]:
+                rad["status"] = "regresjon"
+            elif verdi < b["median"] - margin:
+                rad["status"] = "forbedring"
+            else:
+                rad["status"] = "ok"
+        rader.append(rad)
+    return rader
+
+
+def feilende(rader: list[dict], portsteg: dict = PORTSTEG) -> list[dict]:
+    """Regresjonene i stegene som skal stoppe bygget."""
+    return [r for r in rader if r["status"] == "regresjon" and r["steg"] in portsteg]
+
+
+def skriv_diff(rader: list[dict], portsteg: dict = PORTSTEG):
+    """Skriver en lesbar diff: ny verdi mot grunnlinje og grense per steg."""
+    enhet = {"sekunder": "s", "topp_minne_mb": "MB"}
+    symbol = {"regresjon": "✗", "forbedring": "↓", "ok": " ", "ny": "?", "for lite grunnlag": "?"}
+    print(f"  {'':1} {'Skala':>5} {'Steg':<24} {'Felt':<4} {'median':>9} {'ny':>9} "
+          f"{'endring':>9} {'grense':>9}")
+    for r in rader:
+        endring = f"{r['endring_prosent']:+8.1f}%" if r["endring_prosent"] is not None else f"{'–':>9}"
+        median = f"{r['median']:>9.3f}" if r["median"] is not None else f"{'–':>9}"
+        grense = f"{r['grense']:>9.3f}" if r["grense"] is not None else f"{'–':>9}"
+        modul = f"  [{portsteg[r['steg']]}]" if r["steg"] in portsteg and r["status"] == "regresjon" else ""
+        print(f"  {symbol[r['status']]} {r['skala']:>4}× {r['steg']:<24} {enhet[r['felt']]:<4} "
+              f"{median} {r['ny']:>9.3f} {endring} {grense}{modul}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regresjonssjekk mot benchmark-historikken")
+    parser.add_argument("--kjor", action="store_true",
+                        help="Kjør benchmark-suiten først og sjekk den nye kjøringen")
+    parser.add_argument("--skala", nargs="+", type=int, default=[1, 10, 100],
+                        help="Skalaer for --kjor (standard: 1 10 100)")
+    parser.add_argument("--vindu", type=int, default=5,
+                        help="Antall tidligere kjøringer i grunnlinjen (standard: 5)")
+    parser.add_argument("--terskel", type=float, default=0.25,
+                        help="Relativ terskel for regresjon (standard: 0.25 = 25 %%)")
+    parser.add_argument("--stoyfaktor", type=float, default=3.0,
+                        help="Antall (robuste) standardavvik som regnes som støy (standard: 3)")
+    parser.add_argument("--min-grunnlag", type=int, default=MIN_GRUNNLAG,
+                        help=f"Minste antall kjøringer i grunnlinjen før et steg kan regnes som "
+                             f"regresjon (standard: {MIN_GRUNNLAG})")
+    parser.add_argument("--minne", action="store_true",
+                        help="Sjekk også topp-minnebruk")
+    args = parser.parse_args()
+
+    if args.kjor:
+        from benchmark import benchmark_steg, lagre_historikk
+        resultater = []
+        for skala in args.skala:
+            resultater.extend(benchmark_steg(skala, maal_minne=args.minne))
+        lagre_historikk(resultater, gjentakelser=3)
+
+    historikk = les_historikk()
+    if not historikk:
+        print(f"Ingen kjøringer i {HISTORIKKFIL.name}; kjør benchmark.py først.")
+        sys.exit(1)
+
+    kandidat = historikk[-1]
+    grunnlinjer = velg_grunnlinje(historikk, kandidat, args.vindu)
+    print(f"Kjøring {(kandidat['commit'] or '?')[:10]} ({kandidat['tidspunkt']}) mot "
+          f"grunnlinje av {len(grunnlinjer)} tidligere kjøring(er)\n")
+
+    rader = sammenlign(kandidat, grunnlinjer, "sekunder", args.terskel, args.stoyfaktor,
+                       min_grunnlag=args.min_grunnlag)
+    if args.minne:
+        rader += sammenlign(kandidat, grunnlinjer, "topp_minne_mb", args.terskel,
+                            args.stoyfaktor, min_absolutt=1.0, min_grunnlag=args.min_grunnlag)
+    skriv_diff(rader)
+
+    regresjoner = feilende(rader)
+    if regresjoner:
+        print(f"\n✗ {len(regresjoner)} ytelsesregresjon(er) i "
+              f"{', '.join(sorted({PORTSTEG[r['steg']] for r in regresjoner}))}")
+        sys.exit(1)
+    print("\n✓ Ingen ytelsesregresjoner i " + ", ".join(PORTSTEG.values()))
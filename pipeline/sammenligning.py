@@ -0,0 +1,330 @@
+"""
+Diffmotor: sammenligner to normaliserte budsjettabeller.
+Fungerer for alle par av tabeller på samme form: Gul bok mot Gul bok (år t mot
+t-1), Gul bok mot saldert budsjett, og senere nysaldert. Begge tabellene
+aggregeres til post-nivå og kobles på den pakkede (kap_nr, post_nr)-nøkkelen
+(se endringsdata.pakk_nokkel).
+
+Hver post får en eksplisitt status:
+- uendret / endret: posten finnes i begge tabellene
+- ny: posten finnes bare i den nye tabellen
+- utgaatt: posten finnes bare i den gamle tabellen
+- omnummerert: en ny og en utgått post i samme kapittel med samme postnavn
+  (entydig), som slås sammen til én rad med gammelt postnummer
+
+Endringer på side-, område-, kategori- og kapittelnivå beregnes i ett
+vektorisert pass: radene sorteres én gang, og alle nivåer summeres med
+np.add.reduceat over gruppegrensene (som i bygg_hierarki).
+"""
+
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from endringsdata import avrund_en_desimal, pakk_nokkel, pakk_ut_nokkel
+
+STATUSER = ["uendret", "endret", "ny", "utgaatt", "omnummerert"]
+
+# Hierarkiattributter som tas med fra tabellene når de finnes (saldert har ingen)
+ATTRIBUTTER = ["side", "omr_nr", "kat_nr", "omr_navn", "kat_navn", "kap_navn", "post_navn"]
+
+# Nivåene det beregnes endringer for: (navn, nøkkelkolonner, navnekolonne)
+NIVAAER = [
+    ("sider", ["side"], None),
+    ("omraader", ["side", "omr_nr"], "omr_navn"),
+    ("kategorier", ["side", "omr_nr", "kat_nr"], "kat_navn"),
+    ("kapitler", ["side", "omr_nr", "kat_nr", "kap_nr"], "kap_navn"),
+]
+
+# Kolonner som summeres per nivå (rekkefølgen i summeringsmatrisen)
+_SUMMER = ["ny_belop", "gammel_belop", "har_gammel", "antall_nye",
+           "antall_utgaatte", "antall_omnummererte", "antall_endrede"]
+
+# Tabellene holdes internt som kolonner av numpy-arrays: å gå via DataFrame for
+# hvert årspar koster mer (konvertering av strengkolonner) enn selve koblingen
+Kolonner = dict[str, np.ndarray]
+
+
+def postnivaa(df: pd.DataFrame, belop_kol: str = "GB") -> Kolonner:
+    """Aggregerer en normalisert tabell til post-nivå (summerer underposter),
+    sortert på den pakkede nøkkelen. Hierarkiattributtene tas fra første rad
+    i posten. Resultatet kan gjenbrukes i mange sammenligninger."""
+    nokkel = pakk_nokkel(df["kap_nr"], df["post_nr"])
+    poster, forste, radindeks = np.unique(nokkel, return_index=True, return_inverse=True)
+    belop = np.zeros(len(poster), dtype=np.int64)
+    np.add.at(belop, radindeks, df[belop_kol].to_numpy(dtype=np.int64))
+
+    kolonner = {
+        "nokkel": poster,
+        "kap_nr": df["kap_nr"].to_numpy(dtype=np.int64)[forste],
+        "belop": belop,
+    }
+    for kol in ATTRIBUTTER:
+        if kol in df.columns:
+            verdier = df[kol].to_numpy()[forste]
+            kolonner[kol] = verdier.astype(np.int64 if kol.endswith("_nr") else object)
+    return kolonner
+
+
+def _normaliser_navn(navn: str) -> str:
+    return " ".join(str(navn).casefold().split())
+
+
+def _omnummererte(ny: Kolonner, gammel: Kolonner) -> list[tuple[int, int]]:
+    """Parer nye og utgåtte poster i samme kapittel med samme postnavn:
+    [(ny nøkkel, gammel nøkkel)]. Bare entydige par (ett navn, én post på
+    hver side) regnes som omnummerert."""
+    if "post_navn" not in ny or "post_navn" not in gammel:
+        return []
+
+    def kandidater(kolonner: Kolonner, maske: np.ndarray) -> dict[tuple, int | None]:
+        funnet: dict[tuple, int | None] = {}
+        for kap, navn, nokkel in zip(kolonner["kap_nr"][maske].tolist(),
+                                     kolonner["post_navn"][maske].tolist(),
+                                     kolonner["nokkel"][maske].tolist()):
+            k = (kap, _normaliser_navn(navn))
+            funnet[k] = None if k in funnet else nokkel
+        return funnet
+
+    nye = kandidater(ny, ~np.isin(ny["nokkel"], gammel["nokkel"]))
+    gamle = kandidater(gammel, ~np.isin(gammel["nokkel"], ny["nokkel"]))
+    return [
+        (nokkel, gamle[k])
+        for k, nokkel in nye.items()
+        if nokkel is not None and gamle.get(k) is not None
+    ]
+
+
+def _plasser(sortert: np.ndarray, nokler: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Posisjonen til hver nøkkel i en sortert nøkkelarray, og om den finnes."""
+    if not len(sortert):
+        return np.zeros(len(nokler), dtype=np.int64), np.zeros(len(nokler), dtype=bool)
+    pos = np.minimum(np.searchsorted(sortert, nokler), len(sortert) - 1)
+    return pos, sortert[pos] == nokler
+
+
+def sammenlign_poster(ny: Kolonner, gammel: Kolonner) -> Kolonner:
+    """Kobler to tabeller på post-nivå (fra postnivaa) og returnerer én rad per
+    post med ny_belop, gammel_belop, endring_absolut, endring_prosent, status og
+    gammelt postnummer. Poster som mangler i en av tabellene får beløp 0 der
+    (har_ny/har_gammel sier hvilke som finnes); endring_prosent er NaN når
+    gammelt beløp mangler eller er 0."""
+    nokler = np.union1d(ny["nokkel"], gammel["nokkel"])
+    kap_nr, post_nr, _ = pakk_ut_nokkel(nokler)
+
+    pos_ny, har_ny = _plasser(ny["nokkel"], nokler)
+    pos_gammel, har_gammel = _plasser(gammel["nokkel"], nokler)
+    bare_gammel = har_gammel & ~har_ny
+    ny_belop = np.where(har_ny, ny["belop"][pos_ny] if len(ny["belop"]) else 0, 0)
+    gammel_belop = np.where(har_gammel, gammel["belop"][pos_gammel] if len(gammel["belop"]) else 0, 0)
+    gammel_post_nr = np.where(har_gammel, post_nr, -1)
+
+    # Omnummererte poster: flytt det gamle beløpet over til den nye nøkkelen
+    # og fjern raden for den utgåtte nøkkelen
+    omnummerert = np.zeros(len(nokler), dtype=bool)
+    behold = np.ones(len(nokler), dtype=bool)
+    par = _omnummererte(ny, gammel)
+    if par:
+        i_ny = np.searchsorted(nokler, [n for n, _ in par])
+        i_gammel = np.searchsorted(nokler, [g for _, g in par])
+        gammel_belop[i_ny] = gammel_belop[i_gammel]
+        gammel_post_nr[i_ny] = gammel_post_nr[i_gammel]
+        har_gammel[i_ny] = True
+        omnummerert[i_ny] = True
+        behold[i_gammel] = False
+
+    status = np.select(
+        [omnummerert, ~har_gammel, ~har_ny, ny_belop == gammel_belop],
+        ["omnummerert", "ny", "utgaatt", "uendret"], "endret",
+    ).astype(object)
+
+    endring_abs = ny_belop - gammel_belop
+    nevner = np.abs(gammel_belop).astype(np.float64)
+    gyldig = har_gammel & (nevner != 0)
+    endring_pst = np.full(len(nokler), np.nan)
+    endring_pst[gyldig] = avrund_en_desimal(endring_abs[gyldig] / nevner[gyldig] * 100)
+
+    resultat = {
+        "kap_nr": kap_nr,
+        "post_nr": post_nr,
+        "gammel_post_nr": gammel_post_nr,
+    }
+
+    # Hierarkiattributter: fra den nye tabellen, ellers fra den gamle, ellers
+    # fra kapitlet i den nye tabellen (utgåtte poster mot saldert, som mangler
+    # attributter). Ukjente numre blir -1.
+    pos_kap, har_kap = _plasser(ny["kap_nr"], kap_nr)
+    for kol in ATTRIBUTTER:
+        er_nr = kol.endswith("_nr")
+        verdier = np.full(len(nokler), -1 if er_nr else None, dtype=np.int64 if er_nr else object)
+        # En tom tabell har ingen rader å hente fra (alle har_*-masker er False)
+        if kol in ny and len(ny[kol]) and kol != "post_navn":
+            verdier = np.where(har_kap, ny[kol][pos_kap], verdier)
+        if kol in gammel and len(gammel[kol]):
+            verdier = np.where(bare_gammel, gammel[kol][pos_gammel], verdier)
+        if kol in ny and len(ny[kol]):
+            verdier = np.where(har_ny, ny[kol][pos_ny], verdier)
+        if kol == "side":
+            verdier = np.where(pd.isna(verdier), np.where(kap_nr >= 3000, "inntekt", "utgift"), verdier)
+        resultat[kol] = verdier
+
+    resultat.update({
+        "ny_belop": ny_belop,
+        "gammel_belop": gammel_belop,
+        "har_ny": har_ny,
+        "har_gammel": har_gammel,
+        "endring_absolut": endring_abs,
+        "endring_prosent": endring_pst,
+        "status": status,
+    })
+    return {kol: verdier[behold] for kol, verdier in resultat.items()}
+
+
+def endringer_per_nivaa(poster: Kolonner) -> dict[str, Kolonner]:
+    """Summerer postendringene til alle nivåer i NIVAAER i ett pass: radene
+    sorteres én gang på (side, omr_nr, kat_nr, kap_nr), og summene for alle
+    kolonner beregnes med én np.add.reduceat per nivå over en felles matrise."""
+    nokkelkolonner = NIVAAER[-1][1]
+    koder = [pd.factorize(poster[kol], sort=True)[0] for kol in nokkelkolonner]
+    rekkefolge = np.lexsort(koder[::-1])
+
+    status = poster["status"][rekkefolge]
+    matrise = np.column_stack([
+        poster["ny_belop"][rekkefolge],
+        poster["gammel_belop"][rekkefolge],
+        poster["har_gammel"][rekkefolge],
+        status == "ny",
+        status == "utgaatt",
+        status == "omnummerert",
+        status == "endret",
+    ]).astype(np.int64)
+
+    ny_gruppe = np.zeros(len(rekkefolge), dtype=bool)
+    ny_gruppe[:1] = True
+    resultat = {}
+    for i, (navn, nokler, navn_kol) in enumerate(NIVAAER):
+        ks = koder[i][rekkefolge]
+        ny_gruppe[1:] |= ks[1:] != ks[:-1]
+        starter = np.flatnonzero(ny_gruppe)
+        summer = (np.add.reduceat(matrise, starter, axis=0) if len(starter)
+                  else np.zeros((0, len(_SUMMER)), dtype=np.int64))
+
+        forste = rekkefolge[starter]
+        niva = {kol: poster[kol][forste] for kol in nokler}
+        niva["navn"] = poster[navn_kol][forste] if navn_kol else niva["side"]
+        niva.update({kol: summer[:, j] for j, kol in enumerate(_SUMMER)})
+
+        niva["endring_absolut"] = niva["ny_belop"] - niva["gammel_belop"]
+        nevner = np.abs(niva["gammel_belop"]).astype(np.float64)
+        gyldig = (niva["har_gammel"] > 0) & (nevner != 0)
+        pst = np.full(len(starter), np.nan)
+        pst[gyldig] = avrund_en_desimal(niva["endring_absolut"][gyldig] / nevner[gyldig] * 100)
+        niva["endring_prosent"] = pst
+        resultat[navn] = niva
+    return resultat
+
+
+def sammenlign_rammer(ny: pd.DataFrame, gammel: pd.DataFrame,
+                      ny_belop: str = "GB", gammel_belop: str = "GB") -> dict[str, pd.DataFrame]:
+    """Sammenligner to normaliserte tabeller (f.eks. Gul bok t mot Gul bok t-1,
+    eller mot saldert med gammel_belop="saldert_belop"). Returnerer
+    {"poster": ..., "sider": ..., "omraader": ..., "kategorier": ..., "kapitler": ...}
+    som DataFrames."""
+    poster = sammenlign_poster(postnivaa(ny, ny_belop), postnivaa(gammel, gammel_belop))
+    nivaaer = endringer_per_nivaa(poster)
+    return {navn: pd.DataFrame(kolonner) for navn, kolonner in {"poster": poster, **nivaaer}.items()}
+
+
+def _tall(verdi):
+    """Numpy-/pandas-verdi til JSON-verdi (NaN → None)."""
+    if pd.isna(verdi):
+        return None
+    if isinstance(verdi, (np.integer, int)):
+        return int(verdi)
+    if isinstance(verdi, (np.floating, float)):
+        return float(verdi)
+    return verdi
+
+
+def _rader(df: pd.DataFrame, kolonner: list[str]) -> list[dict]:
+    kolonner = [kol for kol in kolonner if kol in df.columns]
+    verdier = {kol: df[kol].tolist() for kol in kolonner}
+    return [{kol: _tall(verdier[kol][i]) for kol in kolonner} for i in range(len(df))]
+
+
+def aarsendring_datasett(sammenligning: dict[str, pd.DataFrame], budsjettaar: int,
+                         forrige_aar: int, antall_storste: int = 25) -> dict:
+    """Bygger innholdet i gul_bok_endring_forrige_aar.json: endringer per
+    side, område, kategori og kapittel (flate lister), og lister over nye,
+    utgåtte og omnummererte poster og de største endringene."""
+    belopfelt = ["ny_belop", "gammel_belop", "endring_absolut", "endring_prosent"]
+    tellere = ["antall_nye", "antall_utgaatte", "antall_omnummererte", "antall_endrede"]
+    postfelt = ["kap_nr", "post_nr", "gammel_post_nr", "omr_nr", "kat_nr", "kap_navn",
+                "post_navn", *belopfelt]
+
+    data = {"budsjettaar": budsjettaar, "sammenlignet_med": forrige_aar}
+    for side, verdi in [("utgifter", "utgift"), ("inntekter", "inntekt")]:
+        sider = sammenligning["sider"]
+        side_rad = _rader(sider[sider["side"] == verdi], belopfelt + tellere)
+        data[side] = {
+            **(side_rad[0] if side_rad else {}),
+            **{
+                navn: _rader(sammenligning[navn][sammenligning[navn]["side"] == verdi],
+                             [*nokler[1:], "navn", *belopfelt, *tellere])
+                for navn, nokler, _ in NIVAAER[1:]
+            },
+        }
+
+    poster = sammenligning["poster"]
+    storste = poster.iloc[np.argsort(-poster["endring_absolut"].abs().to_numpy(), kind="stable")]
+    data["poster"] = {
+        status: _rader(poster[poster["status"] == s], ["side", *postfelt])
+        for status, s in [("nye", "ny"), ("utgaatte", "utgaatt"), ("omnummererte", "omnummerert")]
+    }
+    data["poster"]["storste_endringer"] = _rader(storste.head(antall_storste), ["side", *postfelt, "status"])
+    return data
+
+
+def sammenlign_alle_aar(rotmappe: Path, aar_liste: list[int],
+                        bruk_cache: bool = True) -> dict[tuple[int, int], dict[str, Kolonner]]:
+    """Sammenligner alle N×N par av Gul bok-år. Hver arbeidsbok leses (via
+    Parquet-mellomlageret) og aggregeres til post-nivå én gang; hvert par er
+    deretter bare en koblings- og summeringsoperasjon."""
+    from les_gul_bok import les_gul_bok
+
+    postrammer = {
+        aar: postnivaa(les_gul_bok(rotmappe / f"Gul bok {aar}.xlsx", bruk_cache=bruk_cache))
+        for aar in aar_liste
+    }
+    resultater = {}
+    for ny in aar_liste:
+        for gammel in aar_liste:
+            poster = sammenlign_poster(postrammer[ny], postrammer[gammel])
+            resultater[(ny, gammel)] = {"poster": poster, **endringer_per_nivaa(poster)}
+    return resultater
+
+
+if __name__ == "__main__":
+    rotmappe = Path(__file__).parent.parent
+    aar_liste = sorted(int(f.stem.split()[-1]) for f in rotmappe.glob("Gul bok *.xlsx"))
+
+    start = time.perf_counter()
+    alle = sammenlign_alle_aar(rotmappe, aar_liste)
+    sekunder = time.perf_counter() - start
+    print(f"{len(alle)} årspar sammenlignet på {sekunder:.2f} s\n")
+
+    print("Endring i samlede utgifter (mrd. kr), rad mot kolonne:")
+    print("      " + "".join(f"{aar:>8}" for aar in aar_liste))
+    for ny in aar_liste:
+        rad = []
+        for gammel in aar_liste:
+            sider = alle[(ny, gammel)]["sider"]
+            rad.append(sider["endring_absolut"][sider["side"] == "utgift"][0] / 1e9)
+        print(f"{ny:>6}" + "".join(f"{v:>8.1f}" for v in rad))
+
+    print("\nPoststatus, hvert år mot året før:")
+    for ny, gammel in zip(aar_liste[1:], aar_liste[:-1]):
+        status = alle[(ny, gammel)]["poster"]["status"]
+        print(f"  {ny} mot {gammel}: " + ", ".join(f"{s} {(status == s).sum()}" for s in STATUSER))
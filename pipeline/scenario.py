@@ -0,0 +1,415 @@
+"""
+Hva-om-scenarier for redaksjonell forhåndsvisning.
+Holder gul_bok_full.json, gul_bok_aggregert.json og metadata.json for ett
+år i minnet, og oppdaterer dem inkrementelt når en post eller et manuelt
+tall (MANUELLE_TALL) endres, i stedet for å kjøre hele pipelinen på nytt.
+
+En endring på (kap, post, upost) oppdaterer posten, de fire forfedrene
+(kapittel, kategori, område, side), aggregatkategorien posten hører til,
+de oljekorrigerte totalene og SPU-tallene som avhenger av dem — O(dybde),
+uavhengig av hvor mange poster budsjettet har. Resultatet er en JSON Patch
+(RFC 6902) per fil med stier i det eksporterte formatet, slik at en
+forhåndsvisning kan oppdatere seg uten å laste filene på nytt.
+
+Reglene er de samme som i pipelinen (berikelse.py og bygg_hierarki.py), og
+testene sjekker at en inkrementell endring gir det samme som et nytt bygg.
+Shards, departementsvisningen og søkeindeksen dekkes ikke; de bygges av
+pipelinen når endringen legges inn i kildedataene.
+
+Bruk:
+    python scenario.py 2025 1700.1.1=+250000000 2800.50.0=-1e9 [--vis-patch]
+"""
+
+import argparse
+import copy
+import json
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from berikelse import (
+    FARGESKALA, KATEGORIER, SPU_KOMPONENTER, beregn_oljekorrigert, beregn_spu,
+    endring_for_kategori, er_oljekorrigert, generer_aggregert_inntekter,
+    generer_aggregert_utgifter, kategori_for_post, sett_fondsuttak, spu_fra_komponenter,
+    summer_per_post,
+)
+from bygg_hierarki import bygg_komplett_hierarki, endring_for_node
+from eksporter import aggregert_datasett, full_datasett, metadata_datasett
+
+FULLFIL = "gul_bok_full.json"
+AGGREGERTFIL = "gul_bok_aggregert.json"
+METADATAFIL = "metadata.json"
+
+# Sidenøkkel i JSON → sideverdi i tabellen og kategoritabellen
+SIDER = {"utgifter": "utgift", "inntekter": "inntekt"}
+
+MANUELLE_FELT = ("strukturelt_underskudd", "uttaksprosent")
+
+
+def _peker(sti: tuple) -> str:
+    """JSON Pointer (RFC 6901) for en sti av nøkler og indekser."""
+    return "".join("/" + str(d).replace("~", "~0").replace("/", "~1") for d in sti)
+
+
+class _Patch:
+    """Operasjonene fra én eller flere endringer, per fil og sti. Verdiene
+    leses først i operasjoner(), så en sti som endres flere ganger gir én
+    operasjon med sluttverdien. En sti som settes fjerner operasjonene under
+    seg (f.eks. feltene i en kategoriliste som erstattes i sin helhet)."""
+
+    def __init__(self):
+        self.ops: dict[str, dict[tuple, tuple]] = {FULLFIL: {}, AGGREGERTFIL: {}, METADATAFIL: {}}
+
+    def sett(self, fil: str, sti: tuple, objekt, nokkel, op: str = "replace"):
+        ops = self.ops[fil]
+        for gammel in [s for s in ops if s[:len(sti)] == sti]:
+            del ops[gammel]
+        ops[sti] = (op, objekt, nokkel)
+
+    def operasjoner(self) -> dict[str, list[dict]]:
+        return {
+            fil: [
+                {"op": op, "path": _peker(sti)} if op == "remove"
+                else {"op": op, "path": _peker(sti), "value": copy.deepcopy(objekt[nokkel])}
+                for sti, (op, objekt, nokkel) in ops.items()
+            ]
+            for fil, ops in self.ops.items()
+        }
+
+
+class _Post:
+    """En post i hierarkiet med stien dit, forfedrene og hvilke aggregater den inngår i."""
+
+    __slots__ = ("side", "post", "sti", "forfedre", "oljekorrigert", "kategori", "spu")
+
+    def __init__(self, side: str, post: dict, sti: tuple, forfedre: list[tuple[dict, tuple]],
+                 oljekorrigert: bool, kategori: str | None, spu: list[str]):
+        self.side = side
+        self.post = post
+        self.sti = sti
+        self.forfedre = forfedre
+        self.oljekorrigert = oljekorrigert
+        self.kategori = kategori
+        self.spu = spu
+
+
+def anvend_patch(dokument: dict, operasjoner: list[dict]) -> dict:
+    """Anvender add/replace/remove-operasjoner (RFC 6902) på dokumentet,
+    på stedet, og returnerer det."""
+    for op in operasjoner:
+        *forelder, siste = [
+            d.replace("~1", "/").replace("~0", "~") for d in op["path"].split("/")[1:]
+        ]
+        objekt = dokument
+        for d in forelder:
+            objekt = objekt[int(d)] if isinstance(objekt, list) else objekt[d]
+        nokkel = int(siste) if isinstance(objekt, list) else siste
+        if op["op"] == "remove":
+            del objekt[nokkel]
+        elif op["op"] == "add" and isinstance(objekt, list):
+            objekt.insert(nokkel, copy.deepcopy(op["value"]))
+        elif op["op"] in ("add", "replace"):
+            objekt[nokkel] = copy.deepcopy(op["value"])
+        else:
+            raise ValueError(f"Ukjent patch-operasjon: {op['op']}")
+    return dokument
+
+
+class Scenario:
+    """Datasettene for ett år i minnet, med inkrementelle endringer.
+    Dokumentene (full, aggregert, metadata) kopieres ved oppstart og holdes
+    oppdatert; endre_post/endre_poster/endre_manuelle_tall returnerer
+    patchen per filnavn."""
+
+    def __init__(self, full: dict, aggregert: dict, metadata: dict | None = None,
+                 kategorier: list[dict] | None = None):
+        self.full = copy.deepcopy(full)
+        self.aggregert = copy.deepcopy(aggregert)
+        self.metadata = copy.deepcopy(metadata) if metadata is not None else None
+        self.kategorier = kategorier or KATEGORIER
+        self._rekkefolge = {kat["id"]: i for i, kat in enumerate(self.kategorier)}
+
+        # Én felles spu-ordbok for alle filene, som i pipelinen
+        self.spu = self.full["spu"]
+        self.aggregert["spu"] = self.spu
+        if self.metadata is not None:
+            self.metadata["spu"] = self.spu
+
+        self._poster: dict[tuple[int, int, int], _Post] = {}
+        self._postgrupper: dict[tuple[int, int], list[tuple[dict, tuple]]] = {}
+        self._spu_summer = {navn: 0 for navn in SPU_KOMPONENTER}
+        for side, sideverdi in SIDER.items():
+            side_node = self.full[side]
+            for i, omr in enumerate(side_node["omraader"]):
+                omr_sti = (side, "omraader", i)
+                for j, kat in enumerate(omr["kategorier"]):
+                    kat_sti = omr_sti + ("kategorier", j)
+                    for k, kap in enumerate(kat["kapitler"]):
+                        kap_sti = kat_sti + ("kapitler", k)
+                        forfedre = [(kap, kap_sti), (kat, kat_sti), (omr, omr_sti), (side_node, (side,))]
+                        for n, post in enumerate(kap["poster"]):
+                            self._legg_til(sideverdi, omr["omr_nr"], kap["kap_nr"], post,
+                                           kap_sti + ("poster", n), forfedre)
+
+    def _legg_til(self, sideverdi: str, omr_nr: int, kap_nr: int, post: dict, sti: tuple,
+                  forfedre: list[tuple[dict, tuple]]):
+        post_nr = post["post_nr"]
+        nokkel = (kap_nr, post_nr, post["upost_nr"])
+        if nokkel in self._poster:
+            raise ValueError(f"Posten {'.'.join(map(str, nokkel))} finnes flere steder i hierarkiet")
+
+        oljekorrigert = er_oljekorrigert(sideverdi, kap_nr, post_nr)
+        kategori = (kategori_for_post(sideverdi, omr_nr, kap_nr, post_nr, self.kategorier)
+                    if oljekorrigert else None)
+        spu = [
+            navn for navn, (kap, post_filter, side) in SPU_KOMPONENTER.items()
+            if kap_nr in kap and post_filter in (None, post_nr) and side in (None, sideverdi)
+        ]
+        for navn in spu:
+            self._spu_summer[navn] += post["belop"]
+
+        self._poster[nokkel] = _Post(sideverdi, post, sti, forfedre, oljekorrigert, kategori, spu)
+        self._postgrupper.setdefault((kap_nr, post_nr), []).append((post, sti))
+
+    @classmethod
+    def fra_tabell(cls, df: pd.DataFrame, budsjettaar: int, manuelle_tall: dict | None = None,
+                   kategorier: list[dict] | None = None) -> "Scenario":
+        """Bygger datasettene fra en (evt. endringsberiket) Gul bok-tabell
+        med de samme stegene som kjor_pipeline."""
+        hierarki = bygg_komplett_hierarki(df)
+        postsummer = summer_per_post(df)
+        spu = beregn_spu(df, postsummer)
+        oljekorr = beregn_oljekorrigert(df, postsummer)
+        utgifter_agg = generer_aggregert_utgifter(df, postsummer, kategorier)
+        inntekter_agg = generer_aggregert_inntekter(df, postsummer, kategorier)
+        sett_fondsuttak(spu, oljekorr["underskudd"])
+
+        full = full_datasett(hierarki, spu, budsjettaar,
+                             oljekorrigert_utgifter=oljekorr["utgifter_total"],
+                             oljekorrigert_inntekter=oljekorr["inntekter_total"],
+                             manuelle_tall=manuelle_tall)
+        aggregert = aggregert_datasett(utgifter_agg, inntekter_agg, spu, budsjettaar)
+        metadata = metadata_datasett(budsjettaar, spu,
+                                     hierarki["utgifter"]["total"], hierarki["inntekter"]["total"],
+                                     oljekorrigert_utgifter=oljekorr["utgifter_total"],
+                                     oljekorrigert_inntekter=oljekorr["inntekter_total"],
+                                     manuelle_tall=manuelle_tall,
+                                     publisert=full["publisert"])
+        return cls(full, aggregert, metadata, kategorier)
+
+    @classmethod
+    def fra_mappe(cls, datamappe: Path, kategorier: list[dict] | None = None) -> "Scenario":
+        """Laster de eksporterte filene for ett år (f.eks. data/2025/).
+        metadata.json er valgfri; mangler de andre, gir det FileNotFoundError."""
+        def les(filnavn: str, paakrevd: bool = True) -> dict | None:
+            filsti = datamappe / filnavn
+            if not filsti.exists():
+                if paakrevd:
+                    raise FileNotFoundError(f"Finner ikke {filsti}")
+                return None
+            with open(filsti, encoding="utf-8") as f:
+                return json.load(f)
+
+        return cls(les(FULLFIL), les(AGGREGERTFIL), les(METADATAFIL, paakrevd=False), kategorier)
+
+    @property
+    def underskudd(self) -> int:
+        """Oljekorrigert underskudd (= fondsuttak)."""
+        olje = self.full["oljekorrigert"]
+        return olje["utgifter_total"] - olje["inntekter_total"]
+
+    def endre_post(self, kap_nr: int, post_nr: int, upost_nr: int, delta: int) -> dict[str, list[dict]]:
+        """Legger delta (kr) til én (under)post. Returnerer {filnavn: patch}."""
+        return self.endre_poster([(kap_nr, post_nr, upost_nr, delta)])
+
+    def endre_poster(self, endringer: list[tuple[int, int, int, int]]) -> dict[str, list[dict]]:
+        """Som endre_post for flere (kap, post, upost, delta), samlet i én patch."""
+        patch = _Patch()
+        for kap_nr, post_nr, upost_nr, delta in endringer:
+            self._endre_post(patch, kap_nr, post_nr, upost_nr, int(delta))
+        return patch.operasjoner()
+
+    def _endre_post(self, patch: _Patch, kap_nr: int, post_nr: int, upost_nr: int, delta: int):
+        ref = self._poster.get((kap_nr, post_nr, upost_nr))
+        if ref is None:
+            raise KeyError(f"Finner ikke post {kap_nr}.{post_nr}.{upost_nr}")
+        if delta == 0:
+            return
+
+        post = ref.post
+        post["belop"] += delta
+        patch.sett(FULLFIL, ref.sti + ("belop",), post, "belop")
+
+        # Endring fra saldert er på post-nivå og står på alle underpostene
+        for underpost, sti in self._postgrupper[(kap_nr, post_nr)]:
+            endring = underpost["endring_fra_saldert"]
+            if endring is None:
+                continue
+            if underpost is post:
+                endring["belop"] += delta
+            endring["endring_absolut"] += delta
+            saldert = endring["saldert_forrige"]
+            endring["endring_prosent"] = (
+                round(endring["endring_absolut"] / abs(saldert) * 100, 1) if saldert != 0 else None
+            )
+            patch.sett(FULLFIL, sti + ("endring_fra_saldert",), underpost, "endring_fra_saldert")
+
+        # Kapittel, kategori, område og side
+        for node, sti in ref.forfedre:
+            node["total"] += delta
+            patch.sett(FULLFIL, sti + ("total",), node, "total")
+            endring = node["endring_fra_saldert"]
+            if endring is not None:
+                node["endring_fra_saldert"] = endring_for_node(
+                    node["total"], endring["saldert_forrige"], True
+                )
+                patch.sett(FULLFIL, sti + ("endring_fra_saldert",), node, "endring_fra_saldert")
+        side = ref.forfedre[-1][1][0]
+        if self.metadata is not None:
+            totaler = self.metadata["totaler"]
+            totaler[side] += delta
+            patch.sett(METADATAFIL, ("totaler", side), totaler, side)
+
+        if ref.oljekorrigert:
+            olje = self.full["oljekorrigert"]
+            olje[f"{side}_total"] += delta
+            patch.sett(FULLFIL, ("oljekorrigert", f"{side}_total"), olje, f"{side}_total")
+            if self.metadata is not None:
+                totaler = self.metadata["oljekorrigert_totaler"]
+                totaler[side] += delta
+                patch.sett(METADATAFIL, ("oljekorrigert_totaler", side), totaler, side)
+            if ref.kategori is not None:
+                self._endre_kategori(patch, side, ref.kategori, delta)
+
+        for navn in ref.spu:
+            self._spu_summer[navn] += delta
+        if ref.oljekorrigert or ref.spu:
+            self._oppdater_spu(patch)
+
+    def _endre_kategori(self, patch: _Patch, side: str, kategori: str, delta: int):
+        """Oppdaterer én aggregatkategori, sorterer og fargelegger på nytt
+        som generer_aggregert og oppdaterer de balanserte totalene."""
+        listenøkkel = f"{side}_aggregert"
+        liste = self.aggregert[listenøkkel]
+        element = next(k for k in liste if k["id"] == kategori)
+        element["belop"] += delta
+        felt = ["belop"]
+        if "saldert_belop" in element:
+            endring = endring_for_kategori(element["belop"], element["saldert_belop"], 1)
+            element.update(endring)
+            felt += list(endring)
+
+        for_sortering = [k["id"] for k in liste]
+        liste.sort(key=lambda k: (-k["belop"], self._rekkefolge[k["id"]]))
+        if [k["id"] for k in liste] != for_sortering:
+            skala = FARGESKALA[SIDER[side]]
+            for i, k in enumerate(liste):
+                k["farge"] = skala[i] if i < len(skala) else skala[-1]
+            patch.sett(AGGREGERTFIL, (listenøkkel,), self.aggregert, listenøkkel)
+        else:
+            i = liste.index(element)
+            for f in felt:
+                patch.sett(AGGREGERTFIL, (listenøkkel, i, f), element, f)
+
+        if side == "utgifter":
+            # Balansert: ordinære inntekter + fondsuttak = utgifter (se aggregert_datasett)
+            total = sum(k["belop"] for k in liste)
+            for f in ("total_utgifter", "total_inntekter"):
+                self.aggregert[f] = total
+                patch.sett(AGGREGERTFIL, (f,), self.aggregert, f)
+
+    def _oppdater_spu(self, patch: _Patch):
+        """Regner SPU-tallene på nytt fra komponentsummene og underskuddet
+        (et konstant antall felt) og tar med feltene som endret seg."""
+        ny = spu_fra_komponenter(self._spu_summer)
+        sett_fondsuttak(ny, self.underskudd)
+        filer = [FULLFIL, AGGREGERTFIL] + ([METADATAFIL] if self.metadata is not None else [])
+        for felt, verdi in ny.items():
+            if self.spu.get(felt) != verdi:
+                self.spu[felt] = verdi
+                for fil in filer:
+                    patch.sett(fil, ("spu", felt), self.spu, felt)
+
+    def endre_manuelle_tall(self, tall: dict) -> dict[str, list[dict]]:
+        """Setter manuelle tall (som i MANUELLE_TALL); None fjerner et tall.
+        Returnerer {filnavn: patch}."""
+        patch = _Patch()
+        mål = [(FULLFIL, ("oljekorrigert",), self.full["oljekorrigert"])]
+        if self.metadata is not None:
+            mål.append((METADATAFIL, ("oljekorrigert_totaler",),
+                        self.metadata["oljekorrigert_totaler"]))
+        for felt, verdi in tall.items():
+            if felt not in MANUELLE_FELT:
+                raise ValueError(f"Ukjent manuelt tall: {felt}")
+            for fil, sti, objekt in mål:
+                if verdi is None:
+                    if felt in objekt:
+                        del objekt[felt]
+                        patch.sett(fil, sti + (felt,), objekt, felt, "remove")
+                else:
+                    objekt[felt] = verdi
+                    patch.sett(fil, sti + (felt,), objekt, felt, "add")
+        return patch.operasjoner()
+
+
+def _les_endring(tekst: str) -> tuple[int, int, int, int]:
+    """«kap.post[.upost]=delta» → (kap, post, upost, delta)."""
+    nokkel, _, delta = tekst.partition("=")
+    try:
+        deler = [int(d) for d in nokkel.split(".")]
+        belop = int(float(delta))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Ugyldig endring «{tekst}», forventet kap.post[.upost]=delta")
+    if len(deler) not in (2, 3):
+        raise argparse.ArgumentTypeError(
+            f"Ugyldig nøkkel «{nokkel}», forventet kap.post eller kap.post.upost")
+    if len(deler) == 2:
+        deler.append(0)
+    return (*deler, belop)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hva-om-endringer mot de eksporterte datasettene")
+    parser.add_argument("aar", type=int, help="Budsjettår (leser data/<år>/)")
+    parser.add_argument("endringer", nargs="*", type=_les_endring,
+                        help="kap.post[.upost]=delta i kroner, f.eks. 1700.1.1=+250000000")
+    parser.add_argument("--strukturelt-underskudd", type=lambda v: int(float(v)))
+    parser.add_argument("--uttaksprosent", type=float)
+    parser.add_argument("--vis-patch", action="store_true", help="Skriv patchene som JSON")
+    args = parser.parse_args()
+
+    datamappe = Path(__file__).parent.parent / "data" / str(args.aar)
+    start = time.perf_counter()
+    try:
+        scenario = Scenario.fra_mappe(datamappe)
+    except FileNotFoundError as e:
+        print(e.args[0])
+        sys.exit(2)
+    print(f"Lastet {len(scenario._poster)} poster fra {datamappe} "
+          f"på {(time.perf_counter() - start) * 1000:.0f} ms")
+    for_underskudd = scenario.underskudd
+
+    start = time.perf_counter()
+    try:
+        patcher = scenario.endre_poster(args.endringer)
+    except KeyError as e:
+        print(e.args[0])
+        sys.exit(2)
+    manuelle = {f: v for f in MANUELLE_FELT
+                if (v := getattr(args, f)) is not None}
+    if manuelle:
+        for fil, ops in scenario.endre_manuelle_tall(manuelle).items():
+            patcher[fil] += ops
+    tid = time.perf_counter() - start
+
+    print(f"{len(args.endringer)} postendringer på {tid * 1e6:.0f} µs")
+    for fil, ops in patcher.items():
+        print(f"  {fil}: {len(ops)} operasjoner")
+    print(f"Oljekorrigert underskudd (fondsuttak): {for_underskudd / 1e9:.1f} → "
+          f"{scenario.underskudd / 1e9:.1f} mrd. kr")
+    print(f"Netto overføring til SPU: {scenario.spu['netto_overfoering_til_spu'] / 1e9:.1f} mrd. kr")
+    if args.vis_patch:
+        print(json.dumps(patcher, ensure_ascii=False, indent=2))
@@ -0,0 +1,158 @@
+"""
+Søkeindeks over kapitler og poster.
+Bygger en invertert indeks per budsjettår fra hierarkiet: hvert kapittel og
+hver post er et dokument, og ordene i kapittel- og postnavn og i stikkordene
+(se parse_stikkord) er søketermer. Termlisten er sortert, slik at et
+prefikssøk er et binærsøk fulgt av en kort skanning. Hvert dokument peker på
+stien i hierarkiet (side, område, kategori, kapittel, post som indekser), så
+klienten kan slå opp noden i gul_bok_full.json eller i områdeshardet.
+
+Tokeniseringen er tilpasset norsk: æ, ø og å er egne bokstaver, bindestreks-
+sammensetninger gir både delene og det sammenskrevne ordet (Nord-Norge →
+nord, norge, nordnorge), vanlige småord fjernes, og hvert ord med æ/ø/å
+indekseres også i ASCII-form (økonomi → okonomi).
+
+sok() er referanseimplementasjonen av spørringen klienten skal gjøre.
+"""
+
+import re
+import unicodedata
+from bisect import bisect_left
+
+FORMAT = "gul_bok_sokeindeks/1"
+SIDER = ["utgifter", "inntekter"]
+DOKUMENTTYPER = ["kapittel", "post"]
+
+STOPPORD = {
+    "og", "i", "til", "for", "av", "med", "på", "fra", "om", "ved", "under",
+    "mv", "mm", "m", "v", "samt", "mot", "etter", "eller", "kan", "den", "det",
+    "de", "en", "et", "som", "ikke", "over",
+}
+
+_ORD = re.compile(r"[^\W_]+(?:-[^\W_]+)*")
+_ASCII = str.maketrans({"æ": "ae", "ø": "o", "å": "a", "é": "e", "è": "e", "ü": "u"})
+
+
+def tokeniser(tekst: str) -> list[str]:
+    """Deler tekst i normaliserte søketermer (små bokstaver, NFC, uten stoppord),
+    med bindestrekssammensetninger både delt og sammenskrevet."""
+    tekst = unicodedata.normalize("NFC", tekst).lower()
+    termer = []
+    for ord_ in _ORD.findall(tekst):
+        deler = ord_.split("-")
+        if len(deler) > 1:
+            termer.append("".join(deler))
+        termer.extend(deler)
+    return [t for t in termer if t not in STOPPORD]
+
+
+def _med_ascii(termer: list[str]) -> set[str]:
+    """Termene pluss ASCII-formen av termer med æ/ø/å."""
+    return set(termer) | {t.translate(_ASCII) for t in termer}
+
+
+def bygg_sokeindeks(hierarki: dict, budsjettaar: int) -> dict:
+    """Bygger søkeindeksen for ett budsjettår fra hierarkiet.
+
+    Dokumentene lagres kolonnevis: type (indeks i DOKUMENTTYPER), sti
+    ([side, område, kategori, kapittel(, post)] som listeindekser), kap_nr,
+    post_nr og upost_nr (null for kapitler), navn og beløp. termer er sortert,
+    og poster[i] er de sorterte dokument-id-ene for termer[i]."""
+    dokumenter = {
+        "type": [], "sti": [], "kap_nr": [], "post_nr": [], "upost_nr": [],
+        "navn": [], "belop": [],
+    }
+    termindeks: dict[str, set[int]] = {}
+
+    def legg_til(type_: int, sti: list[int], kap_nr: int, post_nr: int | None,
+                 upost_nr: int | None, navn: str, belop: int, termer: set[str]):
+        dok_id = len(dokumenter["type"])
+        for felt, verdi in [("type", type_), ("sti", sti), ("kap_nr", kap_nr),
+                            ("post_nr", post_nr), ("upost_nr", upost_nr),
+                            ("navn", navn), ("belop", belop)]:
+            dokumenter[felt].append(verdi)
+        for term in termer:
+            termindeks.setdefault(term, set()).add(dok_id)
+
+    for s, side in enumerate(SIDER):
+        for o, omr in enumerate(hierarki[side]["omraader"]):
+            for k, kat in enumerate(omr["kategorier"]):
+                for p, kap in enumerate(kat["kapitler"]):
+                    legg_til(0, [s, o, k, p], kap["kap_nr"], None, None, kap["navn"],
+                             kap["total"],
+                             _med_ascii(tokeniser(kap["navn"])) | {str(kap["kap_nr"])})
+                    for q, post in enumerate(kap["poster"]):
+                        tekst = " ".join([post["navn"], *post["stikkord"]])
+                        legg_til(1, [s, o, k, p, q], kap["kap_nr"], post["post_nr"],
+                                 post["upost_nr"], post["navn"], post["belop"],
+                                 _med_ascii(tokeniser(tekst)))
+
+    termer = sorted(termindeks)
+    return {
+        "format": FORMAT,
+        "budsjettaar": budsjettaar,
+        "sider": SIDER,
+        "typer": DOKUMENTTYPER,
+        "dokumenter": dokumenter,
+        "termer": termer,
+        "poster": [sorted(termindeks[t]) for t in termer],
+    }
+
+
+def _prefikstreff(indeks: dict, prefiks: str) -> set[int]:
+    """Dokumentene med minst én term som starter med prefikset."""
+    termer = indeks["termer"]
+    treff: set[int] = set()
+    i = bisect_left(termer, prefiks)
+    while i < len(termer) and termer[i].startswith(prefiks):
+        treff.update(indeks["poster"][i])
+        i += 1
+    return treff
+
+
+def sok(indeks: dict, sporring: str, maks: int = 20) -> list[dict]:
+    """Referansespørring: alle ord i spørringen må matche (som prefiks) en
+    term i dokumentet. Kapitler rangeres før poster, deretter etter beløp."""
+    ord_ = tokeniser(sporring)
+    if not ord_:
+        return []
+    treff = _prefikstreff(indeks, ord_[0])
+    for prefiks in ord_[1:]:
+        treff &= _prefikstreff(indeks, prefiks)
+
+    dok = indeks["dokumenter"]
+    rangert = sorted(treff, key=lambda d: (dok["type"][d], -abs(dok["belop"][d]), d))
+    return [
+        {
+            "type": indeks["typer"][dok["type"][d]],
+            "side": indeks["sider"][dok["sti"][d][0]],
+            "sti": dok["sti"][d],
+            "kap_nr": dok["kap_nr"][d],
+            "post_nr": dok["post_nr"][d],
+            "upost_nr": dok["upost_nr"][d],
+            "navn": dok["navn"][d],
+            "belop": dok["belop"][d],
+        }
+        for d in rangert[:maks]
+    ]
+
+
+def valider_sokeindeks(indeks: dict, full_data: dict) -> list[str]:
+    """Sjekker at hver dokumentsti peker på en node med samme navn og beløp."""
+    feil = []
+    dok = indeks["dokumenter"]
+    for d, sti in enumerate(dok["sti"]):
+        try:
+            omr = full_data[indeks["sider"][sti[0]]]["omraader"][sti[1]]
+            node = omr["kategorier"][sti[2]]["kapitler"][sti[3]]
+            belop = node["total"]
+            if len(sti) == 5:
+                node = node["poster"][sti[4]]
+                belop = node["belop"]
+        except (IndexError, KeyError):
+            feil.append(f"Søkeindeks: ugyldig sti {sti} for dokument {d}")
+            continue
+        if node["navn"] != dok["navn"][d] or belop != dok["belop"][d]:
+            feil.append(f"Søkeindeks: sti {sti} peker på «{node['navn']}», "
+                        f"ventet «{dok['navn'][d]}»")
+    return feil
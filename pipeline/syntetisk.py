@@ -0,0 +1,182 @@
+"""
+Syntetisk Gul bok for ytelsesmålinger.
+Genererer normaliserte tabeller med samme kolonner som les_gul_bok()
+(FORVENTEDE_KOLONNER + side) og tilhørende saldert budsjett, i vilkårlig skala.
+
+Grunnstrukturen (skala 1) er kalibrert mot Gul bok 2025: ca. 1 760 rader,
+26 utgifts- og 24 inntektsområder, ~4 kategorier per område, ~3,7 (utgift) og
+~1,9 (inntekt) rader per kapittel, ~20 % underposter og postnumre trukket med
+de faktiske frekvensene. Petroleums- og SPU-kapitlene som berikelse.py bruker
+(2800, 2440, 5800, 5440, 5507–5509, 5685, 5501, 5521, 5700) er alltid med.
+
+Skala N lager N kopier av grunnstrukturen med egne beløp: kopi r får
+omr_nr + 100·r og kap_nr + 10 000·r, slik at nøklene er unike og hvert
+område har realistisk bredde. Side settes eksplisitt i tabellen (kap_nr-regelen
+≥ 3000 gjelder kun kopi 0).
+"""
+
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from les_gul_bok import FORVENTEDE_KOLONNER
+
+SKALAER = [1, 10, 100, 1000]
+
+UTGIFTSOMRAADER = [0, 1, 2, 3, 4, 6, 7, 8, 9, 10, 11, 12, 13, 15, 17, 18,
+                   21, 22, 23, 24, 26, 28, 29, 30, 33, 34]
+INNTEKTSOMRAADER = [0, 1, 2, 4, 6, 7, 8, 9, 10, 11, 12, 13, 15, 17, 18,
+                    21, 22, 23, 24, 25, 28, 29, 30, 34]
+
+# Postnumre med relative frekvenser fra Gul bok 2025
+UTGIFTSPOSTER = {1: 40, 21: 13, 70: 17, 71: 10, 72: 7, 73: 6, 2: 4, 45: 4, 75: 4,
+                 50: 3, 74: 3, 60: 3, 22: 3, 76: 2, 23: 2, 61: 2, 62: 1, 77: 1,
+                 78: 1, 79: 1, 80: 1, 81: 1, 82: 1, 90: 1}
+INNTEKTSPOSTER = {1: 30, 2: 10, 3: 8, 4: 6, 70: 6, 71: 4, 80: 4, 85: 3, 90: 3,
+                  10: 2, 11: 2, 15: 2, 16: 2, 17: 2, 18: 2, 29: 2, 72: 2, 96: 2}
+
+STIKKORD = ["", "kan overføres", "overslagsbevilgning",
+            "kan nyttes under post 21", "kan overføres, kan nyttes under post 70"]
+STIKKORD_ANDELER = [0.66, 0.25, 0.05, 0.02, 0.02]
+
+# Faste kapitler som berikelsen slår opp direkte: (side, omr, kap, poster)
+FASTE_KAPITLER = [
+    ("utgift", 34, 2800, [50, 96]),
+    ("utgift", 18, 2440, [30]),
+    ("inntekt", 34, 5800, [50]),
+    ("inntekt", 18, 5440, [24, 30, 80]),
+    ("inntekt", 25, 5507, [71, 72]),
+    ("inntekt", 25, 5508, [70]),
+    ("inntekt", 25, 5509, [70]),
+    ("inntekt", 17, 5685, [85]),
+    ("inntekt", 25, 5501, [70, 72]),
+    ("inntekt", 25, 5521, [70]),
+    ("inntekt", 28, 5700, [71, 72]),
+]
+
+
+def _grunnstruktur(rng: np.random.Generator) -> pd.DataFrame:
+    """Én kopi av strukturen (uten beløp): side, omr, kat, kap, post, upost, stikkord."""
+    rader = []
+    faste = {kap for _, _, kap, _ in FASTE_KAPITLER}
+    for side, omraader, kapområde, poster, rader_per_kap, antall_kap in [
+        ("utgift", UTGIFTSOMRAADER, (1, 2999), UTGIFTSPOSTER, 2.7, 367),
+        ("inntekt", INNTEKTSOMRAADER, (3000, 5999), INNTEKTSPOSTER, 0.9, 215),
+    ]:
+        postnr = np.array(list(poster))
+        postandel = np.array(list(poster.values()), dtype=float)
+        postandel /= postandel.sum()
+
+        # Kapitler fordeles skjevt på områder og kategorier
+        ledige = np.setdiff1d(np.arange(*kapområde), list(faste))
+        kapitler = np.sort(rng.choice(ledige, antall_kap, replace=False))
+        omr_vekt = rng.dirichlet(np.full(len(omraader), 1.5))
+        kap_omr = np.sort(rng.choice(omraader, antall_kap, p=omr_vekt))
+        for kap, omr in zip(kapitler, kap_omr):
+            kat = 10 * (1 + min(int(rng.geometric(0.35)) - 1, 8))
+            antall = min(1 + rng.poisson(rader_per_kap), len(postnr))
+            for post in np.sort(rng.choice(postnr, antall, replace=False, p=postandel)):
+                rader.append((side, omr, kat, kap, post))
+
+    for side, omr, kap, poster in FASTE_KAPITLER:
+        for post in poster:
+            rader.append((side, omr, 10, kap, post))
+
+    df = pd.DataFrame(rader, columns=["side", "omr_nr", "kat_nr", "kap_nr", "post_nr"])
+
+    # ~20 % av radene er underposter: del ~10 % av postene i to underposter
+    deles = rng.random(len(df)) < 0.1
+    df = df.loc[np.repeat(df.index, np.where(deles, 2, 1))].reset_index(drop=True)
+    forste_i_post = ~df.duplicated(["kap_nr", "post_nr"])
+    df["upost_nr"] = np.where(
+        df.duplicated(["kap_nr", "post_nr"], keep=False),
+        np.where(forste_i_post, 1, 2), 0,
+    )
+    df["stikkord"] = rng.choice(STIKKORD, len(df), p=STIKKORD_ANDELER)
+    return df.sort_values(["side", "omr_nr", "kat_nr", "kap_nr", "post_nr", "upost_nr"],
+                          kind="stable", ignore_index=True)
+
+
+def generer_gul_bok(skala: int = 1, seed: int = 0) -> pd.DataFrame:
+    """Genererer en normalisert Gul bok-tabell (som les_gul_bok) i gitt skala."""
+    rng = np.random.default_rng(seed)
+    grunn = _grunnstruktur(rng)
+    n = len(grunn)
+
+    replika = np.repeat(np.arange(skala, dtype=np.int64), n)
+    omr_nr = np.tile(grunn["omr_nr"].to_numpy(np.int64), skala) + 100 * replika
+    kat_nr = np.tile(grunn["kat_nr"].to_numpy(np.int64), skala)
+    kap_nr = np.tile(grunn["kap_nr"].to_numpy(np.int64), skala) + 10_000 * replika
+    post_nr = np.tile(grunn["post_nr"].to_numpy(np.int64), skala)
+
+    # Beløp: log-normalfordelt rundt median ~70 mill. kr, noen få negative
+    gb = np.round(np.exp(rng.normal(np.log(7e7), 2.0, n * skala)), -3).astype(np.int64)
+    gb[rng.random(n * skala) < 0.01] *= -1
+
+    def navn(prefiks: str, verdier: np.ndarray) -> np.ndarray:
+        unike, indeks = np.unique(verdier, return_inverse=True)
+        return np.array([f"{prefiks} {v}" for v in unike], dtype=object)[indeks]
+
+    fdep_nr = 100 * (1 + omr_nr % 17)
+    df = pd.DataFrame({
+        "fdep_nr": fdep_nr,
+        "fdep_navn": navn("Departement", fdep_nr),
+        "omr_nr": omr_nr,
+        "kat_nr": kat_nr,
+        "omr_navn": navn("Programområde", omr_nr),
+        "kat_navn": navn("Programkategori", omr_nr * 100 + kat_nr),
+        "kap_nr": kap_nr,
+        "post_nr": post_nr,
+        "upost_nr": np.tile(grunn["upost_nr"].to_numpy(np.int64), skala),
+        "kap_navn": navn("Kapittel", kap_nr),
+        "post_navn": navn("Post", post_nr),
+        "stikkord": np.tile(grunn["stikkord"].to_numpy(object), skala),
+        "GB": gb,
+    })
+    df["side"] = np.tile(grunn["side"].to_numpy(object), skala)
+    for kol in ["fdep_navn", "omr_navn", "kat_navn", "kap_navn", "post_navn", "stikkord", "side"]:
+        df[kol] = df[kol].astype(str)
+    return df
+
+
+def generer_saldert(gul_bok: pd.DataFrame, seed: int = 0,
+                    andel_nye: float = 0.03, andel_utgaatte: float = 0.02) -> pd.DataFrame:
+    """Genererer saldert budsjett t-1 på post-nivå (kap_nr, post_nr, saldert_belop)
+    for en syntetisk Gul bok: ~3 % av postene er nye (mangler i saldert),
+    ~2 % finnes kun i saldert, og beløpene avviker typisk noen prosent."""
+    rng = np.random.default_rng(seed + 1)
+    poster = gul_bok.groupby(["kap_nr", "post_nr"], sort=True)["GB"].sum().reset_index()
+
+    poster = poster[rng.random(len(poster)) >= andel_nye]
+    endring = rng.normal(0.03, 0.1, len(poster))
+    saldert_belop = np.round(poster["GB"].to_numpy() / (1 + endring), -3).astype(np.int64)
+    saldert_belop[rng.random(len(poster)) < 0.01] = 0
+
+    antall_utgaatte = int(len(poster) * andel_utgaatte)
+    utgaatte = pd.DataFrame({
+        "kap_nr": rng.choice(poster["kap_nr"].to_numpy(), antall_utgaatte),
+        "post_nr": 900 + np.arange(antall_utgaatte) % 100,
+        "saldert_belop": np.round(np.exp(rng.normal(np.log(3e7), 1.5, antall_utgaatte)), -3),
+    }).drop_duplicates(["kap_nr", "post_nr"])
+
+    return pd.concat([
+        pd.DataFrame({"kap_nr": poster["kap_nr"].to_numpy(),
+                      "post_nr": poster["post_nr"].to_numpy(),
+                      "saldert_belop": saldert_belop}),
+        utgaatte.astype(np.int64),
+    ], ignore_index=True)
+
+
+def skriv_excel(df: pd.DataFrame, filsti: Path) -> Path:
+    """Skriver en syntetisk tabell som Gul bok-arbeidsbok (eldre format:
+    første ark, kolonnene i FORVENTEDE_KOLONNER), for å måle innlesingen."""
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    ark = wb.create_sheet()
+    ark.append(FORVENTEDE_KOLONNER)
+    kolonner = [df[kol].tolist() for kol in FORVENTEDE_KOLONNER]
+    for rad in zip(*kolonner):
+        ark.append(rad)
+    wb.save(filsti)
+    return filsti
@@ -4,9 +4,13 @@ Verifiserer kjente totaler og hierarkisk konsistens.
 """
 import json
 import os
+import sys
 import pytest
 
-DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "2025")
+sys.path.insert(0, os.path.dirname(__file__))
+
+ROT_DIR = os.path.join(os.path.dirname(__file__), "..")
+DATA_DIR = os.path.join(ROT_DIR, "data", "2025")
 
 
 def les_json(filnavn):
@@ -159,3 +163,1003 @@ class TestMetadata:
     def test_metadata_har_oljekorrigert_totaler(self, metadata):
         assert "oljekorrigert_totaler" in metadata
         assert metadata["oljekorrigert_totaler"]["utgifter"] > 0
+
+
+class TestHierarkiBygging:
+    """Verifiser at hierarkiet bygget fra Excel er identisk med eksportert JSON."""
+
+    def test_hierarki_2025_identisk(self, full_data):
+        from les_gul_bok import les_gul_bok
+        from bygg_hierarki import bygg_komplett_hierarki
+
+        df = les_gul_bok(os.path.join(ROT_DIR, "Gul bok 2025.xlsx"))
+        hierarki = bygg_komplett_hierarki(df)
+        assert json.dumps(hierarki["utgifter"]) == json.dumps(full_data["utgifter"])
+        assert json.dumps(hierarki["inntekter"]) == json.dumps(full_data["inntekter"])
+
+    def test_radrekkefolge_bevares_innen_kapittel(self):
+        import pandas as pd
+        from bygg_hierarki import bygg_hierarki_for_side
+
+        df = pd.DataFrame({
+            "omr_nr": [2, 1, 1], "omr_navn": ["B", "A", "A"],
+            "kat_nr": [1, 1, 1], "kat_navn": ["K", "K", "K"],
+            "kap_nr": [20, 10, 10], "kap_navn": ["X", "Y", "Y"],
+            "post_nr": [1, 70, 1], "upost_nr": [0, 0, 0],
+            "post_navn": ["a", "b", "c"], "stikkord": ["", "s1, s2", ""],
+            "GB": [5, 7, 11],
+        })
+        side = bygg_hierarki_for_side(df)
+        assert side["total"] == 23
+        assert [o["omr_nr"] for o in side["omraader"]] == [1, 2]
+        poster = side["omraader"][0]["kategorier"][0]["kapitler"][0]["poster"]
+        assert [p["post_nr"] for p in poster] == [70, 1]
+        assert poster[0]["stikkord"] == ["s1", "s2"]
+        assert poster[0]["postgruppe"] == "overforinger_private"
+
+
+class TestMellomlager:
+    """Verifiser Parquet-cachen for normaliserte kildetabeller."""
+
+    def test_treff_invalidering_og_forbikobling(self, tmp_path):
+        pytest.importorskip("pyarrow")
+        import pandas as pd
+        from mellomlager import hent_eller_les, tom_mellomlager
+
+        kilde = tmp_path / "Gul bok 2099.xlsx"
+        kilde.write_bytes(b"versjon 1")
+        kall = []
+
+        def leser(sti):
+            kall.append(sti)
+            return pd.DataFrame({"kap_nr": [1, 2], "GB": [10, 20]})
+
+        a = hent_eller_les(kilde, "v1", leser)
+        b = hent_eller_les(kilde, "v1", leser)
+        assert len(kall) == 1
+        pd.testing.assert_frame_equal(a, b)
+
+        # Nye bytes, ny kodeversjon og bruk_cache=False gir ny innlesing
+        kilde.write_bytes(b"versjon 2")
+        hent_eller_les(kilde, "v1", leser)
+        hent_eller_les(kilde, "v2", leser)
+        hent_eller_les(kilde, "v2", leser, bruk_cache=False)
+        assert len(kall) == 4
+
+        # Kun siste versjon ligger igjen i cachen
+        assert tom_mellomlager(tmp_path) == 1
+
+
+class TestByggmanifest:
+    """Verifiser fingeravtrykk og hopp-over-logikk for inkrementell bygging."""
+
+    def test_uendret_kun_ved_likt_fingeravtrykk_og_alle_filer(self, tmp_path):
+        from byggmanifest import beregn_fingeravtrykk, er_uendret, skriv_manifest
+
+        kilde = tmp_path / "Gul bok 2099.xlsx"
+        kilde.write_bytes(b"innhold")
+        utmappe = tmp_path / "2099"
+        utmappe.mkdir()
+        (utmappe / "a.json").write_text("{}")
+
+        fingeravtrykk = beregn_fingeravtrykk(kilde, manuelle_tall={"uttaksprosent": 3.0})
+        assert not er_uendret(utmappe, fingeravtrykk, ["a.json"])
+
+        skriv_manifest(utmappe, fingeravtrykk)
+        assert er_uendret(utmappe, fingeravtrykk, ["a.json"])
+        assert not er_uendret(utmappe, fingeravtrykk, ["a.json", "b.json"])
+
+        endret = beregn_fingeravtrykk(kilde, manuelle_tall={"uttaksprosent": 3.1})
+        assert not er_uendret(utmappe, endret, ["a.json"])
+
+        kilde.write_bytes(b"nytt innhold")
+        assert not er_uendret(utmappe, beregn_fingeravtrykk(kilde, manuelle_tall={"uttaksprosent": 3.0}), ["a.json"])
+
+    def test_kodefiler_er_importene_til_kjor_pipeline(self):
+        from byggmanifest import pipeline_kodefiler
+
+        navn = {f.name for f in pipeline_kodefiler()}
+        assert {"kjor_pipeline.py", "byggmanifest.py", "eksporter.py", "sammenligning.py"} <= navn
+        # Hjelpeskript påvirker ikke utfilene og skal ikke tvinge frem nye bygg
+        assert not navn & {"api_server.py", "lasttest_api.py", "scenario.py", "benchmark.py",
+                           "regresjonssjekk.py", "syntetisk.py", "test_pipeline.py"}
+
+    def test_importer_i_strenger_teller_ikke(self):
+        import ast
+        from byggmanifest import _importerte_moduler
+
+        kilde = (
+            '"""Bruk:\n    import api_server\n"""\n'
+            'import json, eksporter as e\n'
+            'TEKST = "from scenario import Scenario"\n'
+            'def f():\n'
+            '    try:\n'
+            '        from kompakt import kod_kompakt\n'
+            '    except ImportError:\n'
+            '        import hashtre.x\n'
+        )
+        assert list(_importerte_moduler(ast.parse(kilde).body)) == [
+            "json", "eksporter", "kompakt", "hashtre"]
+
+    def test_manifest_skrives_atomisk(self, tmp_path):
+        from byggmanifest import les_manifest, skriv_manifest
+
+        skriv_manifest(tmp_path, {"a": 1})
+        assert les_manifest(tmp_path) == {"fingeravtrykk": {"a": 1}}
+        assert [f.name for f in tmp_path.iterdir()] == ["byggmanifest.json"]
+
+
+class TestKategoritabell:
+    """Verifiser kategoriaggregeringen mot eksportert JSON."""
+
+    def test_aggregerte_kategorier_2025_identiske(self, aggregert_data):
+        from les_gul_bok import les_gul_bok
+        from berikelse import (
+            summer_per_post, generer_aggregert_utgifter, generer_aggregert_inntekter,
+        )
+
+        df = les_gul_bok(os.path.join(ROT_DIR, "Gul bok 2025.xlsx"))
+        postsummer = summer_per_post(df)
+        assert generer_aggregert_utgifter(df, postsummer) == aggregert_data["utgifter_aggregert"]
+        assert generer_aggregert_inntekter(df, postsummer) == aggregert_data["inntekter_aggregert"]
+
+    def test_egen_kategoritabell(self):
+        import pandas as pd
+        from berikelse import generer_aggregert
+
+        df = pd.DataFrame({
+            "side": ["utgift"] * 4, "omr_nr": [1, 1, 2, 3], "kap_nr": [10, 11, 20, 30],
+            "post_nr": [1, 1, 1, 95], "GB": [5, 7, 11, 100],
+        })
+        kategorier = [
+            {"id": "a", "navn": "A", "side": "utgift", "omr": {1}, "kap": {10}, "omr_nr": 1},
+            {"id": "rest", "navn": "Rest", "side": "utgift", "ovrige": True},
+        ]
+        resultat = generer_aggregert(df, "utgift", kategorier=kategorier)
+        # Post >= 90 er filtrert bort (oljekorrigert)
+        assert [(k["id"], k["belop"]) for k in resultat] == [("rest", 18), ("a", 5)]
+        assert resultat[0]["omr_gruppe"] == [1, 2]
+
+    def test_ovrige_dekker_alle_gjenvaerende_poster(self):
+        import pandas as pd
+        from berikelse import beregn_oljekorrigert, generer_aggregert
+
+        df = pd.DataFrame({
+            "side": ["utgift"] * 3 + ["inntekt"] * 5,
+            "omr_nr": [34, 1, 10, 25, 25, 25, 3, 5],
+            "kap_nr": [3400, 100, 700, 5501, 5700, 5700, 3100, 5521],
+            "post_nr": [1, 1, 1, 70, 72, 70, 1, 1],
+            "GB": [100, 50, 20, 200, 40, 30, 10, 7],
+            "saldert_belop": [80, 50, 20, 190, 40, 20, 10, 5],
+        })
+        utgifter = {k["id"]: k for k in generer_aggregert(df, "utgift")}
+        inntekter = {k["id"]: k for k in generer_aggregert(df, "inntekt")}
+
+        # Rader i omr 34 telles med i «øvrige utgifter», men vises ikke i omr_gruppe
+        ovrige = utgifter["ovrige_utgifter"]
+        assert (ovrige["belop"], ovrige["saldert_belop"], ovrige["omr_gruppe"]) == (150, 130, [1])
+
+        # Endringen for «øvrige inntekter» beregnes fra de samme postene som beløpet,
+        # også kap 5700 utenom post 71/72 og kap 5521 utenfor omr 25
+        ovrige = inntekter["ovrige_inntekter"]
+        assert (ovrige["belop"], ovrige["saldert_belop"], ovrige["endring_absolut"]) == (47, 35, 12)
+        assert ovrige["omr_gruppe"] == [3, 5]
+
+        # Kategoriene summerer til de oljekorrigerte totalene
+        oljekorrigert = beregn_oljekorrigert(df)
+        assert sum(k["belop"] for k in utgifter.values()) == oljekorrigert["utgifter_total"]
+        assert sum(k["belop"] for k in inntekter.values()) == oljekorrigert["inntekter_total"]
+
+
+class TestEndringsdata:
+    """Verifiser vektorisert kobling mot saldert budsjett."""
+
+    def test_kobling_nye_poster_og_null_i_saldert(self):
+        import pandas as pd
+        from endringsdata import beregn_endringsdata
+
+        gb = pd.DataFrame({
+            "kap_nr": [100, 100, 100, 200, 300],
+            "post_nr": [1, 1, 70, 1, 1],
+            "upost_nr": [1, 2, 0, 0, 0],
+            "GB": [60, 40, 30, 5, 9],
+        })
+        saldert = pd.DataFrame({
+            "kap_nr": [300, 100, 100],
+            "post_nr": [1, 1, 70],
+            "saldert_belop": [0, 80, 30],
+        })
+        res = beregn_endringsdata(gb, saldert)
+        assert res["saldert_belop"].tolist()[:3] == [80, 80, 30]
+        assert res["endring_absolut"].tolist()[:3] == [20, 20, 0]
+        assert res["endring_prosent"].tolist()[:3] == [25.0, 25.0, 0.0]
+        assert res["er_ny_post"].tolist() == [False, False, False, True, False]
+        assert pd.isna(res["saldert_belop"][3]) and pd.isna(res["endring_prosent"][3])
+        assert pd.isna(res["endring_prosent"][4])  # saldert = 0
+
+    def test_avrunding_som_python_round(self):
+        import numpy as np
+        from endringsdata import avrund_en_desimal
+
+        verdier = np.array([0.15, 0.25, 0.35, 2.675, -0.05, -1.45, 1.05, 12.3456, 99.95])
+        assert avrund_en_desimal(verdier).tolist() == [round(v, 1) for v in verdier.tolist()]
+
+
+class TestKomprimering:
+    """Verifiser minifisert eksport og forhåndskomprimerte søsken."""
+
+    def test_minifisert_og_komprimert_rundtur(self, tmp_path, aggregert_data):
+        import gzip
+        from eksporter import eksporter_aggregert, komprimer_artefakter
+
+        filsti = eksporter_aggregert(
+            aggregert_data["utgifter_aggregert"], aggregert_data["inntekter_aggregert"],
+            aggregert_data["spu"], 2025, tmp_path, minifisert=True,
+        )
+        innhold = filsti.read_bytes()
+        assert b"\n" not in innhold
+        assert json.loads(innhold)["utgifter_aggregert"] == aggregert_data["utgifter_aggregert"]
+
+        rapport = komprimer_artefakter([filsti])
+        assert rapport[0]["json"] == len(innhold)
+        assert gzip.decompress((tmp_path / "gul_bok_aggregert.json.gz").read_bytes()) == innhold
+        assert rapport[0]["gz"] < rapport[0]["json"]
+
+
+class TestShards:
+    """Verifiser at områdeshards + rotindeks gjenskaper det fulle hierarkiet."""
+
+    def test_shards_settes_sammen_og_valideres(self, tmp_path, full_data):
+        from eksporter import eksporter_shards, sett_sammen_shards, SHARDMAPPE
+        from valider import valider_shards
+
+        hierarki = {"utgifter": full_data["utgifter"], "inntekter": full_data["inntekter"]}
+        (tmp_path / SHARDMAPPE).mkdir()
+        (tmp_path / SHARDMAPPE / "utgifter_999.json").write_text("{}")
+        # Et samtidig bygg sin midlertidige fil skal ikke ryddes bort
+        midlertidig = tmp_path / SHARDMAPPE / ".utgifter_4.json.123.ab12cd34.tmp"
+        midlertidig.write_text("{}")
+        eksporter_shards(hierarki, 2025, tmp_path)
+
+        assert not (tmp_path / SHARDMAPPE / "utgifter_999.json").exists()
+        assert midlertidig.exists()
+        midlertidig.unlink()
+        assert sett_sammen_shards(tmp_path) == hierarki
+        assert valider_shards(tmp_path, full_data) == []
+
+        shard = tmp_path / SHARDMAPPE / "utgifter_4.json"
+        innhold = json.loads(shard.read_text(encoding="utf-8"))
+        innhold["omraade"]["total"] += 1
+        shard.write_text(json.dumps(innhold), encoding="utf-8")
+        feil = valider_shards(tmp_path, full_data)
+        assert len(feil) == 1 and "[4]" in feil[0]
+
+
+class TestKompakt:
+    """Verifiser at kompakt format dekodes til samme struktur som eksporter_full."""
+
+    def test_rundtur_2025(self, full_data):
+        from kompakt import kod_kompakt, dekod_kompakt
+
+        kompakt = kod_kompakt(full_data)
+        assert dekod_kompakt(kompakt) == full_data
+        assert "postgruppe" not in json.dumps(kompakt["utgifter"]["poster"]["postgruppe"])
+
+    def test_rundtur_med_endring_og_eksport(self, tmp_path):
+        import numpy as np
+        import pandas as pd
+        from bygg_hierarki import bygg_komplett_hierarki
+        from eksporter import eksporter_full, eksporter_kompakt
+        from kompakt import dekod_kompakt
+
+        df = pd.DataFrame({
+            "omr_nr": [1, 1, 1], "omr_navn": ["Område"] * 3,
+            "kat_nr": [10, 10, 20], "kat_navn": ["Kat A", "Kat A", "Kat B"],
+            "kap_nr": [100, 100, 3100], "kap_navn": ["Kap", "Kap", "Innt"],
+            "post_nr": [1, 70, 1], "upost_nr": [0, 0, 0],
+            "post_navn": ["Drift", "Tilskudd", "Gebyr"],
+            "GB": [500, 300, 50], "stikkord": ["a, b", "b", ""],
+            "side": ["utgift", "utgift", "inntekt"],
+            "saldert_belop": [400.0, np.nan, 0.0],
+            "endring_absolut": [100.0, np.nan, 50.0],
+            "endring_prosent": [25.0, np.nan, np.nan],
+        })
+        full_fil = eksporter_full(bygg_komplett_hierarki(df), {}, 2026, tmp_path)
+        kompakt_fil, kompakt = eksporter_kompakt(full_fil, tmp_path)
+
+        full = json.loads(full_fil.read_text(encoding="utf-8"))
+        assert json.loads(kompakt_fil.read_text(encoding="utf-8")) == kompakt
+        assert dekod_kompakt(kompakt) == full
+
+
+class TestValideringIMinnet:
+    """Verifiser at validering i minnet finner alle avvik i ett pass."""
+
+    def test_alle_avvik_rapporteres(self, full_data, aggregert_data):
+        import copy
+        from valider import valider_data
+
+        assert valider_data(full_data, aggregert_data, 2025) == []
+
+        data = copy.deepcopy(full_data)
+        omr = data["utgifter"]["omraader"][0]
+        kap = omr["kategorier"][0]["kapitler"][0]
+        kap["poster"][0]["belop"] += 1
+        data["inntekter"]["omraader"][-1]["total"] -= 5
+
+        feil = valider_data(data, aggregert_data, 2025)
+        assert len(feil) == 3
+        assert any(f.startswith(f"Inkonsistent total for kap {kap['kap_nr']}:") for f in feil)
+        assert any(f.startswith("Inkonsistent total for inntekter:") for f in feil)
+        assert any(f.startswith("Inkonsistent total for inntekter omr ") for f in feil)
+
+    def test_hashtre_og_kompakt(self, full_data):
+        import copy
+        from hashtre import bygg_hashtre
+        from kompakt import kod_kompakt
+        from valider import valider_hashtre, valider_kompakt
+
+        hashtre, kompakt = bygg_hashtre(full_data, 2025), kod_kompakt(full_data)
+        assert valider_hashtre(hashtre, full_data, 2025) == []
+        assert valider_kompakt(kompakt, full_data) == []
+
+        data = copy.deepcopy(full_data)
+        data["utgifter"]["omraader"][0]["navn"] += " (endret)"
+        assert len(valider_hashtre(hashtre, data, 2025)) == 1
+        assert len(valider_kompakt(kompakt, data)) == 1
+
+
+class TestStrommendeValidering:
+    """Verifiser at strømmende validering finner de samme avvikene som i minnet."""
+
+    def test_samme_avvik_som_valider_hierarki(self, tmp_path, full_data):
+        pytest.importorskip("ijson")
+        import copy
+        from valider import valider_hierarki, valider_strommende
+
+        assert valider_strommende(os.path.join(DATA_DIR, "gul_bok_full.json"), maal_minne=False)["feil"] == []
+
+        data = copy.deepcopy(full_data)
+        kat = data["utgifter"]["omraader"][1]["kategorier"][0]
+        kat["kapitler"][0]["poster"][-1]["belop"] -= 7
+        kat["total"] += 3
+        filsti = tmp_path / "gul_bok_full.json"
+        filsti.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+
+        resultat = valider_strommende(filsti)
+        forventet = [f for side in ["utgifter", "inntekter"]
+                     for f in valider_hierarki(side, data[side])]
+        assert sorted(resultat["feil"]) == sorted(forventet)
+        assert len(resultat["feil"]) == 3
+        assert resultat["topp_minne_mb"] > 0
+
+
+class TestProfilering:
+    """Verifiser måling per steg og cProfile-kroken."""
+
+    def test_steg_maales_og_cprofile_dumpes(self, tmp_path):
+        from profilering import Profil, skriv_profil
+
+        profil = Profil(2025, maal=True, cprofile_steg="b", cprofile_mappe=tmp_path)
+        with profil.steg("a"):
+            liste = list(range(100_000))
+        with profil.steg("b"):
+            sum(liste)
+
+        assert [p["steg"] for p in profil.poster] == ["a", "b"]
+        assert profil.poster[0]["topp_minne_mb"] > 0.5
+        assert all(p["vegg_sekunder"] >= 0 and p["cpu_sekunder"] >= 0 for p in profil.poster)
+        assert (tmp_path / "b.2025.prof").exists()
+
+        filsti = skriv_profil(profil.poster, tmp_path / "pipeline_profile.json")
+        assert json.loads(filsti.read_text(encoding="utf-8"))["steg"] == profil.poster
+
+    def test_inaktiv_profil_maaler_ingenting(self):
+        from profilering import Profil
+
+        profil = Profil(2025)
+        with profil.steg("a"):
+            pass
+        assert profil.poster == []
+
+
+class TestSyntetisk:
+    """Verifiser at syntetiske data har ekte skjema og går gjennom pipelinen."""
+
+    def test_skjema_skala_og_gyldig_hierarki(self):
+        from les_gul_bok import FORVENTEDE_KOLONNER
+        from syntetisk import generer_gul_bok, generer_saldert
+        from endringsdata import beregn_endringsdata, statistikk_endringsdata
+        from bygg_hierarki import bygg_komplett_hierarki
+        from valider import valider_hierarki
+
+        df = generer_gul_bok(skala=1)
+        assert list(df.columns) == FORVENTEDE_KOLONNER + ["side"]
+        assert 1500 < len(df) < 2500
+        assert len(generer_gul_bok(skala=3)) == 3 * len(df)
+        assert not df.duplicated(["kap_nr", "post_nr", "upost_nr"]).any()
+
+        df = beregn_endringsdata(df, generer_saldert(df))
+        assert 90 < statistikk_endringsdata(df)["matchrate_prosent"] < 100
+
+        hierarki = bygg_komplett_hierarki(df)
+        for side in ["utgifter", "inntekter"]:
+            assert valider_hierarki(side, hierarki[side]) == []
+
+
+class TestKompakteTyper:
+    """Verifiser at kompakt skjema gir identisk hierarki og aggregater."""
+
+    def test_identisk_resultat(self):
+        import pandas as pd
+        from syntetisk import generer_gul_bok, generer_saldert
+        from les_gul_bok import til_kompakte_typer
+        from endringsdata import beregn_endringsdata
+        from bygg_hierarki import bygg_komplett_hierarki
+        from berikelse import (
+            generer_aggregert_utgifter, generer_aggregert_inntekter, summer_per_post,
+        )
+
+        df = generer_gul_bok(skala=2)
+        saldert = generer_saldert(df)
+        kompakt = til_kompakte_typer(df)
+        assert isinstance(kompakt["omr_navn"].dtype, pd.CategoricalDtype)
+        assert list(kompakt["side"].cat.categories) == ["utgift", "inntekt"]
+        assert kompakt["kat_nr"].dtype.itemsize == 1
+        assert kompakt["GB"].dtype == "int64"
+        assert kompakt.memory_usage(deep=True).sum() < df.memory_usage(deep=True).sum() / 3
+
+        resultater = []
+        for ramme in [df, kompakt]:
+            ramme = beregn_endringsdata(ramme, saldert)
+            postsummer = summer_per_post(ramme)
+            resultater.append(json.dumps([
+                bygg_komplett_hierarki(ramme),
+                generer_aggregert_utgifter(ramme, postsummer),
+                generer_aggregert_inntekter(ramme, postsummer),
+            ]))
+        assert resultater[0] == resultater[1]
+
+
+class TestRegresjonssjekk:
+    """Verifiser rullerende grunnlinje, støytoleranse og porten for hot-path-steg."""
+
+    @staticmethod
+    def _kjoring(tider: dict, endret: bool = False) -> dict:
+        return {
+            "commit": "abc", "endret": endret, "maskin": "m", "python": "3.11",
+            "tidspunkt": "2026-01-01T00:00:00",
+            "resultater": [{"skala": 10, "rader": 19030, "steg": steg,
+                            "sekunder": s, "topp_minne_mb": 1.0} for steg, s in tider.items()],
+        }
+
+    def test_regresjon_stoy_og_forbedring(self):
+        from regresjonssjekk import feilende, sammenlign, velg_grunnlinje
+
+        historikk = [
+            self._kjoring({"bygg_komplett_hierarki": t, "eksport": 2.0 + t / 10,
+                           "berikelse": 0.05, "validering": 0.01})
+            for t in (0.20, 0.21, 0.19, 0.22, 0.20)
+        ]
+        historikk.append(self._kjoring({"bygg_komplett_hierarki": 0.5}, endret=True))  # utelates
+        kandidat = self._kjoring({"bygg_komplett_hierarki": 1.6, "eksport": 2.1,
+                                  "berikelse": 0.02, "validering": 0.05})
+        historikk.append(kandidat)
+
+        grunnlinjer = velg_grunnlinje(historikk, kandidat, vindu=5)
+        assert len(grunnlinjer) == 5 and not any(k["endret"] for k in grunnlinjer)
+
+        status = {r["steg"]: r["status"] for r in sammenlign(kandidat, grunnlinjer)}
+        assert status == {"bygg_komplett_hierarki": "regresjon", "eksport": "ok",
+                          "berikelse": "forbedring", "validering": "regresjon"}
+        # Kun stegene i bygg_hierarki/berikelse/eksporter stopper bygget
+        assert [r["steg"] for r in feilende(sammenlign(kandidat, grunnlinjer))] == [
+            "bygg_komplett_hierarki"]
+
+    def test_stoyete_grunnlinje_toler_mer(self):
+        from regresjonssjekk import sammenlign
+
+        grunnlinjer = [self._kjoring({"eksport": t}) for t in (1.0, 1.6, 0.7, 1.4, 1.0)]
+        rad, = sammenlign(self._kjoring({"eksport": 1.5}), grunnlinjer)
+        assert rad["status"] == "ok" and rad["grense"] > 1.5
+
+    def test_uten_grunnlinje_er_ny(self):
+        from regresjonssjekk import feilende, sammenlign
+
+        rader = sammenlign(self._kjoring({"eksport": 9.9}), [])
+        assert rader[0]["status"] == "ny" and feilende(rader) == []
+
+    def test_for_lite_grunnlag_stopper_ikke(self):
+        from regresjonssjekk import MIN_GRUNNLAG, feilende, sammenlign
+
+        # Én kjøring gir MAD 0 og ingen støytoleranse
+        kandidat = self._kjoring({"berikelse": 0.100})
+        for antall in range(1, MIN_GRUNNLAG):
+            rader = sammenlign(kandidat, [self._kjoring({"berikelse": 0.023})] * antall)
+            assert rader[0]["status"] == "for lite grunnlag" and feilende(rader) == []
+        rad, = sammenlign(kandidat, [self._kjoring({"berikelse": 0.023})] * MIN_GRUNNLAG)
+        assert rad["status"] == "regresjon"
+
+
+class TestTidsserie:
+    """Verifiser at tidsseriene stemmer med hvert års fulle hierarki."""
+
+    def test_serier_stemmer_med_aarsfilene(self, full_data):
+        from pathlib import Path
+        from tidsserie import bygg_lager, tidsserie_datasett, serie_fil, SERIEINDEKS
+
+        lager = bygg_lager(Path(ROT_DIR, "data"))
+        assert not lager.duplicated(["aar", "side", "kap_nr", "post_nr", "upost_nr"]).any()
+        filer = tidsserie_datasett(lager)
+        assert 2025 in filer[SERIEINDEKS]["aar"]
+
+        for side in ["utgifter", "inntekter"]:
+            punkt = next(p for p in filer[SERIEINDEKS][side]["serie"] if p["aar"] == 2025)
+            assert punkt["total"] == full_data[side]["total"]
+            for omr in full_data[side]["omraader"]:
+                serie = filer[serie_fil(side, omr["omr_nr"])]["serie"]
+                punkt = next(p for p in serie if p["aar"] == 2025)
+                assert punkt["total"] == omr["total"]
+                assert punkt["endring_fra_saldert"] == omr["endring_fra_saldert"]
+
+        kap = full_data["utgifter"]["omraader"][0]["kategorier"][0]["kapitler"][0]
+        serie = filer[serie_fil("utgifter", kap["kap_nr"], "kapitler")]["serie"]
+        assert next(p for p in serie if p["aar"] == 2025)["total"] == kap["total"]
+
+    def test_fingeravtrykk_dekker_importert_kode(self):
+        from byggmanifest import pipeline_kodefiler
+
+        navn = {f.name for f in pipeline_kodefiler("tidsserie.py")}
+        assert {"tidsserie.py", "bygg_hierarki.py", "eksporter.py"} <= navn
+        assert "kjor_pipeline.py" not in navn and "api_server.py" not in navn
+
+
+class TestSokeindeks:
+    """Verifiser tokenisering, prefikssøk og stier i søkeindeksen."""
+
+    def test_norsk_tokenisering(self):
+        from sokeindeks import tokeniser
+
+        assert tokeniser("Distriktstilskudd Nord-Norge") == [
+            "distriktstilskudd", "nordnorge", "nord", "norge"]
+        assert tokeniser("Helse- og omsorgsdepartementet") == ["helse", "omsorgsdepartementet"]
+        assert tokeniser("Økonomi og ÅRSVERK") == ["økonomi", "årsverk"]
+
+    def test_prefikssok_og_stier(self, full_data):
+        from sokeindeks import bygg_sokeindeks, sok, valider_sokeindeks
+
+        indeks = bygg_sokeindeks(full_data, 2025)
+        assert indeks["termer"] == sorted(indeks["termer"])
+        assert valider_sokeindeks(indeks, full_data) == []
+
+        treff = sok(indeks, "forsv")
+        assert treff[0]["type"] == "kapittel" and treff[0]["kap_nr"] == 1720
+        assert sok(indeks, "okonomi") == sok(indeks, "økonomi") != []
+        stikkord = sok(indeks, "overslagsbevilg", maks=5)
+        assert stikkord and all(t["type"] == "post" for t in stikkord)
+        assert sok(indeks, "og") == []
+
+
+class TestDepartementsvisning:
+    """Verifiser at departementsvisningen bygges fra samme grunnlag og stemmer."""
+
+    def test_samme_totaler_og_delte_poster(self):
+        from syntetisk import generer_gul_bok, generer_saldert
+        from endringsdata import beregn_endringsdata
+        from bygg_hierarki import bygg_visninger, bygg_komplett_hierarki
+        from eksporter import departement_datasett
+        from valider import valider_departementer
+
+        df = generer_gul_bok(skala=1)
+        df = beregn_endringsdata(df, generer_saldert(df))
+        visninger = bygg_visninger(df)
+        hierarki = visninger["programomraader"]
+        departementer = departement_datasett(visninger["departementer"], 2025)
+
+        assert json.dumps(hierarki) == json.dumps(bygg_komplett_hierarki(df))
+        assert valider_departementer(departementer, hierarki) == []
+        dep = departementer["utgifter"]["departementer"][0]
+        assert {"fdep_nr", "navn", "total", "kapitler"} <= set(dep)
+
+        # Post-objektene deles mellom visningene
+        post = dep["kapitler"][0]["poster"][0]
+        alle_poster = [p for omr in hierarki["utgifter"]["omraader"]
+                       for kat in omr["kategorier"] for kap in kat["kapitler"]
+                       for p in kap["poster"]]
+        assert any(p is post for p in alle_poster)
+
+        dep["total"] += 1
+        assert len(valider_departementer(departementer, hierarki)) == 2
+
+
+class TestSammenligning:
+    """Verifiser diffmotoren for to budsjettabeller."""
+
+    def test_mot_saldert_som_endringsdata(self):
+        from syntetisk import generer_gul_bok, generer_saldert
+        from endringsdata import beregn_endringsdata
+        from sammenligning import sammenlign_rammer
+
+        df = generer_gul_bok(skala=1)
+        saldert = generer_saldert(df)
+        resultat = sammenlign_rammer(df, saldert, gammel_belop="saldert_belop")
+        poster = resultat["poster"].set_index(["kap_nr", "post_nr"])
+
+        beriket = beregn_endringsdata(df, saldert).drop_duplicates(["kap_nr", "post_nr"])
+        beriket = beriket.set_index(["kap_nr", "post_nr"])
+        matchet = beriket["saldert_belop"].notna()
+        assert (poster.loc[beriket.index[matchet], "endring_absolut"].to_numpy()
+                == beriket.loc[matchet, "endring_absolut"].to_numpy()).all()
+        assert set(poster.index[poster["status"] == "ny"]) == set(beriket.index[~matchet])
+        assert (poster["status"] == "utgaatt").sum() == len(saldert) - matchet.sum()
+
+        # Alle nivåer summerer til samme totale endring
+        total = resultat["poster"]["endring_absolut"].sum()
+        for niva in ["sider", "omraader", "kategorier", "kapitler"]:
+            assert resultat[niva]["endring_absolut"].sum() == total
+
+    def test_status_og_omnummerering(self):
+        from syntetisk import generer_gul_bok
+        from sammenligning import sammenlign_rammer, aarsendring_datasett
+        from valider import valider_aarsendring
+
+        ny = generer_gul_bok(skala=1)
+        gammel = ny.copy()
+        # Omnummerer én post (unikt navn i kapitlet), fjern én og endre én
+        gammel["post_navn"] = gammel["post_navn"] + " " + gammel["kap_nr"].astype(str)
+        ny["post_navn"] = gammel["post_navn"]
+        enkel = gammel.drop_duplicates(["kap_nr", "post_nr"], keep=False)
+        kap, post = enkel.iloc[0][["kap_nr", "post_nr"]]
+        gammel.loc[(gammel["kap_nr"] == kap) & (gammel["post_nr"] == post), "post_nr"] = 99
+        gammel.loc[(gammel["kap_nr"] == kap) & (gammel["post_nr"] == 99), "GB"] -= 1000
+        fjernet = enkel.iloc[1][["kap_nr", "post_nr"]].tolist()
+        ny = ny[~((ny["kap_nr"] == fjernet[0]) & (ny["post_nr"] == fjernet[1]))]
+
+        resultat = sammenlign_rammer(ny, gammel)
+        poster = resultat["poster"].set_index(["kap_nr", "post_nr"])
+        assert poster.loc[(kap, post), "status"] == "omnummerert"
+        assert poster.loc[(kap, post), "gammel_post_nr"] == 99
+        assert poster.loc[(kap, post), "endring_absolut"] == 1000
+        assert (kap, 99) not in poster.index
+        assert poster.loc[tuple(fjernet), "status"] == "utgaatt"
+        assert (poster["status"] == "uendret").sum() == len(poster) - 2
+
+        data = aarsendring_datasett(resultat, 2025, 2024)
+        assert data["poster"]["omnummererte"][0]["gammel_post_nr"] == 99
+        full = {side: {"total": int(ny.loc[ny["side"] == s, "GB"].sum())}
+                for side, s in [("utgifter", "utgift"), ("inntekter", "inntekt")]}
+        assert valider_aarsendring(data, full) == []
+
+    def test_tom_tabell(self):
+        from syntetisk import generer_gul_bok
+        from sammenligning import sammenlign_rammer
+
+        df = generer_gul_bok(skala=1)
+        antall = len(df.drop_duplicates(["kap_nr", "post_nr"]))
+        for ny, gammel, status in [(df, df.iloc[:0], "ny"), (df.iloc[:0], df, "utgaatt")]:
+            resultat = sammenlign_rammer(ny, gammel)
+            poster = resultat["poster"]
+            assert len(poster) == antall
+            assert (poster["status"] == status).all()
+            assert (poster["omr_nr"] >= 0).all()
+            assert resultat["sider"]["endring_absolut"].sum() == poster["endring_absolut"].sum()
+
+
+class TestHashtre:
+    """Verifiser innholdshashene og at uendrede shards ikke skrives på nytt."""
+
+    def test_endring_gir_ny_hash_kun_langs_stien(self, tmp_path, full_data):
+        import copy
+        from hashtre import bygg_hashtre, diff_hashtre, uendrede_omraader
+        from eksporter import eksporter_shards, SHARDMAPPE
+
+        tre = bygg_hashtre(full_data, 2025)
+        assert bygg_hashtre(copy.deepcopy(full_data), 2025) == tre
+        assert diff_hashtre(tre, tre) == []
+
+        endret = copy.deepcopy(full_data)
+        omr = endret["utgifter"]["omraader"][0]
+        kap = omr["kategorier"][0]["kapitler"][0]
+        kap["poster"][0]["belop"] += 1
+        ny = bygg_hashtre(endret, 2025)
+        stier = [sti for sti, status in diff_hashtre(tre, ny)]
+        assert len(stier) == 5 and stier[-1][:4] == [
+            "utgifter", str(omr["omr_nr"]), str(omr["kategorier"][0]["kat_nr"]), str(kap["kap_nr"])]
+
+        uendrede = uendrede_omraader(tre, ny)
+        assert ("utgifter", omr["omr_nr"]) not in uendrede
+        assert len(uendrede) == len(tre["utgifter"]["barn"]) + len(tre["inntekter"]["barn"]) - 1
+        assert uendrede_omraader(tre, bygg_hashtre(endret, 2025, minifisert=True)) == set()
+
+        # Shards for uendrede områder beholdes urørt
+        hierarki = {"utgifter": full_data["utgifter"], "inntekter": full_data["inntekter"]}
+        eksporter_shards(hierarki, 2025, tmp_path)
+        urort = tmp_path / SHARDMAPPE / "inntekter_4.json"
+        urort.write_text("uendret", encoding="utf-8")
+        eksporter_shards({"utgifter": endret["utgifter"], "inntekter": endret["inntekter"]},
+                         2025, tmp_path, uendrede=uendrede)
+        assert urort.read_text(encoding="utf-8") == "uendret"
+        shard = json.loads((tmp_path / SHARDMAPPE / f"utgifter_{omr['omr_nr']}.json").read_text(encoding="utf-8"))
+        assert shard["omraade"] == omr
+
+
+class TestDeterministiskSkriving:
+    """Verifiser deterministisk eksport, sammenlign-før-skriv og atomisk skriving."""
+
+    def test_uendret_innhold_skrives_ikke(self, tmp_path, full_data):
+        import os
+        from eksporter import eksporter_full, skriv_hvis_endret
+
+        hierarki = {"utgifter": full_data["utgifter"], "inntekter": full_data["inntekter"]}
+        fil = eksporter_full(hierarki, full_data["spu"], 2025, tmp_path, publisert="2024-10-07")
+        os.utime(fil, (1, 1))
+        innhold = fil.read_bytes()
+        eksporter_full(hierarki, full_data["spu"], 2025, tmp_path, publisert="2024-10-07")
+        assert fil.stat().st_mtime == 1 and fil.read_bytes() == innhold
+
+        assert skriv_hvis_endret(fil, b"{}") is True
+        assert skriv_hvis_endret(fil, b"{}") is False
+        assert fil.read_bytes() == b"{}"
+        assert [f.name for f in tmp_path.iterdir()] == [fil.name]
+
+    def test_publiseringsdato_fra_dokumentegenskaper(self, tmp_path):
+        import zipfile
+        from les_gul_bok import publiseringsdato
+
+        arbeidsbok = tmp_path / "Gul bok 2025.xlsx"
+        with zipfile.ZipFile(arbeidsbok, "w") as arkiv:
+            arkiv.writestr("docProps/core.xml", (
+                '<cp:coreProperties xmlns:dcterms="http://purl.org/dc/terms/">'
+                '<dcterms:created xsi:type="dcterms:W3CDTF">2024-09-01T08:00:00Z</dcterms:created>'
+                '<dcterms:modified xsi:type="dcterms:W3CDTF">2024-10-06T23:30:00Z</dcterms:modified>'
+                '</cp:coreProperties>'
+            ))
+        assert publiseringsdato(arbeidsbok) == "2024-10-06"
+
+
+class TestInnholdsadressering:
+    """Verifiser hashede filnavn, manifest og oppbevaring av utgåtte filer."""
+
+    def test_manifest_og_oppbevaring(self, tmp_path):
+        from datetime import date, timedelta
+        from innholdsadressering import publiser_innholdsadressert, er_hashet, MANIFESTFIL
+
+        utmappe, public = tmp_path / "data", tmp_path / "public"
+        (utmappe / "omraader").mkdir(parents=True)
+        public.mkdir()
+        full = utmappe / "gul_bok_full.json"
+        full.write_text('{"a": 1}', encoding="utf-8")
+        (utmappe / "omraader" / "utgifter_4.json").write_text("{}", encoding="utf-8")
+        filer = [full, utmappe / "omraader" / "utgifter_4.json"]
+
+        dag = date(2025, 10, 1)
+        manifest = publiser_innholdsadressert(filer, utmappe, public, idag=dag)
+        gammel = manifest["filer"]["gul_bok_full.json"]["fil"]
+        assert er_hashet(gammel) and (public / gammel).read_text(encoding="utf-8") == '{"a": 1}'
+        assert er_hashet(manifest["filer"]["omraader/utgifter_4.json"]["fil"])
+        assert json.loads((public / MANIFESTFIL).read_text(encoding="utf-8")) == manifest
+
+        # Uendret innhold gir samme navn; endret innhold gir nytt navn, og det
+        # gamle beholdes i oppbevaringstiden
+        assert publiser_innholdsadressert(filer, utmappe, public, idag=dag) == manifest
+        full.write_text('{"a": 2}', encoding="utf-8")
+        manifest = publiser_innholdsadressert(filer, utmappe, public, idag=dag)
+        assert manifest["filer"]["gul_bok_full.json"]["fil"] != gammel
+        assert manifest["utgaatte"] == {gammel: "2025-10-01"}
+        assert (public / gammel).exists()
+
+        manifest = publiser_innholdsadressert(filer, utmappe, public, behold_dager=30,
+                                              idag=dag + timedelta(days=31))
+        assert manifest["utgaatte"] == {} and not (public / gammel).exists()
+        assert not er_hashet("gul_bok_full.json") and er_hashet(f"{gammel}.br")
+
+    def test_vanlig_synkronisering_beholder_hashede_filer(self, tmp_path):
+        from innholdsadressering import MANIFESTFIL
+        from kjor_pipeline import synkroniser_public
+
+        utmappe = tmp_path / "data" / "2019"
+        utmappe.mkdir(parents=True)
+        (utmappe / "gul_bok_full.json").write_text('{"a": 1}', encoding="utf-8")
+        synkroniser_public(utmappe, innholdsadressert=True)
+        public = tmp_path / "public" / "data" / "2019"
+        hashede = sorted(f.name for f in public.iterdir() if f.name.count(".") == 2)
+        assert hashede and (public / MANIFESTFIL).exists()
+
+        # Et vanlig bygg etterpå rydder utdaterte filer, men ikke hashede filer og manifestet
+        (public / "gammel.json").write_text("{}", encoding="utf-8")
+        synkroniser_public(utmappe)
+        assert not (public / "gammel.json").exists()
+        assert (public / MANIFESTFIL).exists()
+        assert all((public / navn).exists() for navn in hashede)
+
+
+class TestApiServer:
+    """Verifiser oppslag, ETag/gzip og hot reload i budsjett-API-et."""
+
+    def test_oppslag_etag_og_gzip(self, tmp_path, full_data):
+        import gzip
+        import http.client
+        import shutil
+        import threading
+        from api_server import lag_server
+
+        shutil.copytree(DATA_DIR, tmp_path / "2025")
+        server, _ = lag_server(tmp_path, port=0, intervall=None)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        forbindelse = http.client.HTTPConnection(*server.server_address[:2])
+
+        def hent(sti, **hoder):
+            forbindelse.request("GET", "/api/v1/budsjett" + sti, headers=hoder)
+            svar = forbindelse.getresponse()
+            return svar, svar.read()
+
+        try:
+            omr = max(full_data["utgifter"]["omraader"], key=lambda o: len(o["kategorier"]))
+            kat, kap = omr["kategorier"][0], omr["kategorier"][0]["kapitler"][0]
+            svar, kropp = hent(f"/2025/utgifter/omraade/{omr['omr_nr']}")
+            assert svar.status == 200 and json.loads(kropp) == omr
+
+            svar, kropp = hent(f"/2025/utgifter/omraade/{omr['omr_nr']}", **{"Accept-Encoding": "gzip"})
+            assert svar.getheader("Content-Encoding") == "gzip"
+            assert json.loads(gzip.decompress(kropp)) == omr
+            etag = svar.getheader("ETag")
+            assert etag.endswith('-gz"')
+            svar, kropp = hent(f"/2025/utgifter/omraade/{omr['omr_nr']}",
+                               **{"If-None-Match": etag, "Accept-Encoding": "gzip"})
+            assert svar.status == 304 and kropp == b""
+            # gzip-ETagen validerer ikke den ukomprimerte varianten
+            svar, kropp = hent(f"/2025/utgifter/omraade/{omr['omr_nr']}", **{"If-None-Match": etag})
+            assert svar.status == 200 and json.loads(kropp) == omr
+            # En liste av ETager, en svak ETag eller «*» gir også 304
+            for hode in (f'"annen", {etag}', f"W/{etag}", "*"):
+                svar, kropp = hent(f"/2025/utgifter/omraade/{omr['omr_nr']}",
+                                   **{"If-None-Match": hode, "Accept-Encoding": "gzip"})
+                assert svar.status == 304 and kropp == b""
+
+            sti = f"/2025/utgifter/omraade/{omr['omr_nr']}/kategori/{kat['kat_nr']}"
+            assert json.loads(hent(sti)[1]) == kat
+            assert json.loads(hent(f"/2025/utgifter/kapittel/{kap['kap_nr']}")[1]) == kap
+
+            post = kap["poster"][0]
+            svar, kropp = hent(f"{sti}/kapittel/{kap['kap_nr']}/post/{post['post_nr']}")
+            assert post in json.loads(kropp)["poster"]
+            assert json.loads(hent("/2025/spu")[1])["spu"] == full_data["spu"]
+            assert hent("/2030/spu")[0].status == 404
+            assert hent(f"/2025/utgifter/kategori/{kat['kat_nr']}")[0].status == 404
+            assert hent("/tidsserie?omr_nr=4")[0].status == 404
+        finally:
+            forbindelse.close()
+            server.shutdown()
+            server.server_close()
+
+    def test_hot_reload(self, tmp_path):
+        import os
+        import shutil
+        from api_server import Budsjettlager
+
+        shutil.copytree(DATA_DIR, tmp_path / "2025")
+        lager = Budsjettlager(tmp_path)
+        svar = lager.slaa_opp("/2025/endringer", {})
+        assert lager.oppdater() == []
+
+        endringer = tmp_path / "2025" / "gul_bok_endringer.json"
+        data = json.loads(endringer.read_text(encoding="utf-8"))
+        data["endring_etikett"] = "ny etikett"
+        endringer.write_text(json.dumps(data), encoding="utf-8")
+        os.utime(endringer, ns=(0, 10**18))
+        assert lager.oppdater() == ["2025"]
+        nytt = lager.slaa_opp("/2025/endringer", {})
+        assert nytt.etag != svar.etag and json.loads(nytt.kropp)["endring_etikett"] == "ny etikett"
+
+        # Tidsserie-cachen har én oppføring per intervall innenfor seriens år
+        from tidsserie import oppdater_tidsserier
+        oppdater_tidsserier(tmp_path)
+        assert lager.oppdater() == ["tidsserie"]
+        alle = lager.slaa_opp("/tidsserie", {"omr_nr": ["4"]})
+        for fra, til in [("1900", "3000"), ("2000", "2025"), ("2025", "9999")]:
+            assert lager.slaa_opp("/tidsserie", {"omr_nr": ["4"], "fra": [fra], "til": [til]}) is alle
+        tom = lager.slaa_opp("/tidsserie", {"omr_nr": ["4"], "fra": ["3000"]})
+        assert json.loads(tom.kropp)["serie"] == []
+        assert lager.slaa_opp("/tidsserie", {"omr_nr": ["4"], "til": ["1900"]}) is tom
+        assert len(lager.tidsserier._svar) == 2
+
+        gamle_aar = lager.aar
+        shutil.rmtree(tmp_path / "2025")
+        assert lager.oppdater() == ["-2025"] and lager.aar == {}
+        assert list(gamle_aar) == [2025]  # byttet ut, ikke endret på stedet
+
+
+class TestScenario:
+    """Verifiser at inkrementelle hva-om-endringer gir det samme som et nytt bygg."""
+
+    def test_delta_lik_nytt_bygg(self):
+        import copy
+        from syntetisk import generer_gul_bok, generer_saldert
+        from endringsdata import beregn_endringsdata
+        from scenario import AGGREGERTFIL, FULLFIL, METADATAFIL, Scenario, anvend_patch
+
+        grunn = generer_gul_bok(skala=1)
+        saldert = generer_saldert(grunn)
+        manuelle = {"strukturelt_underskudd": 400_000_000_000}
+        scenario = Scenario.fra_tabell(beregn_endringsdata(grunn, saldert), 2025, manuelle)
+        klient = {FULLFIL: copy.deepcopy(scenario.full),
+                  AGGREGERTFIL: copy.deepcopy(scenario.aggregert),
+                  METADATAFIL: copy.deepcopy(scenario.metadata)}
+
+        upost = grunn[(grunn["upost_nr"] > 0) & (grunn["side"] == "utgift")
+                      & (grunn["post_nr"] < 90)].iloc[0]
+        endringer = [
+            (int(upost["kap_nr"]), int(upost["post_nr"]), int(upost["upost_nr"]), 7_000_000),
+            (5700, 72, 0, -20_000_000),     # arbeidsgiveravgift
+            (2800, 50, 0, 1_000_000_000),   # SPU, utenfor oljekorrigert
+            (5685, 85, 0, -10_000_000),     # Equinor-utbyttet blir negativt
+            (5800, 50, 2, 5_000_000),
+        ]
+        # En stor økning i transport bytter rekkefølge (og farger) på kategoriene
+        transport = grunn[(grunn["omr_nr"] == 21) & (grunn["side"] == "utgift")
+                          & (grunn["post_nr"] < 90)].iloc[0]
+        endringer.append((int(transport["kap_nr"]), int(transport["post_nr"]),
+                          int(transport["upost_nr"]), 50_000_000_000))
+
+        endret = grunn.copy()
+        for kap, post, upost_nr, delta in endringer:
+            patch = scenario.endre_post(kap, post, upost_nr, delta)
+            for fil, ops in patch.items():
+                anvend_patch(klient[fil], ops)
+            rad = ((endret["kap_nr"] == kap) & (endret["post_nr"] == post)
+                   & (endret["upost_nr"] == upost_nr))
+            endret.loc[rad, "GB"] += delta
+
+        fasit = Scenario.fra_tabell(beregn_endringsdata(endret, saldert), 2025, manuelle)
+        for fil, dokument in [(FULLFIL, fasit.full), (AGGREGERTFIL, fasit.aggregert),
+                              (METADATAFIL, fasit.metadata)]:
+            assert klient[fil] == dokument, fil
+        assert scenario.full == fasit.full
+        # Siste endring endret rekkefølgen, så hele kategorilisten erstattes
+        assert {"/utgifter_aggregert", "/total_utgifter"} <= {op["path"] for op in patch[AGGREGERTFIL]}
+
+        # Én endring berører bare stien opp til siden, ikke andre områder
+        patch = scenario.endre_post(*endringer[0][:3], 1000)
+        omraade_stier = {"/".join(op["path"].split("/")[:4]) for op in patch[FULLFIL]
+                         if "/omraader/" in op["path"]}
+        assert len(omraade_stier) == 1
+        assert scenario.endre_post(*endringer[0][:3], 0) == {FULLFIL: [], AGGREGERTFIL: [], METADATAFIL: []}
+        with pytest.raises(KeyError):
+            scenario.endre_post(9999, 1, 0, 1)
+
+    def test_manuelle_tall_fra_eksporterte_filer(self, full_data, aggregert_data, metadata):
+        from pathlib import Path
+        from scenario import FULLFIL, METADATAFIL, Scenario, anvend_patch
+        from valider import valider_data
+
+        scenario = Scenario(full_data, aggregert_data, metadata)
+        patch = scenario.endre_manuelle_tall({"strukturelt_underskudd": 500_000_000_000,
+                                              "uttaksprosent": 2.9})
+        assert anvend_patch(full_data, patch[FULLFIL])["oljekorrigert"] == scenario.full["oljekorrigert"]
+        assert metadata["oljekorrigert_totaler"] != scenario.metadata["oljekorrigert_totaler"]
+        anvend_patch(metadata, patch[METADATAFIL])
+        assert metadata["oljekorrigert_totaler"]["uttaksprosent"] == 2.9
+
+        patch = scenario.endre_manuelle_tall({"uttaksprosent": None})
+        assert patch[FULLFIL] == [{"op": "remove", "path": "/oljekorrigert/uttaksprosent"}]
+
+        # Fondsuttaket følger underskuddet, og datasettene er fortsatt konsistente
+        kap = full_data["utgifter"]["omraader"][0]["kategorier"][0]["kapitler"][0]
+        post = kap["poster"][0]
+        scenario.endre_post(kap["kap_nr"], post["post_nr"], post["upost_nr"], 200_000_000)
+        assert scenario.spu["fondsuttak"] == full_data["spu"]["fondsuttak"] + 200_000_000
+        assert scenario.underskudd == scenario.spu["fondsuttak"]
+        assert valider_data(scenario.full, scenario.aggregert, 2025) == []
+
+        with pytest.raises(FileNotFoundError, match="gul_bok_full.json"):
+            Scenario.fra_mappe(Path(ROT_DIR) / "data" / "1900")
+
+    def test_endring_fra_kommandolinjen(self):
+        import argparse
+        from scenario import _les_endring
+
+        assert _les_endring("1700.1.1=+250000000") == (1700, 1, 1, 250_000_000)
+        assert _les_endring("2800.50=-1e9") == (2800, 50, 0, -1_000_000_000)
+        for ugyldig in ("1.2.3.4.5=1", "1700=5", "1700.1.1", "a.b=1"):
+            with pytest.raises(argparse.ArgumentTypeError):
+                _les_endring(ugyldig)
@@ -0,0 +1,260 @@
+"""
+Tidsserier på tvers av budsjettår.
+Samler alle prosesserte år (data/ÅRSTALL/gul_bok_full.json) i ett kolonnevis
+lager i langt format, én rad per (aar, side, omr_nr, kat_nr, kap_nr, post_nr,
+upost_nr) med beløp og saldert forrige år. Fra lageret skrives ferdigberegnede
+serier per programområde og per kapittel til data/tidsserie/, slik at et
+oppslag i /historikk (eller tidsserie-API-et) er én liten fil i stedet for åtte
+fulle årsfiler som aggregeres i klienten.
+
+Lageret skrives som Parquet når pyarrow er tilgjengelig. Seriene bygges bare
+på nytt når en av årsfilene (eller koden som bygger dem) er endret.
+"""
+
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from bygg_hierarki import endring_for_node
+from byggmanifest import er_uendret, pipeline_kodefiler, skriv_manifest
+from eksporter import skriv_json
+from mellomlager import filhash, har_parquet
+
+TIDSSERIEMAPPE = "tidsserie"
+LAGERFIL = "tidsserie.parquet"
+SERIEINDEKS = "indeks.json"
+OMRAADEMAPPE = "omraader"
+KAPITTELMAPPE = "kapitler"
+
+SIDER = ["utgifter", "inntekter"]
+NOKKELKOLONNER = ["aar", "side", "omr_nr", "kat_nr", "kap_nr", "post_nr", "upost_nr"]
+LAGERKOLONNER = NOKKELKOLONNER + [
+    "omr_navn", "kat_navn", "kap_navn", "post_navn", "belop", "saldert_forrige",
+]
+
+
+def flat_aar(full: dict) -> pd.DataFrame:
+    """Flater ut hierarkiet i ett års gul_bok_full.json til én rad per post.
+    saldert_forrige er tom (NA) for poster uten saldert budsjett."""
+    rader = []
+    aar = full["budsjettaar"]
+    for side in SIDER:
+        for omr in full[side]["omraader"]:
+            for kat in omr["kategorier"]:
+                for kap in kat["kapitler"]:
+                    for post in kap["poster"]:
+                        endring = post["endring_fra_saldert"]
+                        rader.append((
+                            aar, side, omr["omr_nr"], kat["kat_nr"], kap["kap_nr"],
+                            post["post_nr"], post["upost_nr"],
+                            omr["navn"], kat["navn"], kap["navn"], post["navn"],
+                            post["belop"],
+                            endring["saldert_forrige"] if endring is not None else None,
+                        ))
+    df = pd.DataFrame(rader, columns=LAGERKOLONNER)
+    df["saldert_forrige"] = df["saldert_forrige"].astype("Int64")
+    return df
+
+
+def aarsfiler(datamappe: Path) -> dict[int, Path]:
+    """gul_bok_full.json for alle prosesserte år i datamappen."""
+    return {
+        int(mappe.name): mappe / "gul_bok_full.json"
+        for mappe in sorted(datamappe.iterdir())
+        if mappe.name.isdigit() and (mappe / "gul_bok_full.json").exists()
+    }
+
+
+def bygg_lager(datamappe: Path) -> pd.DataFrame:
+    """Samler alle prosesserte år i ett lager i langt format, sortert på nøklene."""
+    deler = []
+    for filsti in aarsfiler(datamappe).values():
+        with open(filsti, encoding="utf-8") as f:
+            deler.append(flat_aar(json.load(f)))
+    if not deler:
+        return pd.DataFrame(columns=LAGERKOLONNER)
+    lager = pd.concat(deler, ignore_index=True)
+    return lager.sort_values(NOKKELKOLONNER, kind="stable", ignore_index=True)
+
+
+def _serier(lager: pd.DataFrame, nokler: list[str], navn_kol: str) -> dict[tuple, list[dict]]:
+    """Summerer lageret per (nøkler, år) og bygger ett punkt per år:
+    {aar, navn, total, endring_fra_saldert}. Endring fra saldert beregnes fra
+    aggregerte beløp på samme måte som i hierarkiet."""
+    grupper = lager.assign(
+        saldert=lager["saldert_forrige"].fillna(0),
+        har_saldert=lager["saldert_forrige"].notna(),
+    ).groupby(nokler + ["aar"], sort=True).agg(
+        navn=(navn_kol, "first"),
+        total=("belop", "sum"),
+        saldert=("saldert", "sum"),
+        har_saldert=("har_saldert", "any"),
+    ).reset_index()
+
+    serier: dict[tuple, list[dict]] = {}
+    kolonner = {kol: grupper[kol].tolist() for kol in grupper.columns}
+    for i in range(len(grupper)):
+        nokkel = tuple(kolonner[kol][i] for kol in nokler)
+        total = int(kolonner["total"][i])
+        serier.setdefault(nokkel, []).append({
+            "aar": int(kolonner["aar"][i]),
+            "navn": kolonner["navn"][i],
+            "total": total,
+            "endring_fra_saldert": endring_for_node(
+                total, int(kolonner["saldert"][i]), bool(kolonner["har_saldert"][i])
+            ),
+        })
+    return serier
+
+
+def _med_forrige_aar(punkter: list[dict]) -> list[dict]:
+    """Legger til endring fra forrige budsjettår i serien (null når året
+    før mangler i serien)."""
+    forrige = {}
+    for punkt in punkter:
+        belop = forrige.get(punkt["aar"] - 1)
+        punkt["endring_fra_forrige_aar"] = None
+        if belop is not None:
+            endring = punkt["total"] - belop
+            punkt["endring_fra_forrige_aar"] = {
+                "belop_forrige": belop,
+                "endring_absolut": endring,
+                "endring_prosent": round(endring / abs(belop) * 100, 1) if belop != 0 else None,
+            }
+        forrige[punkt["aar"]] = punkt["total"]
+    return punkter
+
+
+def serie_fil(side: str, nr: int, mappe: str = OMRAADEMAPPE) -> str:
+    """Relativ sti (fra data/tidsserie/) til serien for et område eller kapittel."""
+    return f"{mappe}/{side}_{nr}.json"
+
+
+def tidsserie_datasett(lager: pd.DataFrame) -> dict[str, dict]:
+    """Bygger alle seriefiler fra lageret: {relativ sti: innhold}, inkludert
+    indeksen med totalserie per side og oversikt over områdeseriene."""
+    aar = sorted(int(a) for a in lager["aar"].unique())
+    filer: dict[str, dict] = {}
+    indeks = {"aar": aar}
+
+    sider = _serier(lager, ["side"], "side")
+    omraader = _serier(lager, ["side", "omr_nr"], "omr_navn")
+    kapitler = _serier(lager, ["side", "kap_nr"], "kap_navn")
+    # Kapitler kan flyttes mellom områder; området per år tas med i serien
+    kap_omr = lager.groupby(["side", "kap_nr", "aar"])["omr_nr"].first().to_dict()
+
+    for side in SIDER:
+        oversikt = []
+        for (s, omr_nr), punkter in omraader.items():
+            if s != side:
+                continue
+            filer[serie_fil(side, omr_nr)] = {
+                "side": side,
+                "omr_nr": int(omr_nr),
+                "navn": punkter[-1]["navn"],
+                "serie": _med_forrige_aar(punkter),
+            }
+            oversikt.append({
+                "omr_nr": int(omr_nr),
+                "navn": punkter[-1]["navn"],
+                "fra": punkter[0]["aar"],
+                "til": punkter[-1]["aar"],
+                "fil": serie_fil(side, omr_nr),
+            })
+        for (s, kap_nr), punkter in kapitler.items():
+            if s != side:
+                continue
+            for punkt in punkter:
+                punkt["omr_nr"] = int(kap_omr[(side, kap_nr, punkt["aar"])])
+            filer[serie_fil(side, kap_nr, KAPITTELMAPPE)] = {
+                "side": side,
+                "kap_nr": int(kap_nr),
+                "navn": punkter[-1]["navn"],
+                "serie": _med_forrige_aar(punkter),
+            }
+        indeks[side] = {
+            "serie": _med_forrige_aar(
+                [{k: v for k, v in p.items() if k != "navn"} for p in sider.get((side,), [])]
+            ),
+            "omraader": oversikt,
+            "kapittelfiler": f"{KAPITTELMAPPE}/{side}_{{kap_nr}}.json",
+        }
+
+    filer[SERIEINDEKS] = indeks
+    return filer
+
+
+def _fingeravtrykk(datamappe: Path, minifisert: bool) -> dict:
+    """Fingeravtrykk av årsfilene og koden som bygger seriene (denne modulen
+    og det den importerer fra pipeline-mappen)."""
+    return {
+        "aarsfiler": {str(aar): filhash(filsti) for aar, filsti in aarsfiler(datamappe).items()},
+        "kode_sha256": filhash(*pipeline_kodefiler(Path(__file__).name)),
+        "valg": {"minifisert": minifisert},
+    }
+
+
+def oppdater_tidsserier(datamappe: Path, minifisert: bool = False,
+                        tving: bool = False) -> Path | None:
+    """Konsoliderer alle år i data/tidsserie/ og skriver seriefilene.
+    Hopper over bygget når ingen årsfil er endret siden forrige gang (med
+    mindre tving=True). Utdaterte seriefiler fjernes. Returnerer mappen,
+    eller None hvis det ikke finnes prosesserte år."""
+    utmappe = datamappe / TIDSSERIEMAPPE
+    fingeravtrykk = _fingeravtrykk(datamappe, minifisert)
+    if not fingeravtrykk["aarsfiler"]:
+        return None
+    if not tving and er_uendret(utmappe, fingeravtrykk, [SERIEINDEKS]):
+        print("  ↷ Tidsserier uendret, hopper over")
+        return utmappe
+
+    lager = bygg_lager(datamappe)
+    utmappe.mkdir(parents=True, exist_ok=True)
+    if har_parquet():
+        # Skriv til midlertidig fil og bytt inn atomisk
+        tmp = utmappe / f"{LAGERFIL}.{os.getpid()}.tmp"
+        lager.to_parquet(tmp, index=False)
+        os.replace(tmp, utmappe / LAGERFIL)
+
+    filer = tidsserie_datasett(lager)
+    for relativ, data in filer.items():
+        filsti = utmappe / relativ
+        filsti.parent.mkdir(parents=True, exist_ok=True)
+        skriv_json(data, filsti, minifisert)
+
+    for mappe in (OMRAADEMAPPE, KAPITTELMAPPE):
+        for gammel in (utmappe / mappe).glob("*.json*"):
+            relativ = f"{mappe}/{gammel.name.split('.json')[0]}.json"
+            if relativ not in filer:
+                gammel.unlink()
+
+    skriv_manifest(utmappe, fingeravtrykk)
+    antall_omr = sum(1 for f in filer if f.startswith(OMRAADEMAPPE))
+    print(f"  ✓ Tidsserier {min(filer[SERIEINDEKS]['aar'])}–{max(filer[SERIEINDEKS]['aar'])}: "
+          f"{len(lager)} rader, {antall_omr} områdeserier, "
+          f"{len(filer) - antall_omr - 1} kapittelserier")
+    return utmappe
+
+
+def hent_serie(datamappe: Path, omr_nr: int, side: str = "utgifter",
+               fra: int | None = None, til: int | None = None) -> dict:
+    """Referanseoppslag for tidsserie-API-et: leser én områdeserie og
+    avgrenser den til årene fra–til (inklusive)."""
+    with open(datamappe / TIDSSERIEMAPPE / serie_fil(side, omr_nr), encoding="utf-8") as f:
+        serie = json.load(f)
+    serie["serie"] = [
+        p for p in serie["serie"]
+        if (fra is None or p["aar"] >= fra) and (til is None or p["aar"] <= til)
+    ]
+    return serie
+
+
+if __name__ == "__main__":
+    datamappe = Path(__file__).parent.parent / "data"
+    oppdater_tidsserier(datamappe, tving=True)
+    serie = hent_serie(datamappe, 4)
+    print(f"\n{serie['navn']} (utgifter, område 4):")
+    for punkt in serie["serie"]:
+        print(f"  {punkt['aar']}: {punkt['total'] / 1e9:8.1f} mrd. kr")
@@ -4,8 +4,24 @@ Verifiserer totalsummer, hierarkinøkler og strukturell integritet.
 """
 
 import json
+import time
+import tracemalloc
 from pathlib import Path
 
+import numpy as np
+
+try:
+    import ijson
+except ImportError:  # Valgfri avhengighet; kun nødvendig for strømmende validering
+    ijson = None
+
+from eksporter import (
+    AARSENDRINGFIL, DEPARTEMENTFIL, HASHFIL, INDEKSFIL, KOMPAKTFIL, SOKEINDEKSFIL, sett_sammen_shards,
+)
+from hashtre import bygg_hashtre, diff_hashtre
+from kompakt import dekod_kompakt
+from sokeindeks import valider_sokeindeks
+
 # Forventede totaler (i mrd. kr, med avrundingsmargin).
 # Oljekorrigerte tall = «uten olje og gass» (post < 90, ekskl. petroleumskapitler).
 # Se OLJEKORRIGERT.md for fullstendig begrunnelse.
@@ -27,29 +43,114 @@ FORVENTEDE_TOTALER = {
 }
 
 
-def valider_json_filer(datamappe: Path, budsjettaar: int) -> list[str]:
-    """Validerer alle JSON-filer i datamappen. Returnerer liste med feil."""
+# Filene pipelinen eksporterer for hvert budsjettår
+FORVENTEDE_FILER = [
+    "gul_bok_full.json",
+    "gul_bok_aggregert.json",
+    "gul_bok_endringer.json",
+    "metadata.json",
+]
+
+
+# Hierarkinivåene under hver side: (listenøkkel, nummerfelt, beløpsfelt,
+# betegnelse for foreldrenoden i feilmeldinger)
+HIERARKINIVAAER = [
+    ("omraader", "omr_nr", "total", "{side}"),
+    ("kategorier", "kat_nr", "total", "{side} omr {nr}"),
+    ("kapitler", "kap_nr", "total", "kat {nr}"),
+    ("poster", "post_nr", "belop", "kap {nr}"),
+]
+
+DEPARTEMENTNIVAAER = [
+    ("departementer", "fdep_nr", "total", "{side}"),
+    ("kapitler", "kap_nr", "total", "{side} dep {nr}"),
+    ("poster", "post_nr", "belop", "kap {nr}"),
+]
+
+
+def _flat_hierarki(side: dict, nivaaer: list[tuple] = HIERARKINIVAAER) -> list[dict[str, np.ndarray]]:
+    """Flater ut én side til arrays per nivå: beløp, nummer og indeksen til
+    foreldrenoden på nivået over (nivå 0 har siden selv som eneste forelder)."""
+    flate = []
+    foreldre = [side]
+    for liste, nr_felt, belop_felt, _ in nivaaer:
+        barn, belop, nr, forelder = [], [], [], []
+        for i, node in enumerate(foreldre):
+            for b in node[liste]:
+                barn.append(b)
+                belop.append(b[belop_felt])
+                nr.append(b[nr_felt])
+                forelder.append(i)
+        flate.append({
+            "belop": np.asarray(belop, dtype=np.int64),
+            "nr": np.asarray(nr, dtype=np.int64),
+            "forelder": np.asarray(forelder, dtype=np.int64),
+        })
+        foreldre = barn
+    return flate
+
+
+def valider_hierarki(side_navn: str, side: dict,
+                     nivaaer: list[tuple] = HIERARKINIVAAER) -> list[str]:
+    """Sjekker at summen av hvert nivå er lik totalen til foreldrenoden.
+    Hvert nivå summeres med én np.add.at-reduksjon over de flate arrayene
+    i stedet for nestede løkker, og alle avvik returneres."""
     feil = []
+    foreldre_belop = np.array([side["total"]], dtype=np.int64)
+    foreldre_nr = np.zeros(1, dtype=np.int64)
 
-    # Sjekk at alle filer eksisterer
-    forventede_filer = [
-        "gul_bok_full.json",
-        "gul_bok_aggregert.json",
-        "gul_bok_endringer.json",
-        "metadata.json",
-    ]
-
-    for filnavn in forventede_filer:
-        filsti = datamappe / filnavn
-        if not filsti.exists():
-            feil.append(f"Mangler fil: {filsti}")
+    for (liste, _, _, betegnelse), barn in zip(nivaaer, _flat_hierarki(side, nivaaer)):
+        summer = np.zeros(len(foreldre_belop), dtype=np.int64)
+        np.add.at(summer, barn["forelder"], barn["belop"])
 
-    if feil:
-        return feil
+        for i in np.flatnonzero(summer != foreldre_belop):
+            node = betegnelse.format(side=side_navn, nr=int(foreldre_nr[i]))
+            feil.append(f"Inkonsistent total for {node}: "
+                        f"sum {liste}={int(summer[i])}, total={int(foreldre_belop[i])}")
+
+        foreldre_belop, foreldre_nr = barn["belop"], barn["nr"]
+
+    return feil
+
+
+def valider_departementer(departement_data: dict, full_data: dict) -> list[str]:
+    """Sjekker at departementsvisningen er internt konsistent og gir samme
+    sidetotaler (og endring fra saldert) som programområdehierarkiet."""
+    feil = []
+    for side_navn in ["utgifter", "inntekter"]:
+        side = departement_data[side_navn]
+        feil.extend(f"Departementsvisning: {f}"
+                    for f in valider_hierarki(side_navn, side, DEPARTEMENTNIVAAER))
+        if side["total"] != full_data[side_navn]["total"]:
+            feil.append(f"Departementsvisningen gir annen total for {side_navn}: "
+                        f"{side['total']} != {full_data[side_navn]['total']}")
+        if side["endring_fra_saldert"] != full_data[side_navn]["endring_fra_saldert"]:
+            feil.append(f"Departementsvisningen gir annen endring fra saldert for {side_navn}")
+    return feil
+
+
+def valider_aarsendring(aarsendring_data: dict, full_data: dict) -> list[str]:
+    """Sjekker at årsendringen har samme sidetotaler som hierarkiet, og at
+    endringene per område summerer til endringen for siden."""
+    feil = []
+    for side_navn in ["utgifter", "inntekter"]:
+        side = aarsendring_data[side_navn]
+        if side.get("ny_belop", 0) != full_data[side_navn]["total"]:
+            feil.append(f"Årsendringen gir annen total for {side_navn}: "
+                        f"{side.get('ny_belop', 0)} != {full_data[side_navn]['total']}")
+        sum_omr = sum(o["endring_absolut"] for o in side["omraader"])
+        if sum_omr != side.get("endring_absolut", 0):
+            feil.append(f"Årsendringen for {side_navn}: sum av områdene ({sum_omr}) != "
+                        f"endring for siden ({side.get('endring_absolut', 0)})")
+    return feil
 
-    # Valider gul_bok_full.json
-    with open(datamappe / "gul_bok_full.json", encoding="utf-8") as f:
-        full_data = json.load(f)
+
+def valider_data(full_data: dict, agg_data: dict, budsjettaar: int,
+                 agg_filstorrelse: int | None = None) -> list[str]:
+    """Validerer fullt og aggregert datasett direkte i minnet, slik pipelinen
+    nettopp har bygget dem. Returnerer liste med alle feil.
+    agg_filstorrelse (bytes) sjekkes mot grensen på 50 KB når den er oppgitt."""
+    feil = []
 
     # Sjekk budsjettår
     if full_data.get("budsjettaar") != budsjettaar:
@@ -78,44 +179,11 @@ def valider_json_filer(datamappe: Path, budsjettaar: int) -> list[str]:
 
     # Valider hierarki-konsistens: sum av underliggende = total
     for side_navn in ["utgifter", "inntekter"]:
-        side = full_data[side_navn]
-        sum_omraader = sum(o["total"] for o in side["omraader"])
-        if sum_omraader != side["total"]:
-            feil.append(
-                f"Inkonsistent total for {side_navn}: "
-                f"sum omraader={sum_omraader}, total={side['total']}"
-            )
-
-        for omraade in side["omraader"]:
-            sum_kat = sum(k["total"] for k in omraade["kategorier"])
-            if sum_kat != omraade["total"]:
-                feil.append(
-                    f"Inkonsistent total for {side_navn} omr {omraade['omr_nr']}: "
-                    f"sum kategorier={sum_kat}, total={omraade['total']}"
-                )
-
-            for kat in omraade["kategorier"]:
-                sum_kap = sum(k["total"] for k in kat["kapitler"])
-                if sum_kap != kat["total"]:
-                    feil.append(
-                        f"Inkonsistent total for kat {kat['kat_nr']}: "
-                        f"sum kapitler={sum_kap}, total={kat['total']}"
-                    )
-
-                for kap in kat["kapitler"]:
-                    sum_poster = sum(p["belop"] for p in kap["poster"])
-                    if sum_poster != kap["total"]:
-                        feil.append(
-                            f"Inkonsistent total for kap {kap['kap_nr']}: "
-                            f"sum poster={sum_poster}, total={kap['total']}"
-                        )
+        feil.extend(valider_hierarki(side_navn, full_data[side_navn]))
 
     # Valider aggregert datasett
     # NB: Aggregert data EKSKLUDERER SPU (omr 34 fra utgifter, kap 5800 fra inntekter)
     # Så aggregert totaler er lavere enn full totaler. Vi sjekker bare intern konsistens.
-    with open(datamappe / "gul_bok_aggregert.json", encoding="utf-8") as f:
-        agg_data = json.load(f)
-
     sum_agg_utgifter = sum(k["belop"] for k in agg_data["utgifter_aggregert"])
     sum_agg_inntekter = sum(k["belop"] for k in agg_data["inntekter_aggregert"])
 
@@ -183,20 +251,225 @@ def valider_json_filer(datamappe: Path, budsjettaar: int) -> list[str]:
             )
 
     # Sjekk filstørrelse for aggregert (bør være < 50 KB)
-    agg_filstr = (datamappe / "gul_bok_aggregert.json").stat().st_size
-    if agg_filstr > 50 * 1024:
+    if agg_filstorrelse is not None and agg_filstorrelse > 50 * 1024:
+        feil.append(
+            f"gul_bok_aggregert.json er for stor: {agg_filstorrelse / 1024:.1f} KB (maks 50 KB)"
+        )
+
+    return feil
+
+
+def valider_json_filer(datamappe: Path, budsjettaar: int) -> list[str]:
+    """Validerer de eksporterte JSON-filene i datamappen (f.eks. committede
+    data i CI): leser filene fra disk, kjører valider_data og sjekker at
+    shards og kompakt variant gjenskaper det fulle hierarkiet, at
+    departementsvisningen og årsendringen gir samme totaler, at
+    innholdshashene stemmer og at søkeindeksen peker på riktige noder."""
+    feil = []
+
+    # Sjekk at alle filer eksisterer
+    for filnavn in FORVENTEDE_FILER:
+        filsti = datamappe / filnavn
+        if not filsti.exists():
+            feil.append(f"Mangler fil: {filsti}")
+
+    if feil:
+        return feil
+
+    with open(datamappe / "gul_bok_full.json", encoding="utf-8") as f:
+        full_data = json.load(f)
+    with open(datamappe / "gul_bok_aggregert.json", encoding="utf-8") as f:
+        agg_data = json.load(f)
+
+    feil.extend(valider_data(
+        full_data, agg_data, budsjettaar,
+        agg_filstorrelse=(datamappe / "gul_bok_aggregert.json").stat().st_size,
+    ))
+
+    # Valider at shards + rotindeks setter sammen til nøyaktig det fulle hierarkiet
+    if (datamappe / INDEKSFIL).exists():
+        feil.extend(valider_shards(datamappe, full_data))
+
+    if (datamappe / KOMPAKTFIL).exists():
+        with open(datamappe / KOMPAKTFIL, encoding="utf-8") as f:
+            feil.extend(valider_kompakt(json.load(f), full_data))
+
+    if (datamappe / DEPARTEMENTFIL).exists():
+        with open(datamappe / DEPARTEMENTFIL, encoding="utf-8") as f:
+            feil.extend(valider_departementer(json.load(f), full_data))
+
+    if (datamappe / SOKEINDEKSFIL).exists():
+        with open(datamappe / SOKEINDEKSFIL, encoding="utf-8") as f:
+            feil.extend(valider_sokeindeks(json.load(f), full_data))
+
+    if (datamappe / HASHFIL).exists():
+        with open(datamappe / HASHFIL, encoding="utf-8") as f:
+            feil.extend(valider_hashtre(json.load(f), full_data, budsjettaar))
+
+    if (datamappe / AARSENDRINGFIL).exists():
+        with open(datamappe / AARSENDRINGFIL, encoding="utf-8") as f:
+            feil.extend(valider_aarsendring(json.load(f), full_data))
+
+    return feil
+
+
+def valider_kompakt(kompakt: dict, full_data: dict) -> list[str]:
+    """Sjekker at den kompakte varianten dekodes til nøyaktig gul_bok_full.json."""
+    try:
+        if dekod_kompakt(kompakt) != full_data:
+            return [f"{KOMPAKTFIL} dekodes ikke til samme innhold som gul_bok_full.json"]
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        return [f"Kunne ikke dekode {KOMPAKTFIL}: {e}"]
+    return []
+
+
+def valider_hashtre(hashtre: dict, full_data: dict, budsjettaar: int) -> list[str]:
+    """Sjekker at innholdshashene stemmer med gul_bok_full.json."""
+    avvik = diff_hashtre(hashtre, bygg_hashtre(full_data, budsjettaar, hashtre["minifisert"]))
+    if avvik:
+        return [f"{HASHFIL} stemmer ikke med gul_bok_full.json "
+                f"(avvik i {'/'.join(avvik[-1][0])})"]
+    return []
+
+
+def valider_shards(datamappe: Path, full_data: dict) -> list[str]:
+    """Sjekker at rotindeksen og shardene gjenskaper utgifter/inntekter i
+    gul_bok_full.json nøyaktig, og at indeksens områdetotaler stemmer."""
+    feil = []
+    try:
+        sammensatt = sett_sammen_shards(datamappe)
+    except (OSError, KeyError, json.JSONDecodeError) as e:
+        return [f"Kunne ikke sette sammen shards: {e}"]
+
+    for side_navn in ["utgifter", "inntekter"]:
+        if sammensatt[side_navn] == full_data[side_navn]:
+            continue
+        # Finn hvilke områder som avviker for en lesbar feilmelding
+        fulle = {o["omr_nr"]: o for o in full_data[side_navn]["omraader"]}
+        shards = {o["omr_nr"]: o for o in sammensatt[side_navn]["omraader"]}
+        avvik = sorted(
+            nr for nr in fulle.keys() | shards.keys() if fulle.get(nr) != shards.get(nr)
+        )
         feil.append(
-            f"gul_bok_aggregert.json er for stor: {agg_filstr / 1024:.1f} KB (maks 50 KB)"
+            f"Shards for {side_navn} gjenskaper ikke gul_bok_full.json "
+            f"(avvikende omr: {avvik or 'side-totaler'})"
         )
 
     return feil
 
 
+def _sjekk_strommende(filsti: Path) -> tuple[list[str], int]:
+    """Ett strømmende pass over gul_bok_full.json med en stabel av åpne noder.
+    Returnerer (feil, antall noder)."""
+    # Prefiks-suffiks for hver nodetype → nivå i stabelen (0 er siden selv)
+    nodesuffiks = {f".{liste}.item": niva + 1
+                   for niva, (liste, *_) in enumerate(HIERARKINIVAAER[:-1])}
+    postsuffiks = f".{HIERARKINIVAAER[-1][0]}.item"
+    nr_felt = {felt for _, felt, _, _ in HIERARKINIVAAER[:-1]}
+
+    def nivaa(prefiks: str, side: str) -> int | None:
+        if prefiks == side:
+            return 0
+        return nodesuffiks.get(prefiks[prefiks.rfind(".", 0, prefiks.rfind(".")):])
+
+    feil = []
+    stabel: list[dict] = []
+    antall_noder = 0
+
+    with open(filsti, "rb") as f:
+        for prefiks, hendelse, verdi in ijson.parse(f):
+            side = prefiks.partition(".")[0]
+            if side not in ("utgifter", "inntekter"):
+                continue
+
+            if hendelse == "start_map":
+                if nivaa(prefiks, side) is not None:
+                    stabel.append({"nr": 0, "total": 0, "sum": 0})
+            elif hendelse == "end_map":
+                niva = nivaa(prefiks, side)
+                if niva is None:
+                    continue
+                node = stabel.pop()
+                antall_noder += 1
+                if node["sum"] != node["total"]:
+                    liste, _, _, betegnelse = HIERARKINIVAAER[niva]
+                    feil.append(
+                        f"Inkonsistent total for {betegnelse.format(side=side, nr=node['nr'])}: "
+                        f"sum {liste}={node['sum']}, total={node['total']}"
+                    )
+                if stabel:
+                    stabel[-1]["sum"] += node["total"]
+            elif hendelse == "number":
+                forelder, _, nokkel = prefiks.rpartition(".")
+                if nokkel == "belop" and forelder.endswith(postsuffiks):
+                    stabel[-1]["sum"] += verdi
+                    antall_noder += 1
+                elif nokkel == "total" and nivaa(forelder, side) is not None:
+                    stabel[-1]["total"] = verdi
+                elif nokkel in nr_felt and nivaa(forelder, side) is not None:
+                    stabel[-1]["nr"] = verdi
+
+    return feil, antall_noder
+
+
+def valider_strommende(filsti: Path, maal_minne: bool = True) -> dict:
+    """Validerer hierarkitotalene i gul_bok_full.json strømmende med ijson,
+    node for node, uten å laste hele filen i minnet. Sjekker de samme
+    invariantene som valider_hierarki (omr→side, kat→omr, kap→kat, post→kap);
+    minnebruken avhenger av dybden i hierarkiet, ikke av filstørrelsen.
+
+    Tiden måles i et rent pass. tracemalloc gjør parseren mange ganger
+    tregere, så topp-minnet måles i et eget pass (maal_minne=False hopper over).
+    Returnerer {"feil", "noder", "sekunder", "topp_minne_mb"}."""
+    if ijson is None:
+        raise ImportError("Strømmende validering krever pakken ijson (pip install ijson)")
+
+    start = time.perf_counter()
+    feil, antall_noder = _sjekk_strommende(filsti)
+    sekunder = time.perf_counter() - start
+
+    topp_minne_mb = None
+    if maal_minne:
+        tracemalloc.start()
+        try:
+            grunnlinje, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            _sjekk_strommende(filsti)
+            _, topp = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        topp_minne_mb = (topp - grunnlinje) / 1e6
+
+    return {
+        "feil": feil,
+        "noder": antall_noder,
+        "sekunder": sekunder,
+        "topp_minne_mb": topp_minne_mb,
+    }
+
+
 if __name__ == "__main__":
+    import argparse
     import sys
 
-    datamappe = Path(__file__).parent.parent / "data" / "2025"
-    feil = valider_json_filer(datamappe, 2025)
+    # Disk-modus, f.eks. for CI-sjekk av committede data: python valider.py [ÅR ...]
+    parser = argparse.ArgumentParser(description="Validering av eksporterte JSON-filer")
+    parser.add_argument("aar", nargs="*", type=int, help="Budsjettår (standard: 2025)")
+    parser.add_argument("--strommende", action="store_true",
+                        help="Sjekk kun hierarkitotalene strømmende med ijson, "
+                             "og rapporter tid og minnebruk")
+    args = parser.parse_args()
+
+    feil = []
+    for aar in args.aar or [2025]:
+        datamappe = Path(__file__).parent.parent / "data" / str(aar)
+        if args.strommende:
+            resultat = valider_strommende(datamappe / "gul_bok_full.json")
+            print(f"{aar}: {resultat['noder']} noder på {resultat['sekunder']:.3f} s, "
+                  f"topp minne {resultat['topp_minne_mb']:.2f} MB")
+            feil.extend(f"{aar}: {f}" for f in resultat["feil"])
+        else:
+            feil.extend(f"{aar}: {f}" for f in valider_json_filer(datamappe, aar))
 
     if feil:
         print("VALIDERINGSFEIL:")